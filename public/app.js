@@ -144,7 +144,7 @@ const realApi = {
   async logout(){ await fetch(API_BASE + '/api/auth/logout',{method:'POST',headers:authHeaders(),credentials:'include'}); setToken(''); },
   async listTemplates(){ const r=await fetch(API_BASE + '/api/templates',{headers:authHeaders(),credentials:'include'}); const d=await safeJson(r); return d.items||[]; },
   async createTemplate(t){ const r=await fetch(API_BASE + '/api/templates',{method:'POST',headers:authHeaders({'Content-Type':'application/json'}),credentials:'include',body:JSON.stringify(t)}); const d=await safeJson(r); if(!r.ok) throw new Error('Create failed'); return d.item; },
-  async updateTemplate(id,t){ const r=await fetch(API_BASE + `/api/templates/${id}`,{method:'PUT',headers:authHeaders({'Content-Type':'application/json'}),credentials:'include',body:JSON.stringify(t)}); const d=await safeJson(r); if(!r.ok) throw new Error('Update failed'); return d.item; },
+  async updateTemplate(id,t,version){ const h={'Content-Type':'application/json'}; if(version) h['If-Match']=String(version); const r=await fetch(API_BASE + `/api/templates/${id}`,{method:'PUT',headers:authHeaders(h),credentials:'include',body:JSON.stringify(t)}); const d=await safeJson(r); if(r.status===409) throw new Error('Template was changed by someone else; reload and try again'); if(!r.ok) throw new Error('Update failed'); return d.item; },
   async deleteTemplate(id){ const r=await fetch(API_BASE + `/api/templates/${id}`,{method:'DELETE',headers:authHeaders(),credentials:'include'}); if(!r.ok) throw new Error('Delete failed'); },
   async listDocs(){ const r=await fetch(API_BASE + '/api/documents',{headers:authHeaders(),credentials:'include'}); const d=await safeJson(r); return d.items||[]; },
   async render(body){ const r=await fetch(API_BASE + '/api/documents',{method:'POST',headers:authHeaders({'Content-Type':'application/json'}),credentials:'include',body:JSON.stringify(body)}); const d=await safeJson(r); if(!r.ok) throw new Error('Render failed'); return d.item; },
@@ -530,7 +530,7 @@ function renderCustomFields(){
 async function saveTemplate(){
   const t = { name: $('#template-name').value.trim(), description: $('#template-desc').value.trim(), content: $('#template-content').value };
   if(!t.name || !t.content) return alert('Name and content required');
-  if(state.currentId){ const updated = await api.updateTemplate(state.currentId,t); const idx=state.templates.findIndex(x=>x.id==state.currentId); state.templates[idx]=updated; }
+  if(state.currentId){ const idx=state.templates.findIndex(x=>x.id==state.currentId); const cur=state.templates[idx]||{}; let updated; try { updated = await api.updateTemplate(state.currentId,t,cur.updatedAt||cur.updated_at); } catch(e){ return alert(e.message); } state.templates[idx]=updated; }
   else { const created = await api.createTemplate(t); state.templates.push(created); state.currentId=created.id; }
   renderTemplates();
 }
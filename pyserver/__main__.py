@@ -0,0 +1,17 @@
+import os
+
+import uvicorn
+
+from .app import PREVIEW_MAX_MESSAGE_BYTES
+
+# python -m pyserver: uvicorn with the preview size limit applied to every
+# WebSocket frame, so oversized messages are refused by the protocol layer
+# instead of being buffered whole and checked afterwards.
+if __name__ == "__main__":
+    uvicorn.run(
+        "pyserver.app:app",
+        host=os.getenv("HOST", "127.0.0.1"),
+        port=int(os.getenv("PORT", "8000")),
+        workers=int(os.getenv("WEB_CONCURRENCY", "1")),
+        ws_max_size=PREVIEW_MAX_MESSAGE_BYTES,
+    )
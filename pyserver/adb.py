@@ -0,0 +1,286 @@
+import asyncio
+import functools
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import psycopg
+from psycopg_pool import AsyncConnectionPool
+
+from . import blobs, db, metrics, search
+from .db import (
+    _BLOB_SQL, BACKEND, DATABASE_URL, USE_PG, ConflictError, _COLUMNS, _INSERT_SQL, _blob_refs, _column,
+    _db_seconds, _insert_params, _invalidate, _new_blobs, _pack_document, _page_query, _page_result,
+    _prepare_records, _resolve_fields, _SEARCH_SQL, _SEARCHABLE, _search_page, _search_sets, _unpack_document,
+    _update_statement, _user_cache, decode_cursor, pool_options,
+)
+
+# Async mirror of the storage API in db.py for async route handlers. Postgres
+# goes through an AsyncConnectionPool so waiting on the network costs no
+# thread; the file backend is memory-resident and simply runs the sync
+# implementation off the event loop.
+
+_apool: Optional[AsyncConnectionPool] = None
+_apool_lock = asyncio.Lock()
+
+
+async def get_async_pool() -> AsyncConnectionPool:
+    global _apool
+    if not USE_PG:
+        raise RuntimeError("Postgres pool requested but DATABASE_URL unset")
+    if _apool is None:
+        async with _apool_lock:
+            if _apool is None:
+                pool = AsyncConnectionPool(DATABASE_URL, open=False, **pool_options())
+                await pool.open()
+                _apool = pool
+    return _apool
+
+
+def pool_stats() -> Dict[str, Any]:
+    return _apool.get_stats() if _apool is not None else {}
+
+
+def _timed(op: str):
+    # The file backend's sync functions already time themselves in their thread
+    def wrap(fn):
+        if not USE_PG:
+            return fn
+
+        @functools.wraps(fn)
+        async def inner(table: str, *args, **kwargs):
+            with metrics.timed(_db_seconds, "db", backend=BACKEND, table=table, op=op):
+                return await fn(table, *args, **kwargs)
+        return inner
+    return wrap
+
+
+async def close_async_pool() -> None:
+    global _apool
+    if _apool is not None:
+        await _apool.close()
+        _apool = None
+
+
+async def _fetchall(sql: str, params: Any = None) -> List[Dict[str, Any]]:
+    pool = await get_async_pool()
+    async with pool.connection() as con:
+        async with con.cursor(row_factory=psycopg.rows.dict_row) as cur:
+            await cur.execute(sql, params)
+            return [dict(r) for r in await cur.fetchall()]
+
+
+async def _fetchone(sql: str, params: Any = None) -> Optional[Dict[str, Any]]:
+    pool = await get_async_pool()
+    async with pool.connection() as con:
+        async with con.cursor(row_factory=psycopg.rows.dict_row) as cur:
+            await cur.execute(sql, params)
+            r = await cur.fetchone()
+            return dict(r) if r else None
+
+
+async def _unpack_rows(table: str, rows: List[Dict[str, Any]], rendered: bool = True) -> List[Dict[str, Any]]:
+    for r in rows:
+        r.pop("search", None)
+    if table != "documents":
+        return rows
+    bodies, missing = _blob_refs(rows)
+    if missing:
+        for r in await _fetchall("SELECT id, body FROM blobs WHERE id = ANY(%s)", (missing,)):
+            bodies[r["id"]] = r["body"]
+            blobs.remember(r["id"], r["body"])
+    return [_unpack_document(r, bodies, rendered) for r in rows]
+
+
+async def _save_blobs(found: List[Optional[Tuple[str, str]]], now: int, cur) -> None:
+    new = _new_blobs(found)
+    if new:
+        await cur.executemany(_BLOB_SQL, [(ref, body, now) for ref, body in new.items()])
+        for ref, body in new.items():
+            blobs.remember(ref, body)
+            blobs.mark_written(ref)
+
+
+@_timed("list")
+async def list_items(table: str) -> List[Dict[str, Any]]:
+    if not USE_PG:
+        return await asyncio.to_thread(db.list_items, table)
+    return await _unpack_rows(table, await _fetchall(f"SELECT * FROM {table}"))
+
+
+@_timed("page")
+async def list_page(
+    table: str,
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    fields: Optional[List[str]] = None,
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    if not USE_PG:
+        return await asyncio.to_thread(db.list_page, table, limit, cursor, fields)
+    wanted = _resolve_fields(table, fields)
+    after = decode_cursor(cursor) if cursor else None
+    keep = [_COLUMNS[table][f] for f in wanted] if wanted is not None else None
+    sql, params = _page_query(table, limit, after, keep)
+    rows = await _unpack_rows(table, await _fetchall(sql, params), wanted is None or "rendered" in wanted)
+    return _page_result(rows, limit, "created_at", keep)
+
+
+@_timed("search")
+async def search_items(
+    table: str, query: str, limit: int = 20, offset: int = 0
+) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+    if not USE_PG:
+        return await asyncio.to_thread(db.search_items, table, query, limit, offset)
+    if table not in _SEARCHABLE:
+        raise ValueError("Unknown table")
+    if not search.tokenize(query):
+        return [], None
+    rows = await _unpack_rows(table, await _fetchall(_SEARCH_SQL[table], (query, limit + 1, offset)))
+    return _search_page(table, [(r, r.pop("score")) for r in rows], query, limit, offset)
+
+
+@_timed("version")
+async def version_of(table: str, id: str) -> Optional[int]:
+    if not USE_PG:
+        return await asyncio.to_thread(db.version_of, table, id)
+    row = await _fetchone(f"SELECT updated_at FROM {table} WHERE id = %s", (id,))
+    return row["updated_at"] if row else None
+
+
+@_timed("version")
+async def collection_version(table: str) -> Tuple[int, int]:
+    if not USE_PG:
+        return await asyncio.to_thread(db.collection_version, table)
+    row = await _fetchone(f"SELECT COALESCE(MAX(updated_at), 0) AS v, COUNT(*) AS n FROM {table}")
+    return row["v"], row["n"]
+
+
+@_timed("get")
+async def find_by_id(table: str, id: str) -> Optional[Dict[str, Any]]:
+    if not USE_PG:
+        return await asyncio.to_thread(db.find_by_id, table, id)
+    row = await _fetchone(f"SELECT * FROM {table} WHERE id = %s", (id,))
+    return (await _unpack_rows(table, [row]))[0] if row else None
+
+
+@_timed("find")
+async def find_by_field(table: str, field: str, value: Any) -> List[Dict[str, Any]]:
+    if not USE_PG:
+        return await asyncio.to_thread(db.find_by_field, table, field, value)
+    rows = await _fetchall(f"SELECT * FROM {table} WHERE {_column(table, field)} = %s", (value,))
+    return await _unpack_rows(table, rows)
+
+
+@_timed("count")
+async def count_by_field(table: str, field: str, value: Any) -> int:
+    if not USE_PG:
+        return await asyncio.to_thread(db.count_by_field, table, field, value)
+    row = await _fetchone(f"SELECT COUNT(*) AS n FROM {table} WHERE {_column(table, field)} = %s", (value,))
+    return row["n"] if row else 0
+
+
+@_timed("find")
+async def existing_values(table: str, field: str, values: List[Any]) -> List[Any]:
+    if not USE_PG:
+        return await asyncio.to_thread(db.existing_values, table, field, values)
+    column = _column(table, field)
+    rows = await _fetchall(f"SELECT DISTINCT {column} AS v FROM {table} WHERE {column} = ANY(%s)", (list(values),))
+    return [r["v"] for r in rows]
+
+
+@_timed("insert")
+async def add_item(table: str, item: Dict[str, Any]) -> Dict[str, Any]:
+    if not USE_PG:
+        return await asyncio.to_thread(db.add_item, table, item)
+    if table not in _INSERT_SQL:
+        raise ValueError("Unknown table")
+    now = int(time.time() * 1000)
+    (rec,), found = _prepare_records(table, [item], now)
+    pool = await get_async_pool()
+    async with pool.connection() as con:
+        async with con.cursor(row_factory=psycopg.rows.dict_row) as cur:
+            await _save_blobs(found, now, cur)
+            await cur.execute(_INSERT_SQL[table], _insert_params(table, rec))
+            row = dict(await cur.fetchone())
+    return (await _unpack_rows(table, [row]))[0]
+
+
+@_timed("insert_many")
+async def add_items(table: str, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    if not USE_PG:
+        return await asyncio.to_thread(db.add_items, table, items)
+    if table not in _INSERT_SQL:
+        raise ValueError("Unknown table")
+    now = int(time.time() * 1000)
+    recs, found = _prepare_records(table, items, now)
+    if not recs:
+        return []
+    pool = await get_async_pool()
+    async with pool.connection() as con:
+        async with con.transaction():
+            async with con.cursor(row_factory=psycopg.rows.dict_row) as cur:
+                await _save_blobs(found, now, cur)
+                await cur.executemany(
+                    _INSERT_SQL[table],
+                    [_insert_params(table, rec) for rec in recs],
+                    returning=True,
+                )
+                rows = []
+                while True:
+                    rows.append(dict(await cur.fetchone()))
+                    if not cur.nextset():
+                        break
+    return await _unpack_rows(table, rows)
+
+
+@_timed("update")
+async def update_item(
+    table: str, id: str, updater: Dict[str, Any], expected_updated_at: Optional[int] = None
+) -> Optional[Dict[str, Any]]:
+    if not USE_PG:
+        return await asyncio.to_thread(db.update_item, table, id, updater, expected_updated_at)
+    now = int(time.time() * 1000)
+    if expected_updated_at is not None:
+        # a compare-and-set must move the version even within the same millisecond
+        now = max(now, expected_updated_at + 1)
+    changes, blob = _pack_document(updater, clear=True) if table == "documents" else (updater, None)
+    sql, params = _update_statement(table, id, changes, now, expected_updated_at, _search_sets(table, updater))
+    pool = await get_async_pool()
+    async with pool.connection() as con:
+        async with con.cursor(row_factory=psycopg.rows.dict_row) as cur:
+            await _save_blobs([blob], now, cur)
+            await cur.execute(sql, params)
+            row = await cur.fetchone()
+            if row is None and expected_updated_at is not None:
+                await cur.execute(f"SELECT 1 FROM {table} WHERE id = %s", (id,))
+                if await cur.fetchone() is not None:
+                    raise ConflictError(f"{table}/{id} was modified concurrently")
+    if row is None:
+        return None
+    _invalidate(table, id)
+    return (await _unpack_rows(table, [dict(row)]))[0]
+
+
+@_timed("delete")
+async def remove_item(table: str, id: str) -> bool:
+    if not USE_PG:
+        return await asyncio.to_thread(db.remove_item, table, id)
+    pool = await get_async_pool()
+    async with pool.connection() as con:
+        async with con.cursor() as cur:
+            await cur.execute(f"DELETE FROM {table} WHERE id = %s", (id,))
+            removed = cur.rowcount > 0
+    _invalidate(table, id)
+    return removed
+
+
+async def get_user(id: str) -> Optional[Dict[str, Any]]:
+    # a role change or deletion made by another worker must not wait out the cache TTL
+    if BACKEND == "sqlite":
+        await asyncio.to_thread(db.sync_foreign)
+    cached = _user_cache.get(id)
+    if cached is not None:
+        return dict(cached)
+    user = await find_by_id("users", id)
+    if user:
+        _user_cache.set(id, dict(user))
+    return user
@@ -1,15 +1,48 @@
 import os
+import io
+import hmac
+import json
+import asyncio
+import csv
+import zipfile
 import time
-from typing import Optional, Dict, Any
+from pathlib import Path
+from typing import Optional, Dict, Any, List
+from urllib.parse import urlsplit
 
-import bcrypt
 import jwt
-from fastapi import FastAPI, HTTPException, Depends, Request, Response, UploadFile, File
+from fastapi import (
+    FastAPI, HTTPException, Depends, Header, Request, Response, UploadFile, File, Form, Query, WebSocket,
+    WebSocketDisconnect,
+)
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import MutableHeaders
+from starlette.requests import HTTPConnection
+from starlette.routing import Match
 from pydantic import BaseModel
 
-from .db import init_db, list_items, add_item, update_item, remove_item, find_by_id
-from .templating import render_template, normalize_html, extract_highlighted_placeholders
+from .db import (
+    DATA_DIR, ConflictError, init_db, iter_items, find_by_id, list_items, add_item, update_item, pool_stats,
+    start_blob_gc, stop_blob_gc, user_cache_stats, version_of,
+)
+from . import adb
+from .pdf import (
+    BASE_CSS, LETTER_CSS, PdfJob, page_job, render_pdf_async, render_pdf_retrying, pdf_stats, PdfBusy, PdfTimeout,
+    shutdown as pdf_shutdown, warm_up as pdf_warm_up,
+)
+from .cache import TTLCache
+from .pdfcache import PdfCache
+from .blobs import blob_cache_stats
+from .compression import CompressionMiddleware, strip_coding
+from .export import safe_name, stream_zip
+from .hashing import (
+    HashingBusy, hash_many, hash_password, hashing_stats, needs_rehash, record_rehash, stored_hash, submit_hash,
+    submit_verify, shutdown as hashing_shutdown,
+)
+from . import importer, jobs, metrics
+from .templating import LivePreview, render_compiled, get_compiled, template_cache_stats
 
 
 JWT_SECRET = os.getenv('JWT_SECRET', 'dev_secret_change_me')
@@ -18,6 +51,15 @@ TOKEN_MAX_AGE = 60 * 60 * 8  # seconds
 
 app = FastAPI()
 
+PDF_CACHE_MAX_BYTES = int(os.getenv('PDF_CACHE_MAX_BYTES', str(512 * 1024 * 1024)))
+pdf_cache = PdfCache(Path(os.getenv('PDF_CACHE_DIR', DATA_DIR / 'pdf-cache')), PDF_CACHE_MAX_BYTES) \
+    if PDF_CACHE_MAX_BYTES > 0 else None
+
+# (template id, updated_at) -> its page CSS, for PDF renders of documents made
+# from it. Keyed by version like compiled templates, so an edit made through
+# another process is never served stale; the version check reads no body.
+_page_css = TTLCache(maxsize=int(os.getenv('TEMPLATE_CACHE_SIZE', '256')))
+
 # CORS
 allow_origins = [o.strip() for o in os.getenv('CORS_ORIGIN', '').split(',') if o.strip()]
 app.add_middleware(
@@ -28,6 +70,71 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# /metrics only answers scrapers presenting this bearer token; unset, it doesn't exist
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+_http_seconds = metrics.Histogram(
+    'hrms_http_request_seconds', 'Request latency by route template', ('method', 'route', 'status')
+)
+_http_in_flight = metrics.Gauge('hrms_http_requests_in_flight', 'Requests being served by route template', ('method', 'route'))
+
+
+def _route_template(scope) -> str:
+    # Label by the route's path template so ids don't explode the series count
+    partial = None
+    for route in app.router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route.path
+        if match == Match.PARTIAL and partial is None:
+            partial = route.path
+    return partial or 'unmatched'
+
+
+class MetricsMiddleware:
+    # Plain ASGI rather than BaseHTTPMiddleware so the handler shares our
+    # context and its db/pdf/hash phases reach the Server-Timing header.
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+        method, route = scope['method'], _route_template(scope)
+        started = time.perf_counter()
+        status = 500
+        token = metrics.start_request()
+        _http_in_flight.inc(method=method, route=route)
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+                timing = metrics.server_timing(metrics.current_phases(), time.perf_counter() - started)
+                MutableHeaders(scope=message).append('Server-Timing', timing)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _http_in_flight.dec(method=method, route=route)
+            _http_seconds.observe(time.perf_counter() - started, method=method, route=route, status=status)
+            metrics.end_request(token)
+
+
+# Compression sits inside the metrics middleware, so its time counts towards the request's
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(MetricsMiddleware)
+
+
+@app.get('/metrics')
+async def prometheus_metrics(request: Request):
+    if not METRICS_TOKEN:
+        raise HTTPException(404, 'Not Found')
+    given = request.headers.get('Authorization') or ''
+    if not hmac.compare_digest(given.encode(), f'Bearer {METRICS_TOKEN}'.encode()):
+        raise HTTPException(401, 'Unauthorized')
+    return Response(metrics.render(), media_type='text/plain; version=0.0.4; charset=utf-8')
+
 
 @app.on_event("startup")
 def _startup():
@@ -35,15 +142,33 @@ def _startup():
     # seed admin if empty
     users = list_items('users')
     if not users:
-        pw = bcrypt.hashpw(b'admin123', bcrypt.gensalt()).decode('utf-8')
-        add_item('users', {
-            'id': 'seed-admin',
-            'username': 'admin',
-            'name': 'Admin',
-            'dept': '',
-            'role': 'admin',
-            'passwordHash': pw,
-        })
+        pw = hash_password('admin123')
+        try:
+            add_item('users', {
+                'id': 'seed-admin',
+                'username': 'admin',
+                'name': 'Admin',
+                'dept': '',
+                'role': 'admin',
+                'passwordHash': pw,
+            })
+        except Exception:
+            # another worker sharing the database seeded it first
+            if not find_by_id('users', 'seed-admin'):
+                raise
+    jobs.start()
+    start_blob_gc()
+    pdf_warm_up()
+
+
+@app.on_event("shutdown")
+async def _shutdown():
+    jobs.stop()
+    stop_blob_gc()
+    pdf_shutdown()
+    importer.shutdown()
+    hashing_shutdown()
+    await adb.close_async_pool()
 
 
 def sign_token(user: Dict[str, Any]) -> str:
@@ -64,7 +189,7 @@ def set_auth_cookie(response: Response, token: str):
     )
 
 
-def current_user(request: Request) -> Optional[dict]:
+async def current_user(request: HTTPConnection) -> Optional[dict]:
     token = request.cookies.get(TOKEN_NAME)
     if not token:
         auth = request.headers.get('Authorization', '')
@@ -74,21 +199,19 @@ def current_user(request: Request) -> Optional[dict]:
         return None
     try:
         payload = jwt.decode(token, JWT_SECRET, algorithms=['HS256'])
-        users = list_items('users')
-        full = next((u for u in users if u['id'] == payload['sub']), None)
-        return full
+        return await adb.get_user(payload['sub'])
     except Exception:
         return None
 
 
-def require_auth(user=Depends(current_user)):
+async def require_auth(user=Depends(current_user)):
     if not user:
         raise HTTPException(status_code=401, detail='Unauthorized')
     return user
 
 
 def require_role(role: str):
-    def _inner(user=Depends(require_auth)):
+    async def _inner(user=Depends(require_auth)):
         if user.get('role') != role:
             raise HTTPException(status_code=403, detail='Forbidden')
         return user
@@ -100,69 +223,254 @@ class LoginBody(BaseModel):
     password: str
 
 
+def _rehash_in_background(user_id: str, password: str):
+    # Upgrade hashes made with a different cost factor without delaying the login response.
+    try:
+        fut = submit_hash(password)
+    except HashingBusy:
+        return
+
+    def _store(f):
+        if f.exception() is None:
+            update_item('users', user_id, {'passwordHash': f.result()})
+            record_rehash()
+
+    fut.add_done_callback(_store)
+
+
 @app.post('/api/auth/login')
-def login(body: LoginBody, response: Response):
-    users = list_items('users')
-    user = next((u for u in users if u['username'] == body.username), None)
+async def login(body: LoginBody, response: Response):
+    # async so waiting on bcrypt doesn't pin a request thread; verify runs on the bounded hashing pool
+    user = next(iter(await adb.find_by_field('users', 'username', body.username)), None)
     if not user:
         raise HTTPException(400, 'Invalid credentials')
-    if not bcrypt.checkpw(body.password.encode('utf-8'), user['password_hash'].encode('utf-8')) and \
-       not bcrypt.checkpw(body.password.encode('utf-8'), user.get('passwordHash', '').encode('utf-8')):
+    hashed = stored_hash(user)
+    try:
+        ok = await asyncio.wrap_future(submit_verify(body.password, hashed))
+    except HashingBusy:
+        raise HTTPException(429, 'Too many login attempts, retry shortly', headers={'Retry-After': '1'})
+    if not ok:
         raise HTTPException(400, 'Invalid credentials')
-    updated = update_item('users', user['id'], {}) or user
-    # unify field names
-    updated['passwordHash'] = updated.get('passwordHash') or updated.get('password_hash')
+    if needs_rehash(hashed):
+        _rehash_in_background(user['id'], body.password)
     token = sign_token({
-        'id': updated['id'],
-        'username': updated['username'],
-        'role': updated['role'],
+        'id': user['id'],
+        'username': user['username'],
+        'role': user['role'],
     })
     set_auth_cookie(response, token)
-    safe = {k: v for k, v in updated.items() if k not in ('passwordHash', 'password_hash')}
+    safe = {k: v for k, v in user.items() if k not in ('passwordHash', 'password_hash')}
     return {"user": safe, "token": token}
 
 
 @app.post('/api/auth/logout')
-def logout(response: Response):
+async def logout(response: Response):
     response.delete_cookie(TOKEN_NAME, path='/')
     return {"ok": True}
 
 
 @app.get('/api/me')
-def me(user=Depends(current_user)):
+async def me(user=Depends(current_user)):
     if not user:
         return {"user": None}
     safe = {k: v for k, v in user.items() if k not in ('passwordHash', 'password_hash')}
     return {"user": safe}
 
 
+def expected_version(if_match: Optional[str]) -> Optional[int]:
+    # If-Match carries the updatedAt the client last saw, either bare or as an
+    # ETag of the form "<id>.<updatedAt>"; absent or "*" means unconditional.
+    tag = (if_match or '').strip()
+    if not tag or tag == '*':
+        return None
+    if tag.startswith('W/'):
+        tag = tag[2:]
+    try:
+        return int(strip_coding(tag).strip('"').rsplit('.', 1)[-1])
+    except ValueError:
+        raise HTTPException(400, 'Malformed If-Match header')
+
+
+def etag(id: str, version: Any) -> str:
+    return f'"{id}.{version}"'
+
+
+def row_etag(row: dict) -> str:
+    return etag(row['id'], row.get('updated_at') or row.get('updatedAt') or row.get('createdAt') or 0)
+
+
+def etag_matches(if_none_match: Optional[str], tag: str) -> bool:
+    # Weak comparison (RFC 9110 13.1.2), ignoring the coding suffix compression adds
+    if not if_none_match:
+        return False
+    tags = [strip_coding(t.strip().removeprefix('W/')) for t in if_none_match.split(',')]
+    return '*' in tags or tag in tags
+
+
+def validators(tag: str) -> Dict[str, str]:
+    # Private and always revalidated: bodies depend on the caller being signed in
+    return {'ETag': tag, 'Cache-Control': 'private, no-cache'}
+
+
+async def not_modified(request: Request, table: str, id: str) -> Optional[Response]:
+    # Answers If-None-Match from the row's version alone, before its body is read
+    header = request.headers.get('if-none-match')
+    if not header:
+        return None
+    version = await adb.version_of(table, id)
+    if version is None or not etag_matches(header, etag(id, version)):
+        return None
+    return Response(status_code=304, headers=validators(etag(id, version)))
+
+
+async def update_or_http(table: str, id: str, changes: Dict[str, Any], if_match: Optional[str]) -> Optional[dict]:
+    try:
+        return await adb.update_item(table, id, changes, expected_version(if_match))
+    except ConflictError:
+        raise HTTPException(409, 'Modified since it was loaded; reload and retry')
+
+
+async def hash_password_or_http(password: str) -> str:
+    try:
+        return await asyncio.wrap_future(submit_hash(password))
+    except HashingBusy:
+        raise HTTPException(503, 'Password hashing busy, retry shortly', headers={'Retry-After': '1'})
+
+
 class CreateUserBody(BaseModel):
     username: str
     name: Optional[str] = None
     role: Optional[str] = 'editor'
+    dept: Optional[str] = None
     password: str
 
 
 @app.post('/api/auth/users')
-def create_user(body: CreateUserBody, _=Depends(require_role('admin'))):
-    users = list_items('users')
-    if any(u['username'] == body.username for u in users):
+async def create_user(body: CreateUserBody, _=Depends(require_role('admin'))):
+    if await adb.count_by_field('users', 'username', body.username):
         raise HTTPException(400, 'Username taken')
-    pw = bcrypt.hashpw(body.password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
-    user = add_item('users', {
+    pw = await hash_password_or_http(body.password)
+    user = await adb.add_item('users', {
         'username': body.username,
         'name': body.name or body.username,
         'role': body.role or 'editor',
-        'dept': '',
+        'dept': body.dept or '',
         'passwordHash': pw,
     })
     safe = {k: v for k, v in user.items() if k not in ('passwordHash', 'password_hash')}
     return {"user": safe}
 
 
+ROLES = ('admin', 'editor', 'viewer')
+USER_IMPORT_MAX_ROWS = int(os.getenv('USER_IMPORT_MAX_ROWS', '10000'))
+
+
+def _user_row_error(row: Dict[str, Any]) -> Optional[str]:
+    if not row['username']:
+        return 'username is required'
+    if not row['password']:
+        return 'password is required'
+    if len(row['password'].encode('utf-8')) > 72:
+        return 'password is longer than 72 bytes'
+    if row['role'] not in ROLES:
+        return f"role must be one of {', '.join(ROLES)}"
+    return None
+
+
+async def provision_users(rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    # Validates every row, checks all usernames against storage in one query,
+    # hashes the survivors on the bulk hashing pool and inserts them in one
+    # write. Each input row gets a result; bad rows don't stop the good ones.
+    if len(rows) > USER_IMPORT_MAX_ROWS:
+        raise HTTPException(413, f'At most {USER_IMPORT_MAX_ROWS} users per import')
+    results: List[Dict[str, Any]] = []
+    pending: List[tuple] = []  # (result, cleaned row)
+    seen = set()
+    for i, raw in enumerate(rows, 1):
+        row = {
+            'username': str(raw.get('username') or '').strip(),
+            'name': str(raw.get('name') or '').strip(),
+            'role': str(raw.get('role') or 'editor').strip().lower(),
+            'dept': str(raw.get('dept') or '').strip(),
+            'password': str(raw.get('password') or ''),
+        }
+        result: Dict[str, Any] = {'row': i, 'username': row['username'], 'ok': False}
+        results.append(result)
+        error = _user_row_error(row)
+        if error is None and row['username'] in seen:
+            error = 'duplicate username in this import'
+        if error is not None:
+            result['error'] = error
+            continue
+        seen.add(row['username'])
+        pending.append((result, row))
+
+    async def drop_taken() -> bool:
+        taken = set(await adb.existing_values('users', 'username', [r['username'] for _, r in pending]))
+        for result, row in pending:
+            if row['username'] in taken:
+                result['error'] = 'Username taken'
+        pending[:] = [(result, row) for result, row in pending if row['username'] not in taken]
+        return bool(taken)
+
+    if pending:
+        await drop_taken()
+    if pending:
+        try:
+            hashes = await run_in_threadpool(hash_many, [row['password'] for _, row in pending])
+        except HashingBusy:
+            raise HTTPException(503, 'Password hashing busy, retry shortly', headers={'Retry-After': '1'})
+        for (result, _), hashed in zip(pending, hashes):
+            if hashed is None:
+                result['error'] = 'password could not be hashed'
+        pending = [(result, {**row, 'passwordHash': hashed})
+                   for (result, row), hashed in zip(pending, hashes) if hashed is not None]
+
+    def records() -> List[Dict[str, Any]]:
+        return [{
+            'username': row['username'],
+            'name': row['name'] or row['username'],
+            'role': row['role'],
+            'dept': row['dept'],
+            'passwordHash': row['passwordHash'],
+        } for _, row in pending]
+
+    if pending:
+        try:
+            users = await adb.add_items('users', records())
+        except Exception:
+            # a username was created while we hashed; drop it and insert the rest
+            if not await drop_taken():
+                raise
+            users = await adb.add_items('users', records()) if pending else []
+        for (result, _), user in zip(pending, users):
+            result['ok'] = True
+            result['user'] = {k: v for k, v in user.items() if k not in ('passwordHash', 'password_hash')}
+    return {"results": results, "created": sum(1 for r in results if r['ok'])}
+
+
+class BulkUsersBody(BaseModel):
+    users: List[Dict[str, Any]]
+
+
+@app.post('/api/auth/users/bulk')
+async def create_users_bulk(body: BulkUsersBody, _=Depends(require_role('admin'))):
+    return await provision_users(body.users)
+
+
+@app.post('/api/auth/users/bulk/csv')
+async def create_users_bulk_csv(file: UploadFile = File(...), _=Depends(require_role('admin'))):
+    # Columns: username, password, name, role, dept (header names are case-insensitive)
+    def parse():
+        reader = csv.DictReader(io.TextIOWrapper(file.file, encoding='utf-8-sig', errors='replace'))
+        return [{k.strip().lower(): (v or '') for k, v in r.items() if k} for r in reader]
+
+    return await provision_users(await run_in_threadpool(parse))
+
+
 @app.get('/api/auth/users')
-def list_users(_=Depends(require_role('admin'))):
-    rows = list_items('users')
+async def list_users(_=Depends(require_role('admin'))):
+    rows = await adb.list_items('users')
     users = []
     for u in rows:
         d = dict(u)
@@ -179,13 +487,17 @@ class UpdateUserBody(BaseModel):
 
 
 @app.put('/api/auth/users/{id}')
-def update_user(id: str, body: UpdateUserBody, _=Depends(require_role('admin'))):
-    db_users = list_items('users')
-    target = next((u for u in db_users if u['id'] == id), None)
+async def update_user(
+    id: str,
+    body: UpdateUserBody,
+    if_match: Optional[str] = Header(None),
+    _=Depends(require_role('admin')),
+):
+    target = await adb.find_by_id('users', id)
     if not target:
         raise HTTPException(404, 'User not found')
     if target['role'] == 'admin' and body.role and body.role != 'admin':
-        admin_count = len([u for u in db_users if u['role'] == 'admin'])
+        admin_count = await adb.count_by_field('users', 'role', 'admin')
         if admin_count <= 1:
             raise HTTPException(400, 'Cannot demote the last admin')
     changes: Dict[str, Any] = {}
@@ -194,8 +506,8 @@ def update_user(id: str, body: UpdateUserBody, _=Depends(require_role('admin')))
     if body.role is not None:
         changes['role'] = body.role
     if body.password:
-        changes['passwordHash'] = bcrypt.hashpw(body.password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
-    updated = update_item('users', id, changes)
+        changes['passwordHash'] = await hash_password_or_http(body.password)
+    updated = await update_or_http('users', id, changes, if_match)
     if not updated:
         raise HTTPException(404, 'User not found')
     safe = {k: v for k, v in updated.items() if k not in ('passwordHash', 'password_hash')}
@@ -203,86 +515,202 @@ def update_user(id: str, body: UpdateUserBody, _=Depends(require_role('admin')))
 
 
 @app.delete('/api/auth/users/{id}')
-def delete_user(id: str, user=Depends(require_role('admin'))):
+async def delete_user(id: str, user=Depends(require_role('admin'))):
     if user['id'] == id:
         raise HTTPException(400, 'Cannot delete yourself')
-    db_users = list_items('users')
-    target = next((u for u in db_users if u['id'] == id), None)
+    target = await adb.find_by_id('users', id)
     if not target:
         raise HTTPException(404, 'User not found')
     if target['role'] == 'admin':
-        admin_count = len([u for u in db_users if u['role'] == 'admin'])
+        admin_count = await adb.count_by_field('users', 'role', 'admin')
         if admin_count <= 1:
             raise HTTPException(400, 'Cannot delete the last admin')
-    ok = remove_item('users', id)
+    ok = await adb.remove_item('users', id)
     if not ok:
         raise HTTPException(500, 'Delete failed')
     return {"ok": True}
 
 
+@app.get('/api/admin/stats')
+async def admin_stats(_=Depends(require_role('admin'))):
+    return {
+        "userCache": user_cache_stats(),
+        "templateCache": template_cache_stats(),
+        "pdf": pdf_stats(),
+        "pdfCache": pdf_cache.stats() if pdf_cache else None,
+        "hashing": hashing_stats(),
+        "blobCache": blob_cache_stats(),
+        "dbPool": {"sync": pool_stats(), "async": adb.pool_stats()},
+    }
+
+
 # Templates
 class TemplateBody(BaseModel):
     name: str
     content: str
     description: Optional[str] = ""
+    pageCss: Optional[str] = ""
+
+
+class UpdateTemplateBody(BaseModel):
+    name: Optional[str] = None
+    content: Optional[str] = None
+    description: Optional[str] = None
+    pageCss: Optional[str] = None
+
+
+MAX_PAGE_SIZE = 500
+
+
+async def paged_listing(
+    table: str, limit: Optional[int], cursor: Optional[str], fields: Optional[str], request: Request, response: Response,
+):
+    # The collection tag is read before the rows, so a write in between can
+    # only make the client refetch, never keep a stale copy.
+    latest, count = await adb.collection_version(table)
+    tag = etag(table, f'{latest}.{count}')
+    if etag_matches(request.headers.get('if-none-match'), tag):
+        return Response(status_code=304, headers=validators(tag))
+    response.headers.update(validators(tag))
+    # Without any paging parameters, keep returning the whole table for existing clients.
+    if limit is None and cursor is None and fields is None:
+        return {"items": await adb.list_items(table)}
+    size = min(max(limit or 50, 1), MAX_PAGE_SIZE)
+    names = [f.strip() for f in (fields or '').split(',') if f.strip()]
+    try:
+        items, next_cursor = await adb.list_page(table, size, cursor, names or None)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    return {"items": items, "nextCursor": next_cursor}
 
 
 @app.get('/api/templates')
-def list_templates(_=Depends(require_auth)):
-    return {"items": list_items('templates')}
+async def list_templates(
+    request: Request,
+    response: Response,
+    limit: Optional[int] = Query(None),
+    cursor: Optional[str] = Query(None),
+    fields: Optional[str] = Query(None),
+    _=Depends(require_auth),
+):
+    return await paged_listing('templates', limit, cursor, fields, request, response)
 
 
 @app.post('/api/templates')
-def create_template(body: TemplateBody, user=Depends(require_auth)):
+async def create_template(body: TemplateBody, user=Depends(require_auth)):
     if user.get('role') == 'viewer':
         raise HTTPException(403, 'Forbidden')
-    item = add_item('templates', body.model_dump())
+    item = await adb.add_item('templates', body.model_dump())
     return {"item": item}
 
 
 @app.put('/api/templates/{id}')
-def update_template(id: str, body: TemplateBody, user=Depends(require_auth)):
+async def update_template(
+    id: str,
+    body: UpdateTemplateBody,
+    if_match: Optional[str] = Header(None),
+    user=Depends(require_auth),
+):
     if user.get('role') == 'viewer':
         raise HTTPException(403, 'Forbidden')
-    updated = update_item('templates', id, body.model_dump())
+    changes = body.model_dump(exclude_unset=True)
+    # only the fields sent are changed, so an explicit null has to be refused here
+    nulls = [k for k, v in changes.items() if v is None]
+    if nulls:
+        raise HTTPException(400, f"{', '.join(nulls)} cannot be null")
+    updated = await update_or_http('templates', id, changes, if_match)
     if not updated:
         raise HTTPException(404, 'Not found')
     return {"item": updated}
 
 
 @app.delete('/api/templates/{id}')
-def delete_template(id: str, user=Depends(require_auth)):
+async def delete_template(id: str, user=Depends(require_auth)):
     if user.get('role') == 'viewer':
         raise HTTPException(403, 'Forbidden')
-    ok = remove_item('templates', id)
+    ok = await adb.remove_item('templates', id)
     if not ok:
         raise HTTPException(404, 'Not found')
     return {"ok": True}
 
 
 @app.get('/api/templates/{id}')
-def get_template(id: str, _=Depends(require_auth)):
-    t = find_by_id('templates', id)
+async def get_template(id: str, request: Request, response: Response, _=Depends(require_auth)):
+    unchanged = await not_modified(request, 'templates', id)
+    if unchanged:
+        return unchanged
+    t = await adb.find_by_id('templates', id)
     if not t:
         raise HTTPException(404, 'Not found')
+    response.headers.update(validators(row_etag(t)))
     return {"item": t}
 
 
+async def import_upload(file: UploadFile, dest: Path) -> Dict[str, Any]:
+    filename = file.filename or 'Imported Template'
+    path = await importer.spool(file, dest)
+    return await importer.convert(str(path), filename)
+
+
 @app.post('/api/templates/import')
-def import_template(file: UploadFile = File(...), _=Depends(require_role('editor'))):
-    import mammoth
-    name = os.path.splitext(file.filename)[0] if file.filename else 'Imported Template'
-    data = file.file.read()
-    html = ''
-    if (file.filename or '').lower().endswith('.docx'):
-        result = mammoth.convert_to_html(data)
-        html = result.value or ''
-    else:
-        html = data.decode('utf-8', errors='ignore')
-    html = normalize_html(html)
-    ph = extract_highlighted_placeholders(html)
-    content = normalize_html(ph['html'])
-    return {"name": name, "content": content, "vars": ph['vars'], "defaults": ph['defaults']}
+async def import_template(file: UploadFile = File(...), _=Depends(require_role('editor'))):
+    with importer.spool_dir() as tmp:
+        try:
+            return await import_upload(file, Path(tmp))
+        except importer.ImportTooLarge as e:
+            raise HTTPException(413, str(e))
+
+
+@app.post('/api/templates/import/batch')
+async def import_templates_batch(
+    files: List[UploadFile] = File(...),
+    save: bool = Query(True),
+    _=Depends(require_role('editor')),
+):
+    # Accepts several files and/or ZIP archives of them; every file converts in
+    # parallel on the import pool and gets its own result, so one bad file
+    # doesn't sink the rest of the library.
+    with importer.spool_dir() as tmp:
+        dest = Path(tmp)
+        sources: List[tuple] = []  # (file name, spooled path or None, error or None)
+        # the file limit is checked as entries are counted, so an oversized
+        # upload is refused before the rest of it is spooled or unpacked
+        too_many = HTTPException(413, f'At most {importer.IMPORT_MAX_FILES} files per import')
+        for f in files:
+            name = f.filename or 'upload'
+            remaining = importer.IMPORT_MAX_FILES - len(sources)
+            if remaining <= 0:
+                raise too_many
+            try:
+                path = await importer.spool(f, dest)
+                if name.lower().endswith('.zip'):
+                    sources.extend(await run_in_threadpool(importer.unpack_zip, path, dest, remaining))
+                else:
+                    sources.append((name, path, None))
+            except importer.TooManyFiles:
+                raise too_many
+            except importer.ImportTooLarge as e:
+                sources.append((name, None, str(e)))
+            except zipfile.BadZipFile:
+                sources.append((name, None, 'not a valid ZIP archive'))
+
+        async def one(name: str, path: Optional[Path], error: Optional[str]) -> Dict[str, Any]:
+            if error is None:
+                try:
+                    return {"file": name, "ok": True, **await importer.convert(str(path), name)}
+                except Exception as e:
+                    error = str(e) or type(e).__name__
+            return {"file": name, "ok": False, "error": error}
+
+        results = await asyncio.gather(*(one(*s) for s in sources))
+    if save:
+        converted = [r for r in results if r['ok']]
+        items = await adb.add_items('templates', [
+            {'name': r['name'], 'content': r['content'], 'description': ''} for r in converted
+        ])
+        for r, item in zip(converted, items):
+            r['item'] = item
+    return {"results": results, "imported": sum(1 for r in results if r['ok'])}
 
 
 # Documents
@@ -293,25 +721,64 @@ class RenderBody(BaseModel):
     fileName: Optional[str] = None
 
 
+async def resolve_template(template_id: Optional[str], content: Optional[str]):
+    tpl = content
+    cache_key = None
+    if not tpl and template_id:
+        t = await adb.find_by_id('templates', template_id)
+        if not t:
+            raise HTTPException(404, 'Template not found')
+        tpl = t.get('content')
+        cache_key = (t['id'], t.get('updated_at') or t.get('updatedAt'))
+    if not tpl:
+        raise HTTPException(400, 'templateId or content required')
+    return tpl, get_compiled(tpl, cache_key)
+
+
+async def render_body(body: RenderBody):
+    tpl, parts = await resolve_template(body.templateId, body.content)
+    return tpl, render_compiled(parts, body.data or {})
+
+
 @app.get('/api/documents')
-def list_documents(_=Depends(require_auth)):
-    return {"items": list_items('documents')}
+async def list_documents(
+    request: Request,
+    response: Response,
+    limit: Optional[int] = Query(None),
+    cursor: Optional[str] = Query(None),
+    fields: Optional[str] = Query(None),
+    _=Depends(require_auth),
+):
+    return await paged_listing('documents', limit, cursor, fields, request, response)
+
+
+MAX_SEARCH_OFFSET = 10000
+
+
+@app.get('/api/search')
+async def search_items(
+    q: str = Query(..., min_length=1, max_length=500),
+    type: str = Query('documents'),
+    limit: int = Query(20),
+    offset: int = Query(0),
+    _=Depends(require_auth),
+):
+    # Ranked full-text matches over template name/description/content or
+    # document data values and rendered text
+    if type not in ('documents', 'templates'):
+        raise HTTPException(400, "type must be 'documents' or 'templates'")
+    size = min(max(limit, 1), MAX_PAGE_SIZE)
+    start = min(max(offset, 0), MAX_SEARCH_OFFSET)
+    items, next_offset = await adb.search_items(type, q, size, start)
+    return {"items": items, "nextOffset": next_offset}
 
 
 @app.post('/api/documents')
-def render_and_save(body: RenderBody, user=Depends(require_auth)):
+async def render_and_save(body: RenderBody, user=Depends(require_auth)):
     if user.get('role') == 'viewer':
         raise HTTPException(403, 'Forbidden')
-    tpl = body.content
-    if not tpl and body.templateId:
-        t = find_by_id('templates', body.templateId)
-        if not t:
-            raise HTTPException(404, 'Template not found')
-        tpl = t.get('content')
-    if not tpl:
-        raise HTTPException(400, 'templateId or content required')
-    rendered = render_template(tpl, body.data or {})
-    doc = add_item('documents', {
+    tpl, rendered = await render_body(body)
+    doc = await adb.add_item('documents', {
         'templateId': body.templateId or None,
         'content': tpl,
         'data': body.data or {},
@@ -321,67 +788,392 @@ def render_and_save(body: RenderBody, user=Depends(require_auth)):
     return {"item": doc}
 
 
+# Live preview: the session holds the compiled template and the data so far;
+# the client sends data deltas and gets back only the placeholder segments
+# that changed. Nothing is written to storage. python -m pyserver hands the
+# limit to uvicorn as ws_max_size, so larger frames are refused before they are
+# buffered; a server started another way should pass --ws-max-size to match.
+PREVIEW_MAX_MESSAGE_BYTES = int(os.getenv('PREVIEW_MAX_MESSAGE_BYTES', str(1024 * 1024)))
+_preview_sessions = metrics.Gauge('hrms_preview_sessions', 'Open live preview WebSockets')
+
+
+def _origin_allowed(conn: HTTPConnection) -> bool:
+    # CORS doesn't cover WebSockets, and browsers send the auth cookie with cross-site handshakes
+    origin = conn.headers.get('origin')
+    if not origin or not allow_origins:
+        return True
+    return origin in allow_origins or urlsplit(origin).netloc == conn.headers.get('host')
+
+
+async def _preview_message(msg: Any, session: Optional[LivePreview]) -> tuple:
+    # -> (session, reply) for one client message
+    if not isinstance(msg, dict):
+        raise ValueError('Message must be a JSON object')
+    kind = msg.get('type')
+    if kind == 'open':
+        # re-sent when the template itself changes; omitted data carries over
+        for field in ('templateId', 'content'):
+            if not isinstance(msg.get(field), (str, type(None))):
+                raise ValueError(f'{field} must be a string')
+        _, parts = await resolve_template(msg.get('templateId'), msg.get('content'))
+        data = msg['data'] if 'data' in msg else (session.data if session else None)
+        session = LivePreview(parts, data)
+        return session, {'type': 'render', 'segments': session.segments}
+    if kind == 'data':
+        if session is None:
+            raise ValueError('Send "open" first')
+        changes = msg.get('changes')
+        if not isinstance(changes, dict):
+            raise ValueError('changes must be an object')
+        return session, {'type': 'patch', 'seq': msg.get('seq'), 'changes': session.update(changes)}
+    raise ValueError('Unknown message type')
+
+
+@app.websocket('/api/preview')
+async def live_preview(websocket: WebSocket):
+    # Client -> {"type": "open", "templateId" | "content", "data"}: replies
+    #   {"type": "render", "segments": [...]}; the page is "".join(segments).
+    # Client -> {"type": "data", "changes": {key: value | null}, "seq"}: replies
+    #   {"type": "patch", "seq", "changes": [[segment index, text], ...]}.
+    user = await current_user(websocket)
+    if not user or not _origin_allowed(websocket):
+        await websocket.close(code=1008)
+        return
+    await websocket.accept()
+    _preview_sessions.inc()
+    session: Optional[LivePreview] = None
+    try:
+        while True:
+            message = await websocket.receive()
+            if message['type'] == 'websocket.disconnect':
+                raise WebSocketDisconnect(message.get('code', 1000))
+            raw = message.get('text')
+            size = len(raw.encode()) if raw is not None else len(message.get('bytes') or b'')
+            if size > PREVIEW_MAX_MESSAGE_BYTES:
+                await websocket.close(code=1009)
+                return
+            if raw is None:
+                await websocket.close(code=1003)
+                return
+            try:
+                session, reply = await _preview_message(json.loads(raw), session)
+            except HTTPException as e:
+                reply = {'type': 'error', 'error': e.detail}
+            except ValueError as e:
+                reply = {'type': 'error', 'error': str(e)}
+            await websocket.send_json(reply)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        _preview_sessions.dec()
+
+
+def _template_css(t: Optional[dict]) -> str:
+    return (t.get('pageCss') or t.get('page_css') or '') if t else ''
+
+
+async def template_page_css(template_id: Optional[str]) -> str:
+    if not template_id:
+        return ''
+    version = await adb.version_of('templates', template_id)
+    if version is None:
+        return ''
+    css = _page_css.get((template_id, version))
+    if css is None:
+        css = _template_css(await adb.find_by_id('templates', template_id))
+        _page_css.set((template_id, version), css)
+    return css
+
+
+def template_page_css_sync(template_id: Optional[str]) -> str:
+    if not template_id:
+        return ''
+    version = version_of('templates', template_id)
+    if version is None:
+        return ''
+    css = _page_css.get((template_id, version))
+    if css is None:
+        css = _template_css(find_by_id('templates', template_id))
+        _page_css.set((template_id, version), css)
+    return css
+
+
+async def render_pdf_or_http(job: PdfJob) -> bytes:
+    try:
+        return await render_pdf_async(job)
+    except PdfBusy:
+        raise HTTPException(503, 'PDF renderer busy, retry shortly', headers={'Retry-After': '2'})
+    except PdfTimeout:
+        raise HTTPException(504, 'PDF rendering timed out')
+
+
+def document_html(doc: dict) -> str:
+    filename = f"document-{doc['id']}.html"
+    return f"<!doctype html><html><head><meta charset='utf-8'><title>{filename}</title></head><body>{doc.get('rendered','')}</body></html>"
+
+
+def document_pdf_bytes(doc: dict) -> bytes:
+    # Cache-aware render for background/streaming use (no HTTP error mapping).
+    page_css = template_page_css_sync(doc.get('templateId') or doc.get('template_id'))
+    job = page_job(doc.get('rendered', ''), BASE_CSS, page_css)
+    if not pdf_cache:
+        return render_pdf_retrying(job)
+    key = PdfCache.key(job[0], *job[1])
+    cached = pdf_cache.get(key)
+    if cached is not None:
+        try:
+            return cached.read_bytes()
+        except FileNotFoundError:
+            pass
+    pdf_bytes = render_pdf_retrying(job)
+    pdf_cache.put(key, pdf_bytes)
+    return pdf_bytes
+
+
+async def pdf_response(job: PdfJob, fname: str, doc_id: Optional[str] = None) -> Response:
+    key = None
+    if pdf_cache and doc_id:
+        key = PdfCache.key(job[0], *job[1])
+        cached = pdf_cache.get(key)
+        pdf_bytes = None
+        if cached is not None:
+            # eviction may unlink the file at any point; read it whole now
+            # rather than fail halfway through a streamed response
+            try:
+                pdf_bytes = await run_in_threadpool(cached.read_bytes)
+            except FileNotFoundError:
+                pass
+        if pdf_bytes is None:
+            pdf_bytes = await render_pdf_or_http(job)
+            await run_in_threadpool(pdf_cache.put, key, pdf_bytes)
+    else:
+        pdf_bytes = await render_pdf_or_http(job)
+    return Response(
+        content=pdf_bytes,
+        media_type='application/pdf',
+        headers={'Content-Disposition': f'attachment; filename="{fname}"'},
+    )
+
+
 @app.post('/api/documents/pdf')
-def generate_pdf(body: RenderBody, response: Response, _=Depends(require_auth)):
-    from weasyprint import HTML
-    tpl = body.content
-    if not tpl and body.templateId:
-        t = find_by_id('templates', body.templateId)
-        if not t:
-            raise HTTPException(404, 'Template not found')
-        tpl = t.get('content')
-    if not tpl:
-        raise HTTPException(400, 'templateId or content required')
-    rendered = render_template(tpl, body.data or {})
+async def generate_pdf(body: RenderBody, _=Depends(require_auth)):
+    tpl, rendered = await render_body(body)
     preferred = (body.fileName or '').strip()
-    doc = add_item('documents', {
+    doc = await adb.add_item('documents', {
         'templateId': body.templateId or None,
         'content': tpl,
         'data': body.data or {},
         'rendered': rendered,
         'fileName': preferred or None,
     })
-    html = f"""<!doctype html><html><head><meta charset='utf-8'>
-    <style>@page {{ size: A4; margin: 30mm 16mm 20mm 16mm; }} body {{ font-family: system-ui, Segoe UI, Roboto, Ubuntu, sans-serif; color: #111; line-height: 1.5; }} h1,h2,h3,strong {{ color: #000; }} p, li, div, td, th {{ text-align: justify; text-justify: inter-word; }} .page-break {{ page-break-before: always; break-before: page; }}</style>
-    </head><body>{rendered}</body></html>"""
-    pdf_bytes = HTML(string=html).write_pdf()
-    response.headers['Content-Type'] = 'application/pdf'
-    fname = doc.get('fileName') or f"document-{doc['id']}.pdf"
-    response.headers['Content-Disposition'] = f'attachment; filename="{fname}"'
-    return Response(content=pdf_bytes, media_type='application/pdf')
+    job = page_job(rendered, LETTER_CSS, await template_page_css(body.templateId))
+    fname = safe_name(doc.get('fileName') or doc.get('file_name'), f"document-{doc['id']}.pdf")
+    return await pdf_response(job, fname)
+
+
+BATCH_MAX_ROWS = int(os.getenv('BATCH_MAX_ROWS', '5000'))
+
+
+class BatchBody(BaseModel):
+    templateId: Optional[str] = None
+    content: Optional[str] = None
+    rows: List[Dict[str, Any]]
+
+
+async def render_batch(template_id: Optional[str], content: Optional[str], rows: List[Dict[str, Any]]):
+    if not rows:
+        raise HTTPException(400, 'rows required')
+    if len(rows) > BATCH_MAX_ROWS:
+        raise HTTPException(413, f'At most {BATCH_MAX_ROWS} rows per batch')
+    tpl, parts = await resolve_template(template_id, content)
+
+    def build():
+        return [{
+            'templateId': template_id or None,
+            'content': tpl,
+            'data': row,
+            'rendered': render_compiled(parts, row),
+            'fileName': None,
+        } for row in rows]
+
+    # rendering thousands of rows is CPU work; keep it off the event loop
+    docs = await adb.add_items('documents', await run_in_threadpool(build))
+    return {"count": len(docs), "ids": [d['id'] for d in docs]}
+
+
+@app.post('/api/documents/batch')
+async def render_and_save_batch(body: BatchBody, user=Depends(require_auth)):
+    if user.get('role') == 'viewer':
+        raise HTTPException(403, 'Forbidden')
+    return await render_batch(body.templateId, body.content, body.rows)
+
+
+@app.post('/api/documents/batch/csv')
+async def render_and_save_batch_csv(
+    templateId: str = Form(...),
+    file: UploadFile = File(...),
+    user=Depends(require_auth),
+):
+    if user.get('role') == 'viewer':
+        raise HTTPException(403, 'Forbidden')
+
+    def parse():
+        reader = csv.DictReader(io.TextIOWrapper(file.file, encoding='utf-8-sig', errors='replace'))
+        return [{k.strip(): (v or '') for k, v in r.items() if k} for r in reader]
+
+    return await render_batch(templateId, None, await run_in_threadpool(parse))
+
+
+class PdfJobBody(BaseModel):
+    templateId: Optional[str] = None
+    content: Optional[str] = None
+    rows: List[Dict[str, Any]]
+    fileNameField: Optional[str] = None
+
+
+async def job_for(id: str, user: dict) -> dict:
+    job = await adb.find_by_id('jobs', id)
+    if not job:
+        raise HTTPException(404, 'Not found')
+    owner = job.get('createdBy') or job.get('created_by')
+    if owner != user['id'] and user.get('role') != 'admin':
+        raise HTTPException(404, 'Not found')
+    return job
+
+
+@app.post('/api/jobs/pdf', status_code=202)
+async def create_pdf_job(body: PdfJobBody, user=Depends(require_auth)):
+    if user.get('role') == 'viewer':
+        raise HTTPException(403, 'Forbidden')
+    if not body.rows:
+        raise HTTPException(400, 'rows required')
+    if len(body.rows) > BATCH_MAX_ROWS:
+        raise HTTPException(413, f'At most {BATCH_MAX_ROWS} rows per job')
+    tpl, _parts = await resolve_template(body.templateId, body.content)
+    page_css = await template_page_css(body.templateId)
+    job = await run_in_threadpool(
+        jobs.create_pdf_job, body.templateId, tpl, body.rows, body.fileNameField, user['id'], page_css,
+    )
+    return {"job": jobs.public_job(job)}
+
+
+@app.get('/api/jobs/{id}')
+async def get_job(id: str, user=Depends(require_auth)):
+    return {"job": jobs.public_job(await job_for(id, user))}
+
+
+@app.get('/api/jobs/{id}/download')
+async def download_job(id: str, user=Depends(require_auth)):
+    job = await job_for(id, user)
+    path = jobs.result_path(job)
+    if job.get('status') == 'expired':
+        raise HTTPException(410, 'Job result has expired')
+    if job.get('status') != 'done' or not path or not path.exists():
+        raise HTTPException(409, 'Job not finished')
+    return FileResponse(path, media_type='application/zip', filename=f"documents-{job['id']}.zip")
+
+
+@app.get('/api/documents/export')
+def export_documents(
+    ids: Optional[str] = Query(None),
+    templateId: Optional[str] = Query(None),
+    createdFrom: Optional[int] = Query(None, alias='from'),
+    createdTo: Optional[int] = Query(None, alias='to'),
+    format: str = Query('html'),
+    _=Depends(require_auth),
+):
+    formats = {f.strip().lower() for f in format.split(',') if f.strip()}
+    if not formats or not formats <= {'html', 'pdf'}:
+        raise HTTPException(400, 'format must be html, pdf or html,pdf')
+    id_list = [i.strip() for i in ids.split(',') if i.strip()] if ids is not None else None
+    rows = iter_items('documents', id_list, templateId, createdFrom, createdTo)
+
+    def entries():
+        for doc in rows:
+            if 'html' in formats:
+                yield f"document-{doc['id']}.html", document_html(doc).encode('utf-8'), True
+            if 'pdf' in formats:
+                # prefix preferred names with the id so duplicates can't collide in the archive
+                name = safe_name(doc.get('fileName') or doc.get('file_name'), '')
+                name = f"{doc['id']}-{name}" if name else f"document-{doc['id']}.pdf"
+                yield name, document_pdf_bytes(doc), False
+
+    stamp = time.strftime('%Y%m%d-%H%M%S')
+    return StreamingResponse(
+        stream_zip(entries()),
+        media_type='application/zip',
+        headers={'Content-Disposition': f'attachment; filename="documents-{stamp}.zip"'},
+    )
 
 
 @app.get('/api/documents/{id}')
-def get_document(id: str, _=Depends(require_auth)):
-    doc = find_by_id('documents', id)
+async def get_document(id: str, request: Request, response: Response, _=Depends(require_auth)):
+    unchanged = await not_modified(request, 'documents', id)
+    if unchanged:
+        return unchanged
+    doc = await adb.find_by_id('documents', id)
     if not doc:
         raise HTTPException(404, 'Not found')
+    response.headers.update(validators(row_etag(doc)))
     return {"item": doc}
 
 
+class UpdateDocumentBody(BaseModel):
+    data: Optional[dict] = None
+    fileName: Optional[str] = None
+
+
+@app.put('/api/documents/{id}')
+async def update_document(
+    id: str,
+    body: UpdateDocumentBody,
+    if_match: Optional[str] = Header(None),
+    user=Depends(require_auth),
+):
+    if user.get('role') == 'viewer':
+        raise HTTPException(403, 'Forbidden')
+    changes: Dict[str, Any] = {}
+    if 'fileName' in body.model_fields_set:
+        changes['fileName'] = (body.fileName or '').strip() or None
+    if body.data is not None:
+        doc = await adb.find_by_id('documents', id)
+        if not doc:
+            raise HTTPException(404, 'Not found')
+        # re-render from the document's own template copy; without If-Match,
+        # the version we rendered from guards against a concurrent save
+        if if_match is None:
+            if_match = str(doc.get('updated_at') or doc.get('updatedAt') or doc.get('createdAt'))
+        changes['data'] = body.data
+        changes['rendered'] = render_compiled(get_compiled(doc.get('content') or ''), body.data)
+    updated = await update_or_http('documents', id, changes, if_match)
+    if not updated:
+        raise HTTPException(404, 'Not found')
+    return {"item": updated}
+
+
 @app.get('/api/documents/{id}/download')
-def download_html(id: str, response: Response, _=Depends(require_auth)):
-    doc = find_by_id('documents', id)
+async def download_html(id: str, request: Request, _=Depends(require_auth)):
+    unchanged = await not_modified(request, 'documents', id)
+    if unchanged:
+        return unchanged
+    doc = await adb.find_by_id('documents', id)
     if not doc:
         raise HTTPException(404, 'Not found')
     filename = f"document-{doc['id']}.html"
-    html = f"<!doctype html><html><head><meta charset='utf-8'><title>{filename}</title></head><body>{doc.get('rendered','')}</body></html>"
-    response.headers['Content-Disposition'] = f'attachment; filename={filename}'
-    return Response(content=html, media_type='text/html; charset=utf-8')
+    return Response(
+        content=document_html(doc),
+        media_type='text/html; charset=utf-8',
+        headers={'Content-Disposition': f'attachment; filename={filename}', **validators(row_etag(doc))},
+    )
 
 
 @app.get('/api/documents/{id}/download-pdf')
-def download_pdf(id: str, response: Response, _=Depends(require_auth)):
-    from weasyprint import HTML
-    doc = find_by_id('documents', id)
+async def download_pdf(id: str, _=Depends(require_auth)):
+    doc = await adb.find_by_id('documents', id)
     if not doc:
         raise HTTPException(404, 'Not found')
-    html = f"""<!doctype html><html><head><meta charset='utf-8'>
-    <style>@page {{ size: A4; margin: 30mm 16mm 20mm 16mm; }} body {{ font-family: system-ui, Segoe UI, Roboto, Ubuntu, sans-serif; color: #111; line-height: 1.5; }} h1,h2,h3,strong {{ color: #000; }}</style>
-    </head><body>{doc.get('rendered','')}</body></html>"""
-    pdf_bytes = HTML(string=html).write_pdf()
-    fname = doc.get('fileName') or f"document-{doc['id']}.pdf"
-    response.headers['Content-Type'] = 'application/pdf'
-    response.headers['Content-Disposition'] = f'attachment; filename="{fname}"'
-    return Response(content=pdf_bytes, media_type='application/pdf')
+    page_css = await template_page_css(doc.get('templateId') or doc.get('template_id'))
+    job = page_job(doc.get('rendered', ''), BASE_CSS, page_css)
+    fname = safe_name(doc.get('fileName') or doc.get('file_name'), f"document-{doc['id']}.pdf")
+    return await pdf_response(job, fname, doc['id'])
 
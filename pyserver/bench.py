@@ -0,0 +1,409 @@
+import argparse
+import json
+import os
+import platform
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+# Offline benchmarks for the pyserver hot paths:
+#
+#   python -m pyserver.bench [--quick] [--sizes 1000,10000] [--pdf] [--out results.json]
+#   python -m pyserver.bench --compare base.json head.json
+#
+# Storage and HTTP cases run in child processes so each gets its own DATA_DIR
+# and environment (db.py reads its settings at import). Postgres cases run
+# only when BENCH_DATABASE_URL (default: the local socket) accepts a
+# connection; they work in a throwaway schema that is dropped afterwards.
+
+ROOT = Path(__file__).resolve().parent.parent
+BENCH_DATABASE_URL = os.getenv("BENCH_DATABASE_URL", "postgresql:///postgres")
+
+_WORDS = (
+    "employee salary joining date department manager policy leave annual benefits notice period "
+    "probation confidential agreement company office report review performance allowance "
+    "reimbursement designation location effective terms conditions signature regards"
+).split()
+
+
+# --- measurement -------------------------------------------------------------
+
+def measure(fn: Callable[[], Any], n: int, budget: Optional[float] = None) -> Dict[str, Any]:
+    # Runs fn up to n times (at least once), stopping early once budget seconds are spent
+    times: List[float] = []
+    started = time.perf_counter()
+    for _ in range(max(1, n)):
+        t = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t)
+        if budget is not None and time.perf_counter() - started > budget:
+            break
+    times.sort()
+    total = sum(times)
+    return {
+        "n": len(times),
+        "mean_s": total / len(times),
+        "p50_s": times[len(times) // 2],
+        "p95_s": times[min(len(times) - 1, int(len(times) * 0.95))],
+        "min_s": times[0],
+        "ops_per_s": len(times) / total if total else None,
+    }
+
+
+def result(group: str, name: str, params: Dict[str, Any], stats: Dict[str, Any], **extra) -> Dict[str, Any]:
+    return {"group": group, "name": name, "params": params, **stats, **extra}
+
+
+# --- generated inputs --------------------------------------------------------
+
+def _sentence(rng: random.Random, n: int) -> str:
+    return " ".join(rng.choice(_WORDS) for _ in range(n)).capitalize() + "."
+
+
+def letter_html(size: int, seed: int = 1, highlights: bool = True) -> str:
+    # mammoth-like letter markup with tables, empty paragraphs, <br> runs and
+    # flat yellow-highlighted runs, repeated until it reaches size bytes
+    rng = random.Random(seed)
+    parts: List[str] = []
+    total = 0
+    i = 0
+    while total < size:
+        i += 1
+        block = [f"<h2>Section {i}</h2>\n"]
+        for _ in range(rng.randint(2, 5)):
+            words = _sentence(rng, rng.randint(8, 30))
+            if highlights and rng.random() < 0.5:
+                field = rng.choice(_WORDS)
+                words += f' <span style="background-color: yellow">{field.title()} {i}</span>'
+            block.append(f"<p>{words} <strong>{rng.choice(_WORDS)}</strong></p>\n")
+        if rng.random() < 0.3:
+            block.append("<p></p>\n<p>&nbsp;</p><br><br/>\n")
+        if rng.random() < 0.2:
+            rows = "".join(
+                f"<tr><td>{rng.choice(_WORDS)}</td><td>{rng.randint(1000, 99999)}</td></tr>" for _ in range(5)
+            )
+            block.append(f"<table>\n  <tbody>{rows}</tbody>\n</table>\n")
+        chunk = "".join(block)
+        parts.append(chunk)
+        total += len(chunk)
+    return "".join(parts)
+
+
+def template_source(fields: int = 200, seed: int = 2) -> str:
+    rng = random.Random(seed)
+    return "".join(
+        f"<p>{_sentence(rng, 20)} {{{{field_{i}}}}} {_sentence(rng, 10)}</p>" for i in range(fields)
+    )
+
+
+def legacy_extract(html: str) -> Dict[str, Any]:
+    # Reference: the regex implementation extract_highlighted_placeholders
+    # replaced, with the escaping fixed so it matches like the Node server's.
+    idx = 1
+    defaults: Dict[str, str] = {}
+    vars_: List[str] = []
+    pattern = re.compile(
+        r"<([a-zA-Z0-9]+)([^>]*style\s*=\s*\"(?:[^\"]*?\bbackground(?:-color)?\s*:\s*(?:yellow|#?ffff00)[^\"]*)\")"
+        r"[^>]*>([\s\S]*?)</\1>",
+        re.I,
+    )
+
+    def _replace(m):
+        nonlocal idx
+        text = re.sub(r"<[^>]+>", "", m.group(3) or "").strip()
+        key = re.sub(r"[^a-z0-9]+", "_", text.lower()).strip("_") or f"field_{idx}"
+        idx += 1
+        if key not in vars_:
+            vars_.append(key)
+        if defaults.get(key) is None:
+            defaults[key] = text
+        return f"{{{{{key}}}}}"
+
+    return {"html": pattern.sub(_replace, html), "vars": vars_, "defaults": defaults}
+
+
+# --- templating (in process) -------------------------------------------------
+
+def bench_templating(quick: bool) -> List[Dict[str, Any]]:
+    from .templating import extract_highlighted_placeholders, normalize_html, render_template
+
+    out = []
+    tpl = template_source()
+    data = {f"field_{i}": f"value {i}" for i in range(200)}
+    out.append(result(
+        "templating", "render_template", {"template_bytes": len(tpl), "fields": 200, "cached": True},
+        measure(lambda: render_template(tpl, data, cache_key="bench"), 200 if quick else 2000),
+    ))
+    out.append(result(
+        "templating", "render_template", {"template_bytes": len(tpl), "fields": 200, "cached": False},
+        measure(lambda: render_template(tpl, data), 100 if quick else 1000),
+    ))
+    for mb in ((1,) if quick else (1, 10)):
+        html = letter_html(mb * 1024 * 1024)
+        params = {"input_bytes": len(html)}
+        reps = 3 if mb == 1 else 1
+        out.append(result("templating", "normalize_html", params, measure(lambda: normalize_html(html), reps)))
+        new = extract_highlighted_placeholders(html)
+        old = legacy_extract(html)
+        out.append(result(
+            "templating", "extract_highlighted_placeholders", params,
+            measure(lambda: extract_highlighted_placeholders(html), reps),
+            placeholders=len(new["vars"]), parity=new == old,
+        ))
+        out.append(result(
+            "templating", "extract_highlighted_placeholders[legacy_regex]", params,
+            measure(lambda: legacy_extract(html), reps),
+        ))
+    return out
+
+
+# --- storage (child process) -------------------------------------------------
+
+def _doc_rows(n: int, template_id: str, content: str, seed: int = 3) -> List[Dict[str, Any]]:
+    from .templating import get_compiled, render_compiled
+
+    rng = random.Random(seed)
+    parts = get_compiled(content)
+    rows = []
+    for i in range(n):
+        data = {f"field_{j}": f"{rng.choice(_WORDS)} {i}" for j in range(200)}
+        rows.append({
+            "templateId": template_id, "content": content, "data": data,
+            "rendered": render_compiled(parts, data), "fileName": None,
+        })
+    return rows
+
+
+def child_storage(docs: int, quick: bool) -> List[Dict[str, Any]]:
+    from . import db
+
+    backend = db.BACKEND
+    db.init_db()
+    content = template_source(fields=200)
+    tpl = db.add_item("templates", {"name": "Bench", "content": content, "description": ""})
+    chunk = 2000
+    started = time.perf_counter()
+    ids: List[str] = []
+    for off in range(0, docs, chunk):
+        ids += [d["id"] for d in db.add_items("documents", _doc_rows(min(chunk, docs - off), tpl["id"], content, off))]
+    seed_s = time.perf_counter() - started
+    params = {"backend": backend, "docs": docs}
+    out = [result("storage", "add_items[seed]", params, {
+        "n": docs, "mean_s": seed_s / docs, "p50_s": None, "p95_s": None, "min_s": None,
+        "ops_per_s": docs / seed_s,
+    })]
+    if not db.USE_PG:
+        out[0]["db_bytes"] = db._store.path.stat().st_size
+    rng = random.Random(4)
+    out.append(result("storage", "list_items", params, measure(lambda: db.list_items("documents"), 5, budget=30)))
+    out.append(result("storage", "list_page", {**params, "limit": 50},
+                      measure(lambda: db.list_page("documents", 50), 200, budget=10)))
+    out.append(result("storage", "find_by_id", params,
+                      measure(lambda: db.find_by_id("documents", rng.choice(ids)), 2000 if not quick else 200, budget=10)))
+    # the first search builds the file backend's index; time that on its own
+    out.append(result("storage", "search_items[first]", params,
+                      measure(lambda: db.search_items("documents", _WORDS[0], 20), 1)))
+    for label, query in (("selective", f"{_WORDS[0]} {docs // 2}"), ("broad", _WORDS[1])):
+        out.append(result("storage", "search_items", {**params, "query": label}, measure(
+            lambda q=query: db.search_items("documents", q, 20), 50 if quick else 500, budget=10,
+        )))
+    one = _doc_rows(1, tpl["id"], content, 99)[0]
+    out.append(result("storage", "add_item", params,
+                      measure(lambda: db.add_item("documents", dict(one)), 200 if not quick else 20, budget=20)))
+    return out
+
+
+def _pg_available() -> bool:
+    try:
+        import psycopg
+        with psycopg.connect(BENCH_DATABASE_URL, connect_timeout=2):
+            return True
+    except Exception:
+        return False
+
+
+def _with_search_path(url: str, schema: str) -> str:
+    sep = "&" if "?" in url else "?"
+    return f"{url}{sep}options=-csearch_path%3D{schema}"
+
+
+# --- HTTP end to end (child process) -----------------------------------------
+
+def child_http(docs: int, quick: bool, pdf: bool) -> List[Dict[str, Any]]:
+    from fastapi.testclient import TestClient
+
+    from . import db
+    from .app import app
+
+    out = []
+    with TestClient(app) as c:
+        tok = c.post("/api/auth/login", json={"username": "admin", "password": "admin123"}).json()["token"]
+        h = {"Authorization": f"Bearer {tok}"}
+        content = template_source(fields=50)
+        tpl = c.post("/api/templates", json={"name": "Bench", "content": content}, headers=h).json()["item"]
+        for off in range(0, docs, 2000):
+            db.add_items("documents", _doc_rows(min(2000, docs - off), tpl["id"], content, off))
+        params = {"docs": docs}
+
+        def call(method: str, url: str, **kw):
+            def run():
+                r = c.request(method, url, headers=h, **kw)
+                if r.status_code >= 400:
+                    raise RuntimeError(f"{method} {url}: {r.status_code} {r.text[:200]}")
+            return run
+
+        out.append(result("http", "POST /api/auth/login", params, measure(
+            call("POST", "/api/auth/login", json={"username": "admin", "password": "admin123"}),
+            3 if quick else 20, budget=20,
+        )))
+        out.append(result("http", "GET /api/documents", params, measure(call("GET", "/api/documents"), 5, budget=30)))
+        out.append(result("http", "GET /api/documents?limit=50", params, measure(
+            call("GET", "/api/documents?limit=50&fields=id,templateId,createdAt"), 100 if quick else 500, budget=15,
+        )))
+        out.append(result("http", "GET /api/templates", params, measure(
+            call("GET", "/api/templates"), 100 if quick else 500, budget=15,
+        )))
+        data = {f"field_{i}": f"value {i}" for i in range(50)}
+        out.append(result("http", "POST /api/documents", params, measure(
+            call("POST", "/api/documents", json={"templateId": tpl["id"], "data": data}),
+            50 if quick else 300, budget=20,
+        )))
+        if pdf:
+            try:
+                stats = measure(call("POST", "/api/documents/pdf", json={"templateId": tpl["id"], "data": data}),
+                                5 if quick else 20, budget=60)
+                out.append(result("http", "POST /api/documents/pdf", params, stats))
+            except Exception as e:
+                out.append(result("http", "POST /api/documents/pdf", params, {"n": 0}, error=str(e)[:200]))
+    return out
+
+
+# --- driver ------------------------------------------------------------------
+
+def _run_child(kind: str, docs: int, quick: bool, pdf: bool, env: Dict[str, str]) -> List[Dict[str, Any]]:
+    args = [sys.executable, "-m", "pyserver.bench", "--child", kind, "--docs", str(docs)]
+    if quick:
+        args.append("--quick")
+    if pdf:
+        args.append("--pdf")
+    proc = subprocess.run(args, cwd=ROOT, env=env, capture_output=True, text=True)
+    if proc.returncode != 0:
+        return [{"group": kind, "name": "error", "params": {"docs": docs}, "error": proc.stderr[-2000:]}]
+    return json.loads(proc.stdout)
+
+
+def _child_env(data_dir: str, database_url: Optional[str] = None) -> Dict[str, str]:
+    env = {k: v for k, v in os.environ.items() if k not in ("DATABASE_URL", "USE_PG")}
+    env["DATA_DIR"] = data_dir
+    env.pop("DB_FILE", None)
+    env.setdefault("PDF_CACHE_MAX_BYTES", "0")
+    if database_url:
+        env["DATABASE_URL"] = database_url
+    return env
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def run(sizes: List[int], quick: bool, pdf: bool, groups: List[str]) -> Dict[str, Any]:
+    results: List[Dict[str, Any]] = []
+    if "templating" in groups:
+        results += bench_templating(quick)
+    pg = _pg_available() if "storage" in groups else False
+    for docs in sizes:
+        if "storage" in groups:
+            with tempfile.TemporaryDirectory(prefix="hrms-bench-") as tmp:
+                results += _run_child("storage", docs, quick, False, _child_env(tmp))
+            if pg:
+                results += _run_pg_storage(docs, quick)
+        if "http" in groups:
+            with tempfile.TemporaryDirectory(prefix="hrms-bench-") as tmp:
+                results += _run_child("http", docs, quick, pdf, _child_env(tmp))
+    return {
+        "commit": _git_commit(),
+        "timestamp": int(time.time()),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "postgres": pg,
+        "results": results,
+    }
+
+
+def _run_pg_storage(docs: int, quick: bool) -> List[Dict[str, Any]]:
+    import psycopg
+
+    schema = f"bench_{uuid.uuid4().hex[:8]}"
+    with psycopg.connect(BENCH_DATABASE_URL, autocommit=True) as con:
+        con.execute(f"CREATE SCHEMA {schema}")
+    try:
+        with tempfile.TemporaryDirectory(prefix="hrms-bench-") as tmp:
+            env = _child_env(tmp, _with_search_path(BENCH_DATABASE_URL, schema))
+            return _run_child("storage", docs, quick, False, env)
+    finally:
+        with psycopg.connect(BENCH_DATABASE_URL, autocommit=True) as con:
+            con.execute(f"DROP SCHEMA {schema} CASCADE")
+
+
+def _key(r: Dict[str, Any]) -> str:
+    return f"{r['group']}:{r['name']}:{json.dumps(r.get('params', {}), sort_keys=True)}"
+
+
+def compare(base_path: str, head_path: str) -> List[Dict[str, Any]]:
+    base = {_key(r): r for r in json.loads(Path(base_path).read_text())["results"]}
+    head = json.loads(Path(head_path).read_text())["results"]
+    rows = []
+    for r in head:
+        b = base.get(_key(r))
+        if not b or not b.get("mean_s") or not r.get("mean_s"):
+            continue
+        rows.append({
+            "group": r["group"], "name": r["name"], "params": r.get("params", {}),
+            "base_mean_s": b["mean_s"], "head_mean_s": r["mean_s"], "ratio": r["mean_s"] / b["mean_s"],
+        })
+    return rows
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    p = argparse.ArgumentParser(prog="python -m pyserver.bench")
+    p.add_argument("--sizes", default="1000,10000,100000", help="document counts for storage/HTTP cases")
+    p.add_argument("--only", default="templating,storage,http", help="comma-separated groups to run")
+    p.add_argument("--quick", action="store_true", help="smallest inputs and fewer repetitions")
+    p.add_argument("--pdf", action="store_true", help="include PDF endpoints (needs WeasyPrint)")
+    p.add_argument("--out", help="write JSON results here instead of stdout")
+    p.add_argument("--compare", nargs=2, metavar=("BASE", "HEAD"), help="compare two result files")
+    p.add_argument("--child", choices=("storage", "http"), help=argparse.SUPPRESS)
+    p.add_argument("--docs", type=int, default=1000, help=argparse.SUPPRESS)
+    args = p.parse_args(argv)
+
+    if args.child == "storage":
+        payload: Any = child_storage(args.docs, args.quick)
+    elif args.child == "http":
+        payload = child_http(args.docs, args.quick, args.pdf)
+    elif args.compare:
+        payload = compare(*args.compare)
+    else:
+        sizes = [1000] if args.quick else [int(s) for s in args.sizes.split(",") if s.strip()]
+        groups = [g.strip() for g in args.only.split(",") if g.strip()]
+        payload = run(sizes, args.quick, args.pdf, groups)
+    text = json.dumps(payload, indent=2)
+    if args.out:
+        Path(args.out).write_text(text + "\n", encoding="utf-8")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+import base64
+import hashlib
+import os
+import zlib
+from typing import Optional, Union
+
+from .cache import TTLCache
+
+# Packed document bodies: instead of every document carrying its own copy of
+# the template, `content` becomes a reference to a content-addressed blob,
+# and `rendered` is kept zlib-compressed until a document is actually read.
+# Rows written inline (before this, or by the Node server) read back as-is.
+# Opt-in with DOC_BLOBS=1: the Node server reads content/rendered straight
+# from storage and doesn't understand packed rows.
+DOC_BLOBS = os.getenv("DOC_BLOBS", "0").lower() in ("1", "true", "yes", "on")
+DOC_COMPRESS_LEVEL = int(os.getenv("DOC_COMPRESS_LEVEL", "6"))
+# Blobs no document points at are deleted once they haven't been written for
+# BLOB_GC_GRACE seconds; the sweep runs every BLOB_GC_SECONDS (0 disables it).
+BLOB_GC_GRACE = float(os.getenv("BLOB_GC_GRACE", "3600"))
+BLOB_GC_SECONDS = float(os.getenv("BLOB_GC_SECONDS", "3600"))
+
+# Blob bodies are immutable, so a cached body never goes stale
+_bodies = TTLCache(maxsize=int(os.getenv("BLOB_CACHE_SIZE", "256")))
+# Refs this process wrote recently. Writing a blob stamps its created_at, so
+# for half the grace period the sweep can't remove it and writers may skip it.
+_written = TTLCache(maxsize=int(os.getenv("BLOB_CACHE_SIZE", "256")), ttl=BLOB_GC_GRACE / 2)
+
+
+def digest(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def compress(text: str) -> bytes:
+    return zlib.compress(text.encode("utf-8"), DOC_COMPRESS_LEVEL)
+
+
+def decompress(data: Union[bytes, memoryview, str]) -> str:
+    # The file backend keeps compressed bodies as base64 text
+    if isinstance(data, str):
+        data = base64.b64decode(data)
+    return zlib.decompress(bytes(data)).decode("utf-8")
+
+
+def to_text(data: bytes) -> str:
+    return base64.b64encode(data).decode("ascii")
+
+
+def cached(ref: str) -> Optional[str]:
+    return _bodies.get(ref)
+
+
+def remember(ref: str, body: str) -> None:
+    _bodies.set(ref, body)
+
+
+def written(ref: str) -> bool:
+    return _written.get(ref) is not None
+
+
+def mark_written(ref: str) -> None:
+    _written.set(ref, True)
+
+
+def forget_written(ref: str) -> None:
+    _written.pop(ref)
+
+
+def blob_cache_stats():
+    return _bodies.stats()
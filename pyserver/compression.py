@@ -0,0 +1,152 @@
+import os
+import zlib
+from typing import Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+# Response compression negotiated from Accept-Encoding: brotli when the
+# module is installed and the client takes it, gzip otherwise. Small bodies
+# and formats that are already compressed (PDF, ZIP, images) pass through.
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "5"))
+
+_COMPRESSIBLE = ("text/", "application/json", "application/javascript", "image/svg+xml")
+
+
+def choose_encoding(accept: str) -> Optional[str]:
+    offered = {}
+    for part in accept.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        for p in params.split(";"):
+            k, _, v = p.strip().partition("=")
+            if k == "q":
+                try:
+                    q = float(v)
+                except ValueError:
+                    q = 0.0
+        offered[name.strip().lower()] = q
+    for enc in (("br",) if brotli is not None else ()) + ("gzip",):
+        if offered.get(enc, offered.get("*", 0.0)) > 0:
+            return enc
+    return None
+
+
+def strip_coding(tag: str) -> str:
+    # The entity tag the handler set, before the middleware marked the coding
+    for enc in ("br", "gzip"):
+        if tag.endswith(f'-{enc}"'):
+            return tag[:-len(enc) - 2] + '"'
+    return tag
+
+
+class _Encoder:
+    def __init__(self, encoding: str):
+        if encoding == "br":
+            self._c = brotli.Compressor(quality=BROTLI_QUALITY)
+            self._process, self._flush, self._finish = self._c.process, self._c.flush, self._c.finish
+        else:
+            self._c = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+            self._process = self._c.compress
+            self._flush = lambda: self._c.flush(zlib.Z_SYNC_FLUSH)
+            self._finish = self._c.flush
+
+    def chunk(self, data: bytes, last: bool) -> bytes:
+        out = self._process(data)
+        return out + (self._finish() if last else self._flush())
+
+
+class CompressionMiddleware:
+    def __init__(self, app, min_bytes: int = COMPRESS_MIN_BYTES):
+        self.app = app
+        self.min_bytes = min_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            # Still name Accept-Encoding in Vary, so a shared cache keeps this
+            # identity body apart from the compressed one other clients get.
+            async def send_identity(message):
+                if message["type"] == "http.response.start":
+                    headers = MutableHeaders(scope=message)
+                    if _varies(message["status"], headers):
+                        _add_vary(headers)
+                await send(message)
+
+            return await self.app(scope, receive, send_identity)
+        start: Optional[dict] = None
+        encoder: Optional[_Encoder] = None
+
+        async def send_compressed(message):
+            nonlocal start, encoder
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            more = message.get("more_body", False)
+            if start is not None:
+                # the first body chunk decides, once size and headers are known
+                pending, start = start, None
+                headers = MutableHeaders(scope=pending)
+                body = message.get("body", b"")
+                if not _wants_compression(pending["status"], headers, len(body), more, self.min_bytes):
+                    if _varies(pending["status"], headers):
+                        _add_vary(headers)
+                    await send(pending)
+                    return await send(message)
+                encoder = _Encoder(encoding)
+                data = encoder.chunk(body, not more)
+                _mark(headers, encoding, None if more else len(data))
+                await send(pending)
+                return await send({"type": "http.response.body", "body": data, "more_body": more})
+            if encoder is not None and message["type"] == "http.response.body":
+                data = encoder.chunk(message.get("body", b""), not more)
+                return await send({"type": "http.response.body", "body": data, "more_body": more})
+            await send(message)
+
+        await self.app(scope, receive, send_compressed)
+
+
+def _varies(status: int, headers: MutableHeaders) -> bool:
+    # Could this response have been sent compressed to some other client? A
+    # 304 carries the Vary of the response it stands for.
+    if status == 304:
+        return True
+    if status < 200 or status in (204, 206) or "content-encoding" in headers:
+        return False
+    return headers.get("content-type", "").startswith(_COMPRESSIBLE)
+
+
+def _wants_compression(status: int, headers: MutableHeaders, size: int, more: bool, min_bytes: int) -> bool:
+    if status == 304 or not _varies(status, headers):
+        return False
+    return more or size >= min_bytes
+
+
+def _add_vary(headers: MutableHeaders) -> None:
+    vary = headers.get("vary")
+    if not vary:
+        headers["Vary"] = "Accept-Encoding"
+    elif "accept-encoding" not in vary.lower() and vary.strip() != "*":
+        headers["Vary"] = f"{vary}, Accept-Encoding"
+
+
+def _mark(headers: MutableHeaders, encoding: str, length: Optional[int]) -> None:
+    headers["Content-Encoding"] = encoding
+    _add_vary(headers)
+    if length is None:
+        del headers["content-length"]
+    else:
+        headers["Content-Length"] = str(length)
+    etag = headers.get("etag")
+    if etag and etag.endswith('"'):
+        # a strong tag names exact bytes, so the encoded body gets its own
+        headers["ETag"] = etag[:-1] + f'-{encoding}"'
+
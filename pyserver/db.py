@@ -2,38 +2,120 @@ import os
 import json
 import time
 import uuid
+import base64
+import functools
+import threading
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
 from psycopg_pool import ConnectionPool
 import psycopg
 
+from . import blobs, metrics, search
+from .cache import TTLCache
+from .filestore import ConflictError, FileStore
+from .sqlstore import SqliteStore
+
 DATABASE_URL = os.getenv("DATABASE_URL")
 USE_PG = bool(DATABASE_URL)
 
 DATA_DIR = Path(os.getenv("DATA_DIR", Path(__file__).resolve().parents[1] / "data"))
 DB_FILE = DATA_DIR / "db.json"
+# Opt-in write-ahead journal for the file backend (db.json becomes a periodic snapshot)
+DB_JOURNAL = os.getenv("DB_JOURNAL", "").lower() in ("1", "true", "yes")
+# Without DATABASE_URL, DB_BACKEND=sqlite stores everything in one SQLite file
+# (WAL mode) that several worker processes can share; the default is db.json.
+DB_BACKEND = os.getenv("DB_BACKEND", "file").lower()
+SQLITE_PATH = Path(os.getenv("SQLITE_PATH", DATA_DIR / "hrms.sqlite3"))
+SQLITE_BUSY_TIMEOUT = float(os.getenv("SQLITE_BUSY_TIMEOUT", "30"))
+
+# Pool sizing and statement caching. PG_PREPARE_THRESHOLD=none disables server-side
+# prepared statements (needed behind transaction-mode pgbouncer).
+PG_POOL_MIN = int(os.getenv("PG_POOL_MIN", "2"))
+PG_POOL_MAX = int(os.getenv("PG_POOL_MAX", "10"))
+PG_POOL_TIMEOUT = float(os.getenv("PG_POOL_TIMEOUT", "30"))
+PG_POOL_MAX_IDLE = float(os.getenv("PG_POOL_MAX_IDLE", "600"))
+PG_PREPARE_THRESHOLD = os.getenv("PG_PREPARE_THRESHOLD", "5")
 
 _pool: Optional[ConnectionPool] = None
+if DB_BACKEND == "sqlite":
+    # a fresh database is seeded from db.json when one exists
+    _store = SqliteStore(SQLITE_PATH, seed=DB_FILE, busy_timeout=SQLITE_BUSY_TIMEOUT)
+else:
+    _store = FileStore(
+        DB_FILE,
+        journal=DB_JOURNAL,
+        compact_bytes=int(os.getenv("DB_JOURNAL_COMPACT_BYTES", str(8 * 1024 * 1024))),
+    )
 
+# Columns that may be selected through `fields=` projections, keyed by the
+# camelCase name used by the file backend and mapped to the Postgres column.
+# Password hashes are deliberately not projectable.
+_COLUMNS: Dict[str, Dict[str, str]] = {
+    "users": {
+        "id": "id", "username": "username", "name": "name", "dept": "dept", "role": "role",
+        "createdAt": "created_at", "updatedAt": "updated_at",
+    },
+    "templates": {
+        "id": "id", "name": "name", "content": "content", "description": "description", "pageCss": "page_css",
+        "createdAt": "created_at", "updatedAt": "updated_at",
+    },
+    "documents": {
+        "id": "id", "templateId": "template_id", "content": "content", "data": "data",
+        "rendered": "rendered", "fileName": "file_name",
+        "createdAt": "created_at", "updatedAt": "updated_at",
+    },
+    "jobs": {
+        "id": "id", "kind": "kind", "status": "status", "templateId": "template_id", "total": "total",
+        "done": "done", "resultPath": "result_path", "error": "error", "createdBy": "created_by",
+        "createdAt": "created_at", "updatedAt": "updated_at",
+    },
+}
 
-def _ensure_file() -> None:
-    DATA_DIR.mkdir(parents=True, exist_ok=True)
-    if not DB_FILE.exists():
-        DB_FILE.write_text(json.dumps({"users": [], "templates": [], "documents": []}, indent=2), encoding="utf-8")
+# Identity cache used by auth so a token check doesn't hit storage on every request
+_user_cache = TTLCache(
+    maxsize=int(os.getenv("USER_CACHE_SIZE", "1024")),
+    ttl=float(os.getenv("USER_CACHE_TTL", "60")),
+)
 
+BACKEND = "postgres" if USE_PG else "sqlite" if DB_BACKEND == "sqlite" else "file"
+_db_seconds = metrics.Histogram(
+    "hrms_db_seconds", "Storage call latency by backend, table and operation", ("backend", "table", "op")
+)
 
-def _load_file() -> Dict[str, List[Dict[str, Any]]]:
-    _ensure_file()
-    with DB_FILE.open("r", encoding="utf-8") as fh:
-        return json.load(fh)
 
+def _timed(op: str):
+    # Times a storage call taking the table as its first argument; the time
+    # also counts towards the request's "db" Server-Timing phase.
+    def wrap(fn):
+        @functools.wraps(fn)
+        def inner(table: str, *args, **kwargs):
+            with metrics.timed(_db_seconds, "db", backend=BACKEND, table=table, op=op):
+                return fn(table, *args, **kwargs)
+        return inner
+    return wrap
 
-def _save_file(data: Dict[str, List[Dict[str, Any]]]) -> None:
-    DATA_DIR.mkdir(parents=True, exist_ok=True)
-    with DB_FILE.open("w", encoding="utf-8") as fh:
-        json.dump(data, fh, indent=2)
 
+def _timed_iter(fn):
+    # Generator variant: only time spent producing rows counts, not the consumer's
+    @functools.wraps(fn)
+    def inner(table: str, *args, **kwargs):
+        rows = fn(table, *args, **kwargs)
+        spent = 0.0
+        try:
+            while True:
+                started = time.perf_counter()
+                try:
+                    row = next(rows)
+                except StopIteration:
+                    return
+                finally:
+                    spent += time.perf_counter() - started
+                yield row
+        finally:
+            _db_seconds.observe(spent, backend=BACKEND, table=table, op="iter")
+            metrics.add_phase("db", spent)
+    return inner
 
 
 def get_pool() -> ConnectionPool:
@@ -41,14 +123,26 @@ def get_pool() -> ConnectionPool:
     if not USE_PG:
         raise RuntimeError("Postgres pool requested but DATABASE_URL unset")
     if _pool is None:
-        _pool = ConnectionPool(DATABASE_URL, kwargs={"autocommit": True})
+        _pool = ConnectionPool(DATABASE_URL, open=True, **pool_options())
     return _pool
 
 
 
+def pool_options() -> Dict[str, Any]:
+    prepare = None if PG_PREPARE_THRESHOLD.lower() in ("", "none", "off") else int(PG_PREPARE_THRESHOLD)
+    return {
+        "min_size": PG_POOL_MIN,
+        "max_size": max(PG_POOL_MIN, PG_POOL_MAX),
+        "timeout": PG_POOL_TIMEOUT,
+        "max_idle": PG_POOL_MAX_IDLE,
+        "kwargs": {"autocommit": True, "prepare_threshold": prepare},
+    }
+
+
+
 def init_db():
     if not USE_PG:
-        _ensure_file()
+        _store.ensure()
         return
     pool = get_pool()
     with pool.connection() as con:
@@ -93,199 +187,986 @@ def init_db():
                 )
                 """
             )
+            # extra page styles applied to this template's PDFs
+            cur.execute("ALTER TABLE templates ADD COLUMN IF NOT EXISTS page_css TEXT NOT NULL DEFAULT ''")
+            # packed bodies (see blobs.py): template copy by reference, rendered HTML compressed
+            cur.execute("ALTER TABLE documents ADD COLUMN IF NOT EXISTS content_ref TEXT")
+            cur.execute("ALTER TABLE documents ADD COLUMN IF NOT EXISTS rendered_z BYTEA")
+            cur.execute(
+                """
+                CREATE TABLE IF NOT EXISTS blobs (
+                  id TEXT PRIMARY KEY,
+                  body TEXT NOT NULL,
+                  created_at BIGINT NOT NULL
+                )
+                """
+            )
+            cur.execute(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                  id TEXT PRIMARY KEY,
+                  kind TEXT NOT NULL,
+                  status TEXT NOT NULL,
+                  template_id TEXT,
+                  payload JSONB,
+                  total INTEGER NOT NULL DEFAULT 0,
+                  done INTEGER NOT NULL DEFAULT 0,
+                  result_path TEXT,
+                  error TEXT,
+                  created_by TEXT,
+                  created_at BIGINT NOT NULL,
+                  updated_at BIGINT NOT NULL
+                )
+                """
+            )
+            # full-text search (see search_items): templates derive their vector, documents
+            # get theirs written with each insert/update since the rendered body is compressed
+            cur.execute(
+                """
+                ALTER TABLE templates ADD COLUMN IF NOT EXISTS search tsvector GENERATED ALWAYS AS (
+                  setweight(to_tsvector('simple', name || ' ' || description), 'A') ||
+                  setweight(to_tsvector('simple', content), 'B')
+                ) STORED
+                """
+            )
+            cur.execute("ALTER TABLE documents ADD COLUMN IF NOT EXISTS search tsvector")
+            cur.execute("CREATE INDEX IF NOT EXISTS templates_search_idx ON templates USING GIN (search)")
+            cur.execute("CREATE INDEX IF NOT EXISTS documents_search_idx ON documents USING GIN (search)")
+            _backfill_search(cur)
+            cur.execute("CREATE INDEX IF NOT EXISTS users_role_idx ON users (role)")
+            cur.execute("CREATE INDEX IF NOT EXISTS documents_template_created_idx ON documents (template_id, created_at)")
+            cur.execute("CREATE INDEX IF NOT EXISTS documents_content_ref_idx ON documents (content_ref)")
+            cur.execute("CREATE INDEX IF NOT EXISTS jobs_status_idx ON jobs (status)")
+            # keyset pagination walks (created_at, id) newest first
+            cur.execute("CREATE INDEX IF NOT EXISTS templates_created_id_idx ON templates (created_at, id)")
+            cur.execute("CREATE INDEX IF NOT EXISTS documents_created_id_idx ON documents (created_at, id)")
 
 
 
+def _backfill_search(cur) -> None:
+    # Documents written before the search column existed, a batch at a time
+    while True:
+        cur.execute("SELECT id, data, rendered, rendered_z FROM documents WHERE search IS NULL LIMIT 500")
+        rows = cur.fetchall()
+        if not rows:
+            return
+        cur.executemany(
+            f"UPDATE documents SET search = {_DOC_VECTOR} WHERE id = %s",
+            [
+                _search_texts({"data": data, "rendered": blobs.decompress(z) if z is not None else rendered}) + (id,)
+                for id, data, rendered, z in rows
+            ],
+        )
+
+
+
+@_timed("list")
 def list_items(table: str) -> List[Dict[str, Any]]:
     if not USE_PG:
-        data = _load_file()
-        return [dict(item) for item in data.get(table, [])]
+        return _unpack_rows(table, _store.list(table))
     pool = get_pool()
     with pool.connection() as con:
         with con.cursor(row_factory=psycopg.rows.dict_row) as cur:
             cur.execute(f"SELECT * FROM {table}")
+            rows = [dict(r) for r in cur.fetchall()]
+    return _unpack_rows(table, rows)
+
+
+
+def encode_cursor(created_at: int, id: str) -> str:
+    raw = json.dumps([created_at, id], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+
+def decode_cursor(cursor: str) -> Tuple[int, str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, id = json.loads(raw)
+        return int(created_at), str(id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+
+def _column(table: str, field: str) -> str:
+    columns = _COLUMNS.get(table)
+    if columns is None:
+        raise ValueError("Unknown table")
+    if field in columns:
+        return columns[field]
+    if field in columns.values():
+        return field
+    raise ValueError(f"Unknown field: {field}")
+
+
+
+def _file_field(table: str, field: str) -> str:
+    column = _column(table, field)
+    return next(k for k, v in _COLUMNS[table].items() if v == column)
+
+
+
+@_timed("find")
+def find_by_field(table: str, field: str, value: Any) -> List[Dict[str, Any]]:
+    if not USE_PG:
+        return _unpack_rows(table, _store.find(table, _file_field(table, field), value))
+    pool = get_pool()
+    with pool.connection() as con:
+        with con.cursor(row_factory=psycopg.rows.dict_row) as cur:
+            cur.execute(f"SELECT * FROM {table} WHERE {_column(table, field)} = %s", (value,))
+            rows = [dict(r) for r in cur.fetchall()]
+    return _unpack_rows(table, rows)
+
+
+
+@_timed("count")
+def count_by_field(table: str, field: str, value: Any) -> int:
+    if not USE_PG:
+        return _store.count(table, _file_field(table, field), value)
+    pool = get_pool()
+    with pool.connection() as con:
+        with con.cursor() as cur:
+            cur.execute(f"SELECT COUNT(*) FROM {table} WHERE {_column(table, field)} = %s", (value,))
+            return cur.fetchone()[0]
+
+
+
+@_timed("find")
+def find_fields(table: str, field: str, values: List[Any], fields: List[str]) -> List[Dict[str, Any]]:
+    # Only `fields` of the rows whose `field` is one of `values`, for periodic
+    # scans that mustn't read whole rows (a job's payload holds all its data).
+    # Plain columns only: packed document bodies come back as stored.
+    if not USE_PG:
+        key, keys = _file_field(table, field), [_file_field(table, f) for f in fields]
+        return [r for v in dict.fromkeys(values) for r in _store.find(table, key, v, keys)]
+    columns = ", ".join(dict.fromkeys(_column(table, f) for f in fields))
+    pool = get_pool()
+    with pool.connection() as con:
+        with con.cursor(row_factory=psycopg.rows.dict_row) as cur:
+            cur.execute(f"SELECT {columns} FROM {table} WHERE {_column(table, field)} = ANY(%s)", (list(values),))
             return [dict(r) for r in cur.fetchall()]
 
 
 
-def find_by_id(table: str, id: str) -> Optional[Dict[str, Any]]:
+@_timed("find")
+def existing_values(table: str, field: str, values: List[Any]) -> List[Any]:
+    # Which of `values` some row already has in `field`, checked in one pass
     if not USE_PG:
-        data = _load_file()
-        for item in data.get(table, []):
-            if item.get("id") == id:
-                return dict(item)
+        key = _file_field(table, field)
+        return [v for v in dict.fromkeys(values) if _store.count(table, key, v)]
+    column = _column(table, field)
+    pool = get_pool()
+    with pool.connection() as con:
+        with con.cursor() as cur:
+            cur.execute(f"SELECT DISTINCT {column} FROM {table} WHERE {column} = ANY(%s)", (list(values),))
+            return [r[0] for r in cur.fetchall()]
+
+
+
+def _resolve_fields(table: str, fields: Optional[List[str]]) -> Optional[List[str]]:
+    if not fields:
         return None
+    columns = _COLUMNS.get(table)
+    if columns is None:
+        raise ValueError("Unknown table")
+    snake = {v: k for k, v in columns.items()}
+    out = []
+    for f in fields:
+        name = f if f in columns else snake.get(f)
+        if name is None:
+            raise ValueError(f"Unknown field: {f}")
+        if name not in out:
+            out.append(name)
+    return out
+
+
+
+def _page_query(
+    table: str, limit: int, after: Optional[Tuple[int, str]], keep: Optional[List[str]]
+) -> Tuple[str, list]:
+    select = ", ".join(dict.fromkeys(keep + _packed_columns(table, keep) + ["created_at", "id"])) \
+        if keep is not None else "*"
+    where, params = "", []
+    if after is not None:
+        where = "WHERE (created_at, id) < (%s, %s)"
+        params.extend(after)
+    params.append(limit + 1)
+    return f"SELECT {select} FROM {table} {where} ORDER BY created_at DESC, id DESC LIMIT %s", params
+
+
+
+def _page_result(
+    rows: List[Dict[str, Any]], limit: int, ts_key: str, keep: Optional[List[str]]
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].get(ts_key) or 0, rows[-1]["id"])
+    if keep is not None:
+        rows = [{k: r[k] for k in keep if k in r} for r in rows]
+    return rows, next_cursor
+
+
+
+@_timed("page")
+def list_page(
+    table: str,
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    fields: Optional[List[str]] = None,
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    # Newest first by (created_at, id); returns the page and the cursor for the next one.
+    wanted = _resolve_fields(table, fields)
+    after = decode_cursor(cursor) if cursor else None
+    # packed bodies are only inflated when the page asks for them
+    rendered = wanted is None or "rendered" in wanted
+    if not USE_PG:
+        rows = _unpack_rows(table, _store.page(table, limit + 1, after), rendered)
+        return _page_result(rows, limit, "createdAt", wanted)
+    keep = [_COLUMNS[table][f] for f in wanted] if wanted is not None else None
+    sql, params = _page_query(table, limit, after, keep)
     pool = get_pool()
     with pool.connection() as con:
         with con.cursor(row_factory=psycopg.rows.dict_row) as cur:
-            cur.execute(f"SELECT * FROM {table} WHERE id = %s", (id,))
+            cur.execute(sql, params)
+            rows = [dict(r) for r in cur.fetchall()]
+    return _page_result(_unpack_rows(table, rows, rendered), limit, "created_at", keep)
+
+
+
+@_timed_iter
+def iter_items(
+    table: str,
+    ids: Optional[List[str]] = None,
+    template_id: Optional[str] = None,
+    created_from: Optional[int] = None,
+    created_to: Optional[int] = None,
+    batch: int = 200,
+) -> Iterator[Dict[str, Any]]:
+    # Streams matching rows oldest first; Postgres reads through a server-side cursor
+    # so memory stays flat regardless of how many rows match.
+    if not USE_PG:
+        for r in _store.scan(table, ids, template_id, created_from, created_to):
+            yield _unpack_rows(table, [r])[0]
+        return
+    where, params = [], []
+    if ids is not None:
+        where.append("id = ANY(%s)")
+        params.append(list(ids))
+    if template_id is not None:
+        where.append("template_id = %s")
+        params.append(template_id)
+    if created_from is not None:
+        where.append("created_at >= %s")
+        params.append(created_from)
+    if created_to is not None:
+        where.append("created_at < %s")
+        params.append(created_to)
+    clause = f"WHERE {' AND '.join(where)}" if where else ""
+    pool = get_pool()
+    with pool.connection() as con:
+        with con.transaction():
+            with con.cursor(name=f"iter_{uuid.uuid4().hex[:8]}", row_factory=psycopg.rows.dict_row) as cur:
+                cur.itersize = batch
+                cur.execute(f"SELECT * FROM {table} {clause} ORDER BY created_at, id", params)
+                for r in cur:
+                    yield _unpack_rows(table, [dict(r)])[0]
+
+
+
+@_timed("version")
+def version_of(table: str, id: str) -> Optional[int]:
+    # A row's updated_at without reading its body, for conditional requests
+    if not USE_PG:
+        r = _store.get(table, id)
+        return (r.get("updatedAt") or r.get("createdAt") or 0) if r else None
+    pool = get_pool()
+    with pool.connection() as con:
+        with con.cursor() as cur:
+            cur.execute(f"SELECT updated_at FROM {table} WHERE id = %s", (id,))
             r = cur.fetchone()
-            return dict(r) if r else None
+    return r[0] if r else None
 
 
 
-def add_item(table: str, item: Dict[str, Any]) -> Dict[str, Any]:
-    now = int(time.time() * 1000)
+@_timed("version")
+def collection_version(table: str) -> Tuple[int, int]:
+    # (max updated_at, row count): moves on any insert, update or delete
+    if not USE_PG:
+        return _store.version(table)
+    pool = get_pool()
+    with pool.connection() as con:
+        with con.cursor() as cur:
+            cur.execute(f"SELECT COALESCE(MAX(updated_at), 0), COUNT(*) FROM {table}")
+            return tuple(cur.fetchone())
+
+
+
+@_timed("get")
+def find_by_id(table: str, id: str) -> Optional[Dict[str, Any]]:
+    if not USE_PG:
+        r = _store.get(table, id)
+    else:
+        pool = get_pool()
+        with pool.connection() as con:
+            with con.cursor(row_factory=psycopg.rows.dict_row) as cur:
+                cur.execute(f"SELECT * FROM {table} WHERE id = %s", (id,))
+                r = cur.fetchone()
+    return _unpack_rows(table, [dict(r)])[0] if r else None
+
+
+
+def _packed_columns(table: str, keep: List[str]) -> List[str]:
+    # Projections naming content/rendered also need the packed columns behind them
+    if table != "documents":
+        return []
+    extra = {"content": "content_ref", "rendered": "rendered_z"}
+    return [extra[c] for c in keep if c in extra]
+
+
+
+def _pack_document(rec: Dict[str, Any], clear: bool = False) -> Tuple[Dict[str, Any], Optional[Tuple[str, str]]]:
+    # Returns the row to store and the (ref, body) blob it points at, if any.
+    # clear: null out the unused column of each pair instead of omitting it,
+    # for updates of rows that may have been written the other way.
+    rec = dict(rec)
+    blob = None
+    if "content" in rec:
+        rec["contentRef"] = None
+        if blobs.DOC_BLOBS and rec["content"]:
+            blob = (blobs.digest(rec["content"]), rec["content"])
+            rec["contentRef"] = blob[0]
+            rec["content"] = None
+    if "rendered" in rec:
+        rec["renderedZ"] = None
+        if blobs.DOC_BLOBS and rec["rendered"] is not None:
+            z = blobs.compress(rec["rendered"])
+            rec["renderedZ"] = z if USE_PG else blobs.to_text(z)
+            rec["rendered"] = None
+    if not clear:
+        for k in ("content", "contentRef", "rendered", "renderedZ"):
+            if k in rec and rec[k] is None:
+                del rec[k]
+    return rec, blob
+
+
+
+def _unpack_document(row: Dict[str, Any], bodies: Dict[str, Optional[str]], rendered: bool) -> Dict[str, Any]:
+    ref = row.pop("contentRef", None) or row.pop("content_ref", None)
+    row.pop("content_ref", None)
+    packed = row.pop("renderedZ", None) or row.pop("rendered_z", None)
+    row.pop("rendered_z", None)
+    if ref:
+        row["content"] = bodies.get(ref) or ""
+    if not rendered:
+        row.pop("rendered", None)
+    elif packed is not None:
+        row["rendered"] = blobs.decompress(packed)
+    return row
+
+
+
+def _blob_refs(rows: List[Dict[str, Any]]) -> Tuple[Dict[str, Optional[str]], List[str]]:
+    refs = {r.get("contentRef") or r.get("content_ref") for r in rows} - {None}
+    bodies = {ref: blobs.cached(ref) for ref in refs}
+    return bodies, [ref for ref, body in bodies.items() if body is None]
+
+
+
+def _load_blobs(refs: List[str]) -> Dict[str, str]:
+    if not USE_PG:
+        found = {ref: r["body"] for ref in refs for r in [_store.get("blobs", ref)] if r}
+    else:
+        pool = get_pool()
+        with pool.connection() as con:
+            with con.cursor() as cur:
+                cur.execute("SELECT id, body FROM blobs WHERE id = ANY(%s)", (refs,))
+                found = dict(cur.fetchall())
+    for ref, body in found.items():
+        blobs.remember(ref, body)
+    return found
+
+
+
+def _unpack_rows(table: str, rows: List[Dict[str, Any]], rendered: bool = True) -> List[Dict[str, Any]]:
+    for r in rows:
+        r.pop("search", None)
+    if table != "documents":
+        return rows
+    bodies, missing = _blob_refs(rows)
+    if missing:
+        bodies.update(_load_blobs(missing))
+    return [_unpack_document(r, bodies, rendered) for r in rows]
+
+
+
+# Rewriting an existing blob restamps created_at, which holds off the sweep (see blobs.py)
+_BLOB_SQL = (
+    "INSERT INTO blobs (id, body, created_at) VALUES (%s,%s,%s) "
+    "ON CONFLICT (id) DO UPDATE SET created_at = EXCLUDED.created_at"
+)
+
+
+
+def _new_blobs(found: List[Optional[Tuple[str, str]]]) -> Dict[str, str]:
+    # Blobs this process stamped recently are known to be stored and safe from the sweep
+    return {ref: body for ref, body in dict(filter(None, found)).items() if not blobs.written(ref)}
+
+
+
+def _save_blobs(found: List[Optional[Tuple[str, str]]], now: int, cur=None) -> None:
+    new = _new_blobs(found)
+    if not new:
+        return
+    if cur is not None:
+        cur.executemany(_BLOB_SQL, [(ref, body, now) for ref, body in new.items()])
+    else:
+        for ref, body in new.items():
+            if _store.get("blobs", ref) is None:
+                _store.insert("blobs", {"id": ref, "body": body, "createdAt": now})
+            else:
+                _store.update("blobs", ref, {"createdAt": now})
+    for ref, body in new.items():
+        blobs.remember(ref, body)
+        blobs.mark_written(ref)
+
+
+def collect_blobs() -> int:
+    # Deletes blobs no document points at any more; returns how many went
+    cutoff = int((time.time() - blobs.BLOB_GC_GRACE) * 1000)
+    if USE_PG:
+        pool = get_pool()
+        with pool.connection() as con:
+            with con.cursor() as cur:
+                cur.execute(
+                    "DELETE FROM blobs b WHERE b.created_at < %s"
+                    " AND NOT EXISTS (SELECT 1 FROM documents d WHERE d.content_ref = b.id) RETURNING b.id",
+                    (cutoff,),
+                )
+                gone = [r[0] for r in cur.fetchall()]
+    else:
+        used = {d.get("contentRef") for d in _store.list("documents")}
+        gone = [
+            b["id"] for b in _store.list("blobs")
+            if b["id"] not in used and (b.get("createdAt") or 0) < cutoff and _store.delete("blobs", b["id"])
+        ]
+    for ref in gone:
+        blobs.forget_written(ref)
+    return len(gone)
+
+
+_gc_stop = threading.Event()
+
+
+def start_blob_gc() -> None:
+    # with DOC_BLOBS off nothing writes blobs, so there is nothing to collect
+    if not blobs.DOC_BLOBS or blobs.BLOB_GC_SECONDS <= 0:
+        return
+
+    def run() -> None:
+        while not _gc_stop.wait(blobs.BLOB_GC_SECONDS):
+            try:
+                collect_blobs()
+            except Exception:
+                pass
+
+    _gc_stop.clear()
+    threading.Thread(target=run, name="blob-gc", daemon=True).start()
+
+
+def stop_blob_gc() -> None:
+    _gc_stop.set()
+
+
+
+_INSERT_SQL = {
+    "users": """
+        INSERT INTO users (id, username, name, dept, role, password_hash, created_at, updated_at)
+        VALUES (%s,%s,%s,%s,%s,%s,%s,%s)
+        RETURNING *
+    """,
+    "templates": """
+        INSERT INTO templates (id, name, content, description, page_css, created_at, updated_at)
+        VALUES (%s,%s,%s,%s,%s,%s,%s)
+        RETURNING *
+    """,
+    "documents": """
+        INSERT INTO documents (id, template_id, content, content_ref, data, rendered, rendered_z, file_name, created_at, updated_at, search)
+        VALUES (%s,%s,%s,%s,%s::jsonb,%s,%s,%s,%s,%s,
+                setweight(to_tsvector('simple', %s), 'A') || setweight(to_tsvector('simple', %s), 'B'))
+        RETURNING *
+    """,
+    "jobs": """
+        INSERT INTO jobs (id, kind, status, template_id, payload, total, done, result_path, error, created_by, created_at, updated_at)
+        VALUES (%s,%s,%s,%s,%s::jsonb,%s,%s,%s,%s,%s,%s,%s)
+        RETURNING *
+    """,
+}
+
+
+
+def _insert_params(table: str, rec: Dict[str, Any]) -> tuple:
+    if table == "users":
+        return (
+            rec["id"],
+            rec["username"],
+            rec.get("name") or rec["username"],
+            rec.get("dept", ""),
+            rec.get("role", "editor"),
+            rec["passwordHash"],
+            rec["created_at"],
+            rec["updated_at"],
+        )
+    if table == "templates":
+        return (
+            rec["id"],
+            rec["name"],
+            rec.get("content", ""),
+            rec.get("description", ""),
+            rec.get("pageCss") or "",
+            rec["created_at"],
+            rec["updated_at"],
+        )
+    if table == "documents":
+        return (
+            rec["id"],
+            rec.get("templateId"),
+            None if rec.get("contentRef") else rec.get("content", ""),
+            rec.get("contentRef"),
+            json.dumps(rec.get("data") or {}),
+            None if rec.get("renderedZ") is not None else rec.get("rendered", ""),
+            rec.get("renderedZ"),
+            rec.get("fileName"),
+            rec["created_at"],
+            rec["updated_at"],
+            *rec["_search"],
+        )
+    if table == "jobs":
+        return (
+            rec["id"],
+            rec["kind"],
+            rec.get("status", "queued"),
+            rec.get("templateId"),
+            json.dumps(rec.get("payload") or {}),
+            rec.get("total", 0),
+            rec.get("done", 0),
+            rec.get("resultPath"),
+            rec.get("error"),
+            rec.get("createdBy"),
+            rec["created_at"],
+            rec["updated_at"],
+        )
+    raise ValueError("Unknown table")
+
+
+
+def _new_record(table: str, item: Dict[str, Any], now: int) -> Dict[str, Any]:
     rec = {**item}
     rec.setdefault("id", uuid.uuid4().hex[:12])
     if USE_PG:
         rec.setdefault("created_at", now)
         rec.setdefault("updated_at", now)
-        pool = get_pool()
-        with pool.connection() as con:
-            with con.cursor(row_factory=psycopg.rows.dict_row) as cur:
-                if table == "users":
-                    cur.execute(
-                        """
-                        INSERT INTO users (id, username, name, dept, role, password_hash, created_at, updated_at)
-                        VALUES (%s,%s,%s,%s,%s,%s,%s,%s)
-                        RETURNING *
-                        """,
-                        (
-                            rec["id"],
-                            rec["username"],
-                            rec.get("name") or rec["username"],
-                            rec.get("dept", ""),
-                            rec.get("role", "editor"),
-                            rec["passwordHash"],
-                            rec["created_at"],
-                            rec["updated_at"],
-                        ),
-                    )
-                elif table == "templates":
-                    cur.execute(
-                        """
-                        INSERT INTO templates (id, name, content, description, created_at, updated_at)
-                        VALUES (%s,%s,%s,%s,%s,%s)
-                        RETURNING *
-                        """,
-                        (
-                            rec["id"],
-                            rec["name"],
-                            rec.get("content", ""),
-                            rec.get("description", ""),
-                            rec["created_at"],
-                            rec["updated_at"],
-                        ),
-                    )
-                elif table == "documents":
-                    cur.execute(
-                        """
-                        INSERT INTO documents (id, template_id, content, data, rendered, file_name, created_at, updated_at)
-                        VALUES (%s,%s,%s,%s::jsonb,%s,%s,%s,%s)
-                        RETURNING *
-                        """,
-                        (
-                            rec["id"],
-                            rec.get("templateId"),
-                            rec.get("content", ""),
-                            json.dumps(rec.get("data") or {}),
-                            rec.get("rendered", ""),
-                            rec.get("fileName"),
-                            rec["created_at"],
-                            rec["updated_at"],
-                        ),
-                    )
-                else:
-                    raise ValueError("Unknown table")
-                return dict(cur.fetchone())
+        return rec
     # File fallback uses camelCase timestamps like Node backend
     rec.setdefault("createdAt", now)
     rec.setdefault("updatedAt", now)
     if table == "users":
         rec.setdefault("dept", "")
         rec.setdefault("role", "editor")
-    data = _load_file()
-    items = data.setdefault(table, [])
-    items.append(rec)
-    _save_file(data)
-    return dict(rec)
+    return rec
+
+
+
+def _prepare_records(table: str, items: List[Dict[str, Any]], now: int):
+    recs = [_new_record(table, item, now) for item in items]
+    if table != "documents":
+        return recs, []
+    if USE_PG:
+        # search text has to come from the body before it's compressed
+        for rec in recs:
+            rec["_search"] = _search_texts(rec)
+    packed = [_pack_document(rec) for rec in recs]
+    return [rec for rec, _ in packed], [blob for _, blob in packed]
 
 
 
-def update_item(table: str, id: str, updater: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+@_timed("insert")
+def add_item(table: str, item: Dict[str, Any]) -> Dict[str, Any]:
     now = int(time.time() * 1000)
-    existing = find_by_id(table, id)
-    if not existing:
-        return None
+    (rec,), found = _prepare_records(table, [item], now)
     if USE_PG:
+        if table not in _INSERT_SQL:
+            raise ValueError("Unknown table")
         pool = get_pool()
         with pool.connection() as con:
             with con.cursor(row_factory=psycopg.rows.dict_row) as cur:
-                if table == "users":
-                    cur.execute(
-                        """
-                        UPDATE users SET username=%s, name=%s, dept=%s, role=%s, password_hash=%s, updated_at=%s
-                        WHERE id=%s RETURNING *
-                        """,
-                        (
-                            updater.get("username", existing.get("username")),
-                            updater.get("name") or existing.get("name") or existing.get("username"),
-                            updater.get("dept", existing.get("dept", "")),
-                            updater.get("role", existing.get("role", "editor")),
-                            updater.get("passwordHash") or existing.get("password_hash"),
-                            now,
-                            id,
-                        ),
-                    )
-                elif table == "templates":
-                    cur.execute(
-                        """
-                        UPDATE templates SET name=%s, content=%s, description=%s, updated_at=%s
-                        WHERE id=%s RETURNING *
-                        """,
-                        (
-                            updater.get("name", existing.get("name")),
-                            updater.get("content", existing.get("content", "")),
-                            updater.get("description", existing.get("description", "")),
-                            now,
-                            id,
-                        ),
-                    )
-                elif table == "documents":
-                    cur.execute(
-                        """
-                        UPDATE documents SET template_id=%s, content=%s, data=%s::jsonb, rendered=%s, file_name=%s, updated_at=%s
-                        WHERE id=%s RETURNING *
-                        """,
-                        (
-                            updater.get("templateId", existing.get("template_id")),
-                            updater.get("content", existing.get("content", "")),
-                            json.dumps(updater.get("data", existing.get("data") or {})),
-                            updater.get("rendered", existing.get("rendered", "")),
-                            updater.get("fileName", existing.get("file_name")),
-                            now,
-                            id,
-                        ),
+                _save_blobs(found, now, cur)
+                cur.execute(_INSERT_SQL[table], _insert_params(table, rec))
+                row = dict(cur.fetchone())
+    else:
+        _save_blobs(found, now)
+        row = _store.insert(table, rec)
+        _index_rows(table, [row])
+    return _unpack_rows(table, [row])[0]
+
+
+
+@_timed("insert_many")
+def add_items(table: str, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    # Bulk insert in one transaction (Postgres) or one write (file backend).
+    now = int(time.time() * 1000)
+    recs, found = _prepare_records(table, items, now)
+    if not recs:
+        return []
+    if USE_PG:
+        if table not in _INSERT_SQL:
+            raise ValueError("Unknown table")
+        pool = get_pool()
+        with pool.connection() as con:
+            with con.transaction():
+                with con.cursor(row_factory=psycopg.rows.dict_row) as cur:
+                    _save_blobs(found, now, cur)
+                    cur.executemany(
+                        _INSERT_SQL[table],
+                        [_insert_params(table, rec) for rec in recs],
+                        returning=True,
                     )
-                else:
-                    raise ValueError("Unknown table")
-                return dict(cur.fetchone())
-    data = _load_file()
-    items = data.get(table, [])
-    for idx, existing_item in enumerate(items):
-        if existing_item.get("id") == id:
-            merged = {**existing_item, **updater}
-            merged["updatedAt"] = now
-            items[idx] = merged
-            _save_file(data)
-            return dict(merged)
-    return None
+                    rows = []
+                    while True:
+                        rows.append(dict(cur.fetchone()))
+                        if not cur.nextset():
+                            break
+    else:
+        _save_blobs(found, now)
+        rows = _store.insert_many(table, recs)
+        _index_rows(table, rows)
+    return _unpack_rows(table, rows)
+
+
+
+# Fields an UPDATE may set, mapped to their columns; anything else in the changes is ignored
+_WRITABLE: Dict[str, Dict[str, str]] = {
+    "users": {
+        "username": "username", "name": "name", "dept": "dept", "role": "role", "passwordHash": "password_hash",
+    },
+    "templates": {"name": "name", "content": "content", "description": "description", "pageCss": "page_css"},
+    "documents": {
+        "templateId": "template_id", "content": "content", "contentRef": "content_ref", "data": "data",
+        "rendered": "rendered", "renderedZ": "rendered_z", "fileName": "file_name",
+    },
+    "jobs": {"status": "status", "total": "total", "done": "done", "resultPath": "result_path", "error": "error"},
+}
+
+
+def _update_statement(
+    table: str,
+    id: str,
+    updater: Dict[str, Any],
+    now: int,
+    expected: Optional[int] = None,
+    extra: Optional[List[Tuple[str, list]]] = None,
+) -> Tuple[str, list]:
+    # Partial update in one round trip: only the supplied columns are written,
+    # and an expected updated_at turns it into a compare-and-set. `extra` holds
+    # additional (assignment, params) pairs, see _search_sets.
+    columns = _WRITABLE.get(table)
+    if columns is None:
+        raise ValueError("Unknown table")
+    sets: List[str] = []
+    params: list = []
+    for assignment, values in extra or ():
+        sets.append(assignment)
+        params += values
+    for field, value in updater.items():
+        column = columns.get(field) or (field if field in columns.values() else None)
+        if column is None:
+            continue
+        if column == "data":
+            sets.append("data=%s::jsonb")
+            value = json.dumps(value or {})
+        else:
+            sets.append(f"{column}=%s")
+        params.append(value)
+    sets.append("updated_at=%s")
+    params += [now, id]
+    sql = f"UPDATE {table} SET {', '.join(sets)} WHERE id=%s"
+    if expected is not None:
+        sql += " AND updated_at=%s"
+        params.append(expected)
+    return sql + " RETURNING *", params
+
 
+@_timed("update")
+def update_item(
+    table: str, id: str, updater: Dict[str, Any], expected_updated_at: Optional[int] = None
+) -> Optional[Dict[str, Any]]:
+    # Returns None when the row doesn't exist; raises ConflictError when
+    # expected_updated_at is given and the row has moved on since.
+    now = int(time.time() * 1000)
+    if expected_updated_at is not None:
+        # a compare-and-set must move the version even within the same millisecond
+        now = max(now, expected_updated_at + 1)
+    changes, blob = _pack_document(updater, clear=True) if table == "documents" else (updater, None)
+    if USE_PG:
+        sql, params = _update_statement(table, id, changes, now, expected_updated_at, _search_sets(table, updater))
+        pool = get_pool()
+        with pool.connection() as con:
+            with con.cursor(row_factory=psycopg.rows.dict_row) as cur:
+                _save_blobs([blob], now, cur)
+                cur.execute(sql, params)
+                row = cur.fetchone()
+                if row is None and expected_updated_at is not None:
+                    # only a failed compare-and-set pays for telling "gone" from "stale"
+                    cur.execute(f"SELECT 1 FROM {table} WHERE id = %s", (id,))
+                    if cur.fetchone() is not None:
+                        raise ConflictError(f"{table}/{id} was modified concurrently")
+        if row is None:
+            return None
+        _invalidate(table, id)
+        return _unpack_rows(table, [dict(row)])[0]
+    _save_blobs([blob], now)
+    merged = _store.update(table, id, {**changes, "updatedAt": now}, expected_updated_at)
+    if merged is None:
+        return None
+    _index_rows(table, [merged])
+    _invalidate(table, id)
+    return _unpack_rows(table, [merged])[0]
 
 
+
+@_timed("delete")
 def remove_item(table: str, id: str) -> bool:
     if USE_PG:
         pool = get_pool()
         with pool.connection() as con:
             with con.cursor() as cur:
                 cur.execute(f"DELETE FROM {table} WHERE id = %s", (id,))
-                return cur.rowcount > 0
-    data = _load_file()
-    items = data.get(table, [])
-    new_items = [item for item in items if item.get("id") != id]
-    if len(new_items) == len(items):
+                removed = cur.rowcount > 0
+        _invalidate(table, id)
+        return removed
+    if not _store.delete(table, id):
         return False
-    data[table] = new_items
-    _save_file(data)
-    return True
\ No newline at end of file
+    if table in _SEARCHABLE:
+        _file_search.remove(table, id)
+    _invalidate(table, id)
+    return True
+
+
+
+# Full-text search. Postgres keeps a weighted tsvector per row (A: template
+# name/description or document data values, B: body text) behind a GIN
+# index; the file backend keeps an inverted index in memory (search.py).
+_SEARCHABLE = ("templates", "documents")
+_DOC_VECTOR = "setweight(to_tsvector('simple', %s), 'A') || setweight(to_tsvector('simple', %s), 'B')"
+_file_search = search.FileSearch()
+
+_SEARCH_SQL = {
+    "templates": """
+        SELECT id, name, description, content, created_at, updated_at, ts_rank_cd(search, q) AS score
+        FROM templates, websearch_to_tsquery('simple', %s) q
+        WHERE search @@ q
+        ORDER BY score DESC, created_at DESC, id
+        LIMIT %s OFFSET %s
+    """,
+    "documents": """
+        SELECT id, template_id, file_name, rendered, rendered_z, created_at, updated_at, ts_rank_cd(search, q) AS score
+        FROM documents, websearch_to_tsquery('simple', %s) q
+        WHERE search @@ q
+        ORDER BY score DESC, created_at DESC, id
+        LIMIT %s OFFSET %s
+    """,
+}
+
+
+
+def _search_texts(rec: Dict[str, Any]) -> Tuple[str, str]:
+    return search.data_text(rec.get("data")), search.html_text(rec.get("rendered") or "")
+
+
+
+def _search_sets(table: str, updater: Dict[str, Any]) -> List[Tuple[str, list]]:
+    # Rewrite only the weight class whose source changed; ts_filter keeps the other
+    if table != "documents" or ("data" not in updater and "rendered" not in updater):
+        return []
+    data, body = _search_texts(updater)
+    if "data" in updater and "rendered" in updater:
+        return [(f"search={_DOC_VECTOR}", [data, body])]
+    if "data" in updater:
+        return [("search=ts_filter(coalesce(search, ''), '{b}') || setweight(to_tsvector('simple', %s), 'A')", [data])]
+    return [("search=ts_filter(coalesce(search, ''), '{a}') || setweight(to_tsvector('simple', %s), 'B')", [body])]
+
+
+
+def _search_entry(table: str, row: Dict[str, Any]) -> tuple:
+    # (id, created, version, field text, body group, body text thunk) for FileSearch
+    created = row.get("createdAt") or 0
+    version = row.get("updatedAt") or created
+    if table == "templates":
+        content = row.get("content") or ""
+        fields = f"{row.get('name') or ''} {row.get('description') or ''}"
+        return row["id"], created, version, fields, ("template", row["id"], version), lambda: search.html_text(content)
+    # Documents share the static text of the template body they were rendered from
+    ref = row.get("contentRef") or (blobs.digest(row["content"]) if row.get("content") else None)
+    if ref is not None:
+        def body() -> str:
+            return search.static_text(row.get("content") or blobs.cached(ref) or _load_blobs([ref]).get(ref, ""))
+        return row["id"], created, version, search.data_text(row.get("data")), ref, body
+    packed = row.get("renderedZ")
+    rendered = blobs.decompress(packed) if packed is not None else row.get("rendered") or ""
+    return row["id"], created, version, search.data_text(row.get("data")), ("document", row["id"], version), \
+        lambda: search.html_text(rendered)
+
+
+
+def _index_rows(table: str, rows: List[Dict[str, Any]]) -> None:
+    # Called with stored (packed) rows right after a file-backend write
+    if table in _SEARCHABLE:
+        for row in rows:
+            _file_search.put(table, _search_entry(table, row))
+
+
+# Rows other worker processes wrote to a shared SQLite file. Each worker keeps
+# its own search index, so these are re-indexed before its next search; the
+# store reports them while holding its own lock, hence the deferral.
+_foreign: Dict[str, set] = {}
+_foreign_lock = threading.Lock()
+
+
+def _foreign_change(table: str, id: str) -> None:
+    if table in _SEARCHABLE:
+        with _foreign_lock:
+            _foreign.setdefault(table, set()).add(id)
+    _invalidate(table, id)
+
+
+def _reindex_foreign(table: str) -> None:
+    with _foreign_lock:
+        ids = _foreign.pop(table, ())
+    for id in ids:
+        row = _store.get(table, id)
+        if row is None:
+            _file_search.remove(table, id)
+        else:
+            _file_search.put(table, _search_entry(table, row))
+
+
+def _foreign_reset() -> None:
+    # Changes were missed: the search index rebuilds itself on the new
+    # generation, and any cached user may be stale
+    with _foreign_lock:
+        _foreign.clear()
+    _user_cache.clear()
+
+
+def sync_foreign() -> None:
+    # Brings caches up to date with writes other processes made to a shared
+    # SQLite file; nothing to do for the other backends.
+    if isinstance(_store, SqliteStore):
+        _store.sync()
+
+
+if isinstance(_store, SqliteStore):
+    _store.on_foreign_change(_foreign_change)
+    _store.on_foreign_reset(_foreign_reset)
+
+
+
+def _search_page(
+    table: str, rows: List[Tuple[Dict[str, Any], float]], query: str, limit: int, offset: int
+) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+    next_offset = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_offset = offset + limit
+    hits = []
+    for row, score in rows:
+        hit = {
+            "id": row["id"],
+            "createdAt": row.get("createdAt", row.get("created_at")),
+            "updatedAt": row.get("updatedAt", row.get("updated_at")),
+            "score": round(float(score), 4),
+        }
+        if table == "templates":
+            hit.update(name=row.get("name"), description=row.get("description"))
+            text = search.html_text(row.get("content") or "")
+        else:
+            hit.update(templateId=row.get("templateId", row.get("template_id")),
+                       fileName=row.get("fileName", row.get("file_name")))
+            text = search.html_text(row.get("rendered") or "")
+        hit["snippet"] = search.snippet(text, query)
+        hits.append(hit)
+    return hits, next_offset
+
+
+
+@_timed("search")
+def search_items(
+    table: str, query: str, limit: int = 20, offset: int = 0
+) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+    # Ranked matches for every word of `query`, best first, with a highlighted
+    # snippet each; returns the page and the offset of the next one.
+    if table not in _SEARCHABLE:
+        raise ValueError("Unknown table")
+    if not search.tokenize(query):
+        return [], None
+    if USE_PG:
+        pool = get_pool()
+        with pool.connection() as con:
+            with con.cursor(row_factory=psycopg.rows.dict_row) as cur:
+                cur.execute(_SEARCH_SQL[table], (query, limit + 1, offset))
+                rows = [dict(r) for r in cur.fetchall()]
+        rows = _unpack_rows(table, rows)
+        return _search_page(table, [(r, r.pop("score")) for r in rows], query, limit, offset)
+    _file_search.ensure(table, _store.generation(), lambda: (_search_entry(table, r) for r in _store.scan(table)))
+    _reindex_foreign(table)
+    matches, more = _file_search.search(table, query, limit, offset)
+    found = [(row, score) for id, score in matches for row in [_store.get(table, id)] if row is not None]
+    rows = _unpack_rows(table, [row for row, _ in found])
+    page = list(zip(rows, [score for _, score in found]))
+    hits, _ = _search_page(table, page, query, limit, offset)
+    return hits, offset + limit if more else None
+
+
+
+def _invalidate(table: str, id: str) -> None:
+    if table == "users":
+        _user_cache.pop(id)
+
+
+
+def get_user(id: str) -> Optional[Dict[str, Any]]:
+    sync_foreign()
+    cached = _user_cache.get(id)
+    if cached is not None:
+        return dict(cached)
+    user = find_by_id("users", id)
+    if user:
+        _user_cache.set(id, dict(user))
+    return user
+
+
+
+def user_cache_stats() -> Dict[str, Any]:
+    return _user_cache.stats()
+
+
+
+def pool_stats() -> Dict[str, Any]:
+    # psycopg_pool counters (pool_size, pool_available, requests_waiting, ...); empty until the pool is used
+    return _pool.get_stats() if _pool is not None else {}
+
+
+
+def _pool_metrics() -> List[str]:
+    from . import adb
+    lines: List[str] = []
+    for name, stats in (("sync", pool_stats()), ("async", adb.pool_stats())):
+        for key, value in stats.items():
+            lines.append(f'hrms_db_pool{{pool="{name}",stat="{key}"}} {value}')
+    if not lines:
+        return []
+    return ["# HELP hrms_db_pool psycopg pool statistics", "# TYPE hrms_db_pool gauge"] + lines
+
+
+metrics.register_collector(_pool_metrics)
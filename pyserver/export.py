@@ -0,0 +1,57 @@
+import re
+import time
+import zipfile
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+_unsafe_name = re.compile(r"[^A-Za-z0-9._ -]+")
+_NAME_MAX = 120
+
+
+def safe_name(name: Optional[str], fallback: str) -> str:
+    # User-chosen file names end up in ZIP entries and Content-Disposition
+    # headers: keep the last path component, in a small character set.
+    base = re.split(r"[\\/]", name or "")[-1]
+    base = _unsafe_name.sub("_", base).strip(" ._")[:_NAME_MAX].rstrip(" ._")
+    return base or fallback
+
+
+# Write-only sink for ZipFile: bytes are buffered until the generator below
+# drains them. No seek(), so zipfile falls back to data descriptors and never
+# needs to rewind into what was already sent.
+class _Sink:
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._pos = 0
+
+    def write(self, data: bytes) -> int:
+        self._chunks.append(bytes(data))
+        self._pos += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._pos
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        out = b"".join(self._chunks)
+        self._chunks = []
+        return out
+
+
+def stream_zip(entries: Iterable[Tuple[str, bytes, bool]]) -> Iterator[bytes]:
+    # entries yield (name, payload, compress); one entry is held in memory at a time
+    sink = _Sink()
+    with zipfile.ZipFile(sink, "w") as zf:
+        for name, payload, compress in entries:
+            info = zipfile.ZipInfo(name, date_time=time.localtime()[:6])
+            info.compress_type = zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED
+            with zf.open(info, "w") as fh:
+                fh.write(payload)
+            chunk = sink.drain()
+            if chunk:
+                yield chunk
+    tail = sink.drain()
+    if tail:
+        yield tail
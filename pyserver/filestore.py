@@ -0,0 +1,415 @@
+import heapq
+import json
+import os
+import shutil
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from . import metrics
+
+TABLES = ("users", "templates", "documents")
+
+_io_seconds = metrics.Histogram(
+    "hrms_filestore_io_seconds", "JSON store disk I/O by operation (load, save, journal, compact)", ("op",)
+)
+
+
+class ConflictError(Exception):
+    # An update carried an expected updatedAt that no longer matches the stored row
+    pass
+
+
+# Append-only log of mutations with group commit: writers enqueue a line and
+# whichever thread finds no flush in progress writes the whole pending batch
+# and issues a single fsync on behalf of everyone queued behind it.
+class Journal:
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._cond = threading.Condition()
+        self._pending: List[str] = []
+        self._seq = 0
+        self._durable = 0
+        self._flushing = False
+        self._fh = None
+
+    def append(self, entry: Dict[str, Any]) -> int:
+        line = json.dumps(entry, separators=(",", ":"))
+        with self._cond:
+            self._pending.append(line)
+            self._seq += 1
+            return self._seq
+
+    def wait(self, seq: int) -> None:
+        with self._cond:
+            while self._durable < seq:
+                if self._flushing:
+                    self._cond.wait()
+                    continue
+                batch, upto = self._pending, self._seq
+                self._pending = []
+                self._flushing = True
+                self._cond.release()
+                try:
+                    self._write(batch)
+                except BaseException:
+                    self._cond.acquire()
+                    self._pending[:0] = batch
+                    self._flushing = False
+                    self._cond.notify_all()
+                    raise
+                self._cond.acquire()
+                self._flushing = False
+                self._durable = upto
+                self._cond.notify_all()
+
+    def drain(self) -> None:
+        with self._cond:
+            seq = self._seq
+        self.wait(seq)
+
+    def _write(self, batch: List[str]) -> None:
+        with metrics.timed(_io_seconds, op="journal"):
+            if self._fh is None:
+                self._fh = self.path.open("a", encoding="utf-8")
+            self._fh.write("\n".join(batch) + "\n")
+            self._fh.flush()
+            os.fsync(self._fh.fileno())
+
+    def size(self) -> int:
+        try:
+            return self.path.stat().st_size
+        except FileNotFoundError:
+            return 0
+
+    def rotate(self, target: Path) -> None:
+        # Caller must have drained the journal and hold the store lock. A
+        # target left by a compaction that failed holds entries the snapshot
+        # on disk still lacks, so the journal is appended to it instead of
+        # replacing it. Replaying an entry twice (a crash before the unlink)
+        # is harmless: puts and deletes are idempotent.
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+        if not self.path.exists():
+            return
+        if not target.exists():
+            os.replace(self.path, target)
+            return
+        with metrics.timed(_io_seconds, op="journal"):
+            with target.open("r+b") as dst:
+                # drop a torn tail first, or replay would stop there
+                kept = dst.read().rfind(b"\n") + 1
+                dst.seek(kept)
+                dst.truncate()
+                with self.path.open("rb") as src:
+                    shutil.copyfileobj(src, dst)
+                dst.flush()
+                os.fsync(dst.fileno())
+        self.path.unlink()
+
+
+def _replay(tables: Dict[str, Dict[str, Dict[str, Any]]], path: Path) -> None:
+    if not path.exists():
+        return
+    with path.open("r", encoding="utf-8") as fh:
+        for line in fh:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # torn tail from a crash mid-append; everything before it is intact
+                break
+            rows = tables.setdefault(entry["t"], {})
+            if entry["op"] == "put":
+                rows[entry["r"]["id"]] = entry["r"]
+            elif entry["op"] == "del":
+                rows.pop(entry["id"], None)
+
+
+# Memory-resident view of db.json. Tables are kept as ordered `id -> record`
+# dicts and only re-parsed when the file's mtime/size changes underneath us
+# (e.g. the Node server or another worker wrote it).
+#
+# With `journal=True` mutations are appended to db.journal instead of
+# rewriting db.json, and the journal is folded into a fresh snapshot by a
+# background thread once it grows past `compact_bytes`. The process then
+# owns the files, so external edits to db.json are not picked up.
+class FileStore:
+    def __init__(self, path: Path, journal: bool = False, compact_bytes: int = 8 * 1024 * 1024):
+        self.path = Path(path)
+        self._lock = threading.RLock()
+        self._tables: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self._stamp: Optional[Tuple[int, int]] = None
+        self._generation = 0
+        # table -> write count, and table -> (generation, writes, (max updatedAt, rows)) for version()
+        self._writes: Dict[str, int] = {}
+        self._versions: Dict[str, Tuple[int, int, Tuple[int, int]]] = {}
+        self._journal_path = self.path.with_suffix(".journal")
+        self._rotated_path = self.path.with_suffix(".journal.1")
+        self._journal = Journal(self._journal_path) if journal else None
+        self._compact_bytes = compact_bytes
+        self._compacting = False
+        # (table, field) -> value -> {id: record}; built on first lookup, then maintained
+        self._secondary: Dict[Tuple[str, str], Dict[Any, Dict[str, Dict[str, Any]]]] = {}
+
+    def ensure(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if not self.path.exists():
+            self.path.write_text(json.dumps({t: [] for t in TABLES}, indent=2), encoding="utf-8")
+
+    def _stat(self) -> Tuple[int, int]:
+        st = self.path.stat()
+        return (st.st_mtime_ns, st.st_size)
+
+    def _refresh(self) -> None:
+        if self._journal is not None and self._stamp is not None:
+            return
+        self.ensure()
+        stamp = self._stat()
+        if stamp == self._stamp:
+            return
+        with metrics.timed(_io_seconds, op="load"):
+            with self.path.open("r", encoding="utf-8") as fh:
+                raw = json.load(fh)
+            tables = {
+                name: {item.get("id"): item for item in items}
+                for name, items in raw.items()
+                if isinstance(items, list)
+            }
+            _replay(tables, self._rotated_path)
+            _replay(tables, self._journal_path)
+        self._tables = tables
+        self._secondary = {}
+        self._stamp = stamp
+        self._generation += 1
+
+    def generation(self) -> int:
+        # Bumped whenever the tables are (re)loaded from disk, so derived
+        # in-memory indexes know to rebuild
+        with self._lock:
+            self._refresh()
+            return self._generation
+
+    def _snapshot(self) -> Dict[str, List[Dict[str, Any]]]:
+        return {name: list(rows.values()) for name, rows in self._tables.items()}
+
+    def _write_snapshot(self, data: Dict[str, List[Dict[str, Any]]], **dump_kwargs) -> None:
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        with tmp.open("w", encoding="utf-8") as fh:
+            json.dump(data, fh, **dump_kwargs)
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp, self.path)
+
+    def _flush(self) -> None:
+        with metrics.timed(_io_seconds, op="save"):
+            self._write_snapshot(self._snapshot(), indent=2)
+        # a previous journal-mode run may have left entries we just folded in
+        for leftover in (self._rotated_path, self._journal_path):
+            if leftover.exists():
+                leftover.unlink()
+        self._stamp = self._stat()
+
+    def _commit(self, entries: List[Dict[str, Any]]) -> Optional[int]:
+        # Called with the store lock held; returns a sequence to wait on after
+        # the lock is released so concurrent writers share one fsync.
+        if self._journal is None:
+            self._flush()
+            return None
+        seq = 0
+        for entry in entries:
+            seq = self._journal.append(entry)
+        return seq
+
+    def _durable(self, seq: Optional[int]) -> None:
+        if self._journal is None or seq is None:
+            return
+        self._journal.wait(seq)
+        if self._journal.size() >= self._compact_bytes:
+            self._start_compaction()
+
+    def _start_compaction(self) -> None:
+        with self._lock:
+            if self._compacting:
+                return
+            self._compacting = True
+            self._journal.drain()
+            self._journal.rotate(self._rotated_path)
+            data = self._snapshot()
+        threading.Thread(target=self._compact, args=(data,), daemon=True).start()
+
+    def _compact(self, data: Dict[str, List[Dict[str, Any]]]) -> None:
+        try:
+            with metrics.timed(_io_seconds, op="compact"):
+                self._write_snapshot(data, separators=(",", ":"))
+            if self._rotated_path.exists():
+                self._rotated_path.unlink()
+        finally:
+            with self._lock:
+                self._compacting = False
+
+    def compact(self) -> None:
+        if self._journal is None:
+            return
+        self._start_compaction()
+
+    def _table(self, table: str) -> Dict[str, Dict[str, Any]]:
+        return self._tables.setdefault(table, {})
+
+    def list(self, table: str) -> List[Dict[str, Any]]:
+        with self._lock:
+            self._refresh()
+            return [dict(item) for item in self._table(table).values()]
+
+    def page(
+        self, table: str, limit: int, after: Optional[Tuple[int, str]] = None
+    ) -> List[Dict[str, Any]]:
+        # Newest `limit` rows strictly before `after` in (createdAt, id) order.
+        def key(item: Dict[str, Any]) -> Tuple[int, str]:
+            return (item.get("createdAt") or item.get("created_at") or 0, item.get("id") or "")
+
+        with self._lock:
+            self._refresh()
+            rows = self._table(table).values()
+            if after is not None:
+                rows = (item for item in rows if key(item) < after)
+            return [dict(item) for item in heapq.nlargest(limit, rows, key=key)]
+
+    def scan(
+        self,
+        table: str,
+        ids: Optional[List[str]] = None,
+        template_id: Optional[str] = None,
+        created_from: Optional[int] = None,
+        created_to: Optional[int] = None,
+    ) -> Iterator[Dict[str, Any]]:
+        # Matching rows oldest first. Only references are collected under the
+        # lock; copies are handed out lazily.
+        with self._lock:
+            self._refresh()
+            rows = self._table(table)
+            if ids is not None:
+                candidates = [rows[i] for i in dict.fromkeys(ids) if i in rows]
+            else:
+                candidates = list(rows.values())
+        matched = []
+        for item in candidates:
+            created = item.get("createdAt") or item.get("created_at") or 0
+            if template_id is not None and (item.get("templateId") or item.get("template_id")) != template_id:
+                continue
+            if created_from is not None and created < created_from:
+                continue
+            if created_to is not None and created >= created_to:
+                continue
+            matched.append(item)
+        matched.sort(key=lambda item: (item.get("createdAt") or item.get("created_at") or 0, item.get("id") or ""))
+        for item in matched:
+            yield dict(item)
+
+    def get(self, table: str, id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            self._refresh()
+            item = self._table(table).get(id)
+            return dict(item) if item is not None else None
+
+    def version(self, table: str) -> Tuple[int, int]:
+        # (latest updatedAt, row count): changes whenever the table does.
+        # Recomputed on first use after a write, not on every call.
+        with self._lock:
+            self._refresh()
+            writes = self._writes.get(table, 0)
+            cached = self._versions.get(table)
+            if cached is not None and cached[:2] == (self._generation, writes):
+                return cached[2]
+            rows = self._table(table).values()
+            value = (max((r.get("updatedAt") or r.get("createdAt") or 0 for r in rows), default=0), len(rows))
+            self._versions[table] = (self._generation, writes, value)
+            return value
+
+    def _index(self, table: str, field: str) -> Dict[Any, Dict[str, Dict[str, Any]]]:
+        idx = self._secondary.get((table, field))
+        if idx is None:
+            idx = {}
+            for id, item in self._table(table).items():
+                idx.setdefault(item.get(field), {})[id] = item
+            self._secondary[(table, field)] = idx
+        return idx
+
+    def _reindex(self, table: str, old: Optional[Dict[str, Any]], new: Optional[Dict[str, Any]]) -> None:
+        for (t, field), idx in self._secondary.items():
+            if t != table:
+                continue
+            if old is not None:
+                bucket = idx.get(old.get(field))
+                if bucket is not None:
+                    bucket.pop(old["id"], None)
+                    if not bucket:
+                        del idx[old.get(field)]
+            if new is not None:
+                idx.setdefault(new.get(field), {})[new["id"]] = new
+
+    def _put(self, table: str, rec: Dict[str, Any]) -> None:
+        self._writes[table] = self._writes.get(table, 0) + 1
+        rows = self._table(table)
+        self._reindex(table, rows.get(rec["id"]), rec)
+        rows[rec["id"]] = rec
+
+    def find(
+        self, table: str, field: str, value: Any, keys: Optional[List[str]] = None
+    ) -> List[Dict[str, Any]]:
+        with self._lock:
+            self._refresh()
+            items = self._index(table, field).get(value, {}).values()
+            if keys is not None:
+                return [{k: item.get(k) for k in keys} for item in items]
+            return [dict(item) for item in items]
+
+    def count(self, table: str, field: str, value: Any) -> int:
+        with self._lock:
+            self._refresh()
+            return len(self._index(table, field).get(value, ()))
+
+    def insert(self, table: str, rec: Dict[str, Any]) -> Dict[str, Any]:
+        with self._lock:
+            self._refresh()
+            self._put(table, rec)
+            seq = self._commit([{"op": "put", "t": table, "r": rec}])
+        self._durable(seq)
+        return dict(rec)
+
+    def insert_many(self, table: str, recs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        with self._lock:
+            self._refresh()
+            for rec in recs:
+                self._put(table, rec)
+            seq = self._commit([{"op": "put", "t": table, "r": rec} for rec in recs])
+        self._durable(seq)
+        return [dict(rec) for rec in recs]
+
+    def update(
+        self, table: str, id: str, changes: Dict[str, Any], expected: Optional[int] = None
+    ) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            self._refresh()
+            existing = self._table(table).get(id)
+            if existing is None:
+                return None
+            if expected is not None and (existing.get("updatedAt") or existing.get("createdAt")) != expected:
+                raise ConflictError(f"{table}/{id} was modified concurrently")
+            merged = {**existing, **changes}
+            self._put(table, merged)
+            seq = self._commit([{"op": "put", "t": table, "r": merged}])
+        self._durable(seq)
+        return dict(merged)
+
+    def delete(self, table: str, id: str) -> bool:
+        with self._lock:
+            self._refresh()
+            existing = self._table(table).pop(id, None)
+            if existing is None:
+                return False
+            self._reindex(table, existing, None)
+            self._writes[table] = self._writes.get(table, 0) + 1
+            seq = self._commit([{"op": "del", "t": table, "id": id}])
+        self._durable(seq)
+        return True
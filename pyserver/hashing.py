@@ -0,0 +1,221 @@
+import contextvars
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, List, Optional
+
+import bcrypt
+
+from . import metrics
+
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# bcrypt releases the GIL, so a few threads use that many cores; the queue
+# bound keeps a login burst from piling up behind them.
+BCRYPT_WORKERS = int(os.getenv("BCRYPT_WORKERS", str(min(4, os.cpu_count() or 1))))
+BCRYPT_QUEUE_SIZE = int(os.getenv("BCRYPT_QUEUE_SIZE", str(BCRYPT_WORKERS * 8)))
+# Bulk provisioning hashes on its own process pool (started on first use), so
+# a few thousand new accounts neither queue behind logins nor starve them.
+# BCRYPT_BULK_WORKERS=0 hashes on the login threads instead, through the same
+# queue bound as logins and only BCRYPT_WORKERS chunks at a time.
+BCRYPT_BULK_WORKERS = int(os.getenv("BCRYPT_BULK_WORKERS", str(os.cpu_count() or 1)))
+_BULK_CHUNK = 8
+
+
+class HashingBusy(Exception):
+    pass
+
+
+_bcrypt_seconds = metrics.Histogram("hrms_bcrypt_seconds", "bcrypt time by operation", ("op",))
+
+
+_executor = ThreadPoolExecutor(max_workers=max(1, BCRYPT_WORKERS), thread_name_prefix="bcrypt")
+_slots = threading.BoundedSemaphore(BCRYPT_QUEUE_SIZE)
+_stats_lock = threading.Lock()
+_stats: Dict[str, Any] = {
+    "verifies": 0,
+    "mismatches": 0,
+    "hashes": 0,
+    "rehashes": 0,
+    "rejected": 0,
+    "verifySecondsTotal": 0.0,
+    "verifySecondsMax": 0.0,
+}
+_bulk_executor: Optional[ProcessPoolExecutor] = None
+_bulk_lock = threading.Lock()
+
+
+def stored_hash(user: Dict[str, Any]) -> str:
+    # File rows use passwordHash (like the Node backend), Postgres rows password_hash
+    return user.get("passwordHash") or user.get("password_hash") or ""
+
+
+def cost(hashed: str) -> Optional[int]:
+    parts = hashed.split("$")
+    try:
+        return int(parts[2])
+    except (IndexError, ValueError):
+        return None
+
+
+def needs_rehash(hashed: str) -> bool:
+    return cost(hashed) != BCRYPT_ROUNDS
+
+
+def _submit(fn, *args) -> Future:
+    if not _slots.acquire(blocking=False):
+        with _stats_lock:
+            _stats["rejected"] += 1
+        raise HashingBusy("Too many password operations in flight")
+    try:
+        # run in the caller's context so the time shows up in its Server-Timing
+        fut = _executor.submit(contextvars.copy_context().run, fn, *args)
+    except BaseException:
+        _slots.release()
+        raise
+    fut.add_done_callback(lambda _f: _slots.release())
+    return fut
+
+
+def _verify(password: str, hashed: str) -> bool:
+    started = time.perf_counter()
+    try:
+        ok = bool(hashed) and bcrypt.checkpw(password.encode("utf-8"), hashed.encode("utf-8"))
+    except ValueError:
+        # malformed hash in storage
+        ok = False
+    elapsed = time.perf_counter() - started
+    _bcrypt_seconds.observe(elapsed, op="verify")
+    metrics.add_phase("hash", elapsed)
+    with _stats_lock:
+        _stats["verifies"] += 1
+        _stats["mismatches"] += 0 if ok else 1
+        _stats["verifySecondsTotal"] += elapsed
+        _stats["verifySecondsMax"] = max(_stats["verifySecondsMax"], elapsed)
+    return ok
+
+
+def _hash(password: str) -> str:
+    with metrics.timed(_bcrypt_seconds, "hash", op="hash"):
+        hashed = bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt(BCRYPT_ROUNDS)).decode("utf-8")
+    with _stats_lock:
+        _stats["hashes"] += 1
+    return hashed
+
+
+def submit_verify(password: str, hashed: str) -> Future:
+    return _submit(_verify, password, hashed)
+
+
+def submit_hash(password: str) -> Future:
+    return _submit(_hash, password)
+
+
+def _hash_chunk(passwords: List[str], rounds: int) -> List[Optional[str]]:
+    out: List[Optional[str]] = []
+    for password in passwords:
+        try:
+            out.append(bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt(rounds)).decode("utf-8"))
+        except ValueError:
+            # bcrypt refuses passwords over 72 bytes
+            out.append(None)
+    return out
+
+
+def _get_bulk_executor() -> ProcessPoolExecutor:
+    global _bulk_executor
+    with _bulk_lock:
+        if _bulk_executor is None:
+            _bulk_executor = ProcessPoolExecutor(
+                max_workers=max(1, BCRYPT_BULK_WORKERS),
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _bulk_executor
+
+
+def _reset_bulk_executor(broken: Optional[ProcessPoolExecutor] = None) -> None:
+    # With `broken`, only drop the pool if it's still the current one (see pdf.py)
+    global _bulk_executor
+    with _bulk_lock:
+        if broken is not None and _bulk_executor is not broken:
+            return
+        if _bulk_executor is not None:
+            _bulk_executor.shutdown(wait=False, cancel_futures=True)
+        _bulk_executor = None
+
+
+def _hash_admitted(chunks: List[List[str]]) -> List[Optional[str]]:
+    # Each chunk takes a queue slot like a login hash would, raising
+    # HashingBusy when there is none; the window leaves slots for logins.
+    out: List[Optional[str]] = []
+    pending: deque = deque()
+    try:
+        for chunk in chunks:
+            if len(pending) >= max(1, BCRYPT_WORKERS):
+                out.extend(pending.popleft().result())
+            pending.append(_submit(_hash_chunk, chunk, BCRYPT_ROUNDS))
+        while pending:
+            out.extend(pending.popleft().result())
+    except BaseException:
+        for fut in pending:
+            fut.cancel()
+        raise
+    return out
+
+
+def _hash_on_pool(chunks: List[List[str]]) -> List[Optional[str]]:
+    for attempt in range(2):
+        executor = _get_bulk_executor()
+        try:
+            done = executor.map(_hash_chunk, chunks, [BCRYPT_ROUNDS] * len(chunks))
+            return [h for chunk in done for h in chunk]
+        except BrokenProcessPool:
+            # a worker died: start a fresh pool and hash the batch once more
+            _reset_bulk_executor(executor)
+            if attempt:
+                raise
+
+
+def hash_many(passwords: List[str]) -> List[Optional[str]]:
+    # One hash per password, in order; None where bcrypt rejected the input
+    chunks = [passwords[i:i + _BULK_CHUNK] for i in range(0, len(passwords), _BULK_CHUNK)]
+    with metrics.timed(_bcrypt_seconds, "hash", op="hash_many"):
+        out = _hash_on_pool(chunks) if BCRYPT_BULK_WORKERS > 0 else _hash_admitted(chunks)
+    with _stats_lock:
+        _stats["hashes"] += sum(1 for h in out if h is not None)
+    return out
+
+
+def shutdown() -> None:
+    _reset_bulk_executor()
+
+
+def verify_password(password: str, hashed: str) -> bool:
+    return submit_verify(password, hashed).result()
+
+
+def hash_password(password: str) -> str:
+    return submit_hash(password).result()
+
+
+def record_rehash() -> None:
+    with _stats_lock:
+        _stats["rehashes"] += 1
+
+
+def hashing_stats() -> Dict[str, Any]:
+    with _stats_lock:
+        out = dict(_stats)
+    out["rounds"] = BCRYPT_ROUNDS
+    out["workers"] = BCRYPT_WORKERS
+    out["queueSize"] = BCRYPT_QUEUE_SIZE
+    out["verifySecondsAvg"] = out["verifySecondsTotal"] / out["verifies"] if out["verifies"] else 0.0
+    return out
+
+
+metrics.register_collector(lambda: metrics.gauge_lines(
+    "hrms_hashing", "bcrypt pool counters (see /api/admin/stats)", hashing_stats(), label="stat",
+))
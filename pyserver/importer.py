@@ -0,0 +1,137 @@
+import asyncio
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from .templating import extract_highlighted_placeholders, normalize_html
+
+# mammoth is pure Python, so DOCX conversion runs in worker processes like
+# PDF rendering does. IMPORT_WORKERS=0 converts in a thread instead.
+IMPORT_WORKERS = int(os.getenv("IMPORT_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))
+IMPORT_MAX_BYTES = int(os.getenv("IMPORT_MAX_BYTES", str(20 * 1024 * 1024)))
+IMPORT_MAX_FILES = int(os.getenv("IMPORT_MAX_FILES", "200"))
+# Uploads are copied here before conversion; unset means the system temp dir
+IMPORT_SPOOL_DIR = os.getenv("IMPORT_SPOOL_DIR") or None
+
+IMPORTABLE = (".docx", ".html", ".htm", ".txt")
+_CHUNK = 1024 * 1024
+
+
+class ImportTooLarge(Exception):
+    pass
+
+
+class TooManyFiles(ImportTooLarge):
+    pass
+
+
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def convert_file(path: str, filename: str) -> Dict[str, Any]:
+    name = os.path.splitext(os.path.basename(filename))[0] or "Imported Template"
+    if filename.lower().endswith(".docx"):
+        import mammoth
+        with open(path, "rb") as fh:
+            html = mammoth.convert_to_html(fh).value or ""
+    else:
+        with open(path, "rb") as fh:
+            html = fh.read().decode("utf-8", errors="ignore")
+    ph = extract_highlighted_placeholders(normalize_html(html))
+    return {"name": name, "content": normalize_html(ph["html"]), "vars": ph["vars"], "defaults": ph["defaults"]}
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=IMPORT_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _executor
+
+
+def _reset_executor(broken: Optional[ProcessPoolExecutor] = None) -> None:
+    # With `broken`, only drop the pool if it's still the current one (see pdf.py)
+    global _executor
+    with _executor_lock:
+        if broken is not None and _executor is not broken:
+            return
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+async def convert(path: str, filename: str) -> Dict[str, Any]:
+    if IMPORT_WORKERS <= 0:
+        return await asyncio.to_thread(convert_file, path, filename)
+    for attempt in range(2):
+        executor = _get_executor()
+        try:
+            return await asyncio.wrap_future(executor.submit(convert_file, path, filename))
+        except BrokenProcessPool:
+            # A worker died, maybe converting some other file: every conversion
+            # on that pool fails with it, so start a fresh pool and retry once.
+            _reset_executor(executor)
+            if attempt:
+                raise
+
+
+async def spool(upload, dest: Path) -> Path:
+    # Copy an UploadFile to disk in chunks so a large upload is never held in memory
+    fd, name = tempfile.mkstemp(dir=dest, prefix="upload-")
+    size = 0
+    with os.fdopen(fd, "wb") as out:
+        while True:
+            chunk = await upload.read(_CHUNK)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > IMPORT_MAX_BYTES:
+                raise ImportTooLarge(f"{upload.filename or 'upload'} exceeds {IMPORT_MAX_BYTES} bytes")
+            out.write(chunk)
+    return Path(name)
+
+
+def unpack_zip(
+    path: Path, dest: Path, max_files: int = IMPORT_MAX_FILES
+) -> List[Tuple[str, Optional[Path], Optional[str]]]:
+    # Returns (member name, extracted path or None, error or None) for every
+    # importable member; count and sizes are checked against the central
+    # directory before anything is extracted.
+    out: List[Tuple[str, Optional[Path], Optional[str]]] = []
+    with zipfile.ZipFile(path) as zf:
+        members = [
+            m for m in zf.infolist()
+            if not m.is_dir() and not m.filename.startswith("__MACOSX/")
+            and os.path.basename(m.filename) and not os.path.basename(m.filename).startswith(".")
+            and m.filename.lower().endswith(IMPORTABLE)
+        ]
+        if len(members) > max_files:
+            raise TooManyFiles(f"At most {IMPORT_MAX_FILES} files per import")
+        for i, m in enumerate(members):
+            if m.file_size > IMPORT_MAX_BYTES:
+                out.append((m.filename, None, f"exceeds {IMPORT_MAX_BYTES} bytes"))
+                continue
+            target = dest / f"member-{i}"
+            with zf.open(m) as src, open(target, "wb") as dst:
+                shutil.copyfileobj(src, dst, _CHUNK)
+            out.append((m.filename, target, None))
+    return out
+
+
+def spool_dir() -> tempfile.TemporaryDirectory:
+    return tempfile.TemporaryDirectory(prefix="hrms-import-", dir=IMPORT_SPOOL_DIR)
+
+
+def shutdown() -> None:
+    _reset_executor()
@@ -0,0 +1,304 @@
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from . import metrics
+from .db import DATA_DIR, ConflictError, add_item, find_by_id, find_fields, update_item
+from .export import safe_name
+from .pdf import PDF_WORKERS, LETTER_CSS, page_job, render_pdf_retrying
+from .templating import get_compiled, render_compiled
+
+JOBS_DIR = Path(os.getenv("JOBS_DIR", DATA_DIR / "jobs"))
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "1"))
+# PDFs a single job keeps in flight in the render pool
+JOB_PDF_CONCURRENCY = int(os.getenv("JOB_PDF_CONCURRENCY", str(max(1, PDF_WORKERS))))
+# Persist progress at most this often so a big job doesn't turn into a write storm
+PROGRESS_INTERVAL = 1.0
+# Several processes may share the jobs table, so a job row doubles as its
+# lease: a runner claims it with a compare-and-set on updatedAt and keeps it
+# by writing progress. A running job nobody has written for
+# JOB_LEASE_SECONDS is presumed orphaned and may be claimed again.
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "120"))
+# Finished ZIPs are deleted, and their jobs marked expired, after this long
+JOB_RESULT_TTL = float(os.getenv("JOB_RESULT_TTL", str(24 * 3600)))
+# How often idle workers look for orphaned jobs and expired results
+JOB_SWEEP_SECONDS = float(os.getenv("JOB_SWEEP_SECONDS", "30"))
+
+_log = logging.getLogger(__name__)
+_errors = metrics.Counter("hrms_job_errors_total", "Unexpected failures in the job workers", ("stage",))
+
+_queue: "queue.Queue[Optional[str]]" = queue.Queue()
+_threads: List[threading.Thread] = []
+_queued_lock = threading.Lock()
+_queued: set = set()
+_sweep_lock = threading.Lock()
+_last_sweep = 0.0
+
+
+def _field(rec: Dict[str, Any], camel: str, snake: str, default: Any = None) -> Any:
+    v = rec.get(camel)
+    if v is None:
+        v = rec.get(snake, default)
+    return v
+
+
+def public_job(rec: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "id": rec["id"],
+        "kind": rec.get("kind"),
+        "status": rec.get("status"),
+        "templateId": _field(rec, "templateId", "template_id"),
+        "total": rec.get("total", 0),
+        "done": rec.get("done", 0),
+        "error": rec.get("error"),
+        "createdBy": _field(rec, "createdBy", "created_by"),
+        "createdAt": _field(rec, "createdAt", "created_at"),
+        "updatedAt": _field(rec, "updatedAt", "updated_at"),
+    }
+
+
+def _version(rec: Dict[str, Any]) -> int:
+    return _field(rec, "updatedAt", "updated_at") or _field(rec, "createdAt", "created_at") or 0
+
+
+def result_path(rec: Dict[str, Any]) -> Optional[Path]:
+    p = _field(rec, "resultPath", "result_path")
+    return Path(p) if p else None
+
+
+def create_pdf_job(
+    template_id: Optional[str],
+    content: str,
+    rows: List[Dict[str, Any]],
+    file_name_field: Optional[str],
+    created_by: Optional[str],
+    page_css: str = "",
+) -> Dict[str, Any]:
+    job = add_item("jobs", {
+        "kind": "pdf",
+        "status": "queued",
+        "templateId": template_id,
+        "payload": {"content": content, "rows": rows, "fileNameField": file_name_field, "pageCss": page_css},
+        "total": len(rows),
+        "done": 0,
+        "resultPath": None,
+        "error": None,
+        "createdBy": created_by,
+    })
+    _enqueue(job["id"])
+    return job
+
+
+def _enqueue(job_id: str) -> None:
+    with _queued_lock:
+        if job_id in _queued:
+            return
+        _queued.add(job_id)
+    _queue.put(job_id)
+
+
+class _LeaseLost(Exception):
+    pass
+
+
+class _Lease:
+    # Every write is a compare-and-set against the version we last wrote, so
+    # a runner that stalled past its lease finds out instead of clobbering
+    # the runner that took over.
+    def __init__(self, job: Dict[str, Any]):
+        self.id = job["id"]
+        self.version = _version(job)
+
+    def write(self, changes: Dict[str, Any]) -> None:
+        try:
+            row = update_item("jobs", self.id, changes, self.version)
+        except ConflictError:
+            raise _LeaseLost(self.id)
+        if row is None:
+            raise _LeaseLost(self.id)
+        self.version = _version(row)
+
+
+def _claimable(job: Dict[str, Any], now_ms: int) -> bool:
+    status = job.get("status")
+    if status == "queued":
+        return True
+    return status == "running" and now_ms - _version(job) >= JOB_LEASE_SECONDS * 1000
+
+
+def _claim(job_id: str) -> Optional[_Lease]:
+    job = find_by_id("jobs", job_id)
+    if not job or not _claimable(job, int(time.time() * 1000)):
+        return None
+    lease = _Lease(job)
+    try:
+        lease.write({"status": "running", "done": 0, "error": None})
+    except _LeaseLost:
+        return None  # another worker got there first
+    return lease
+
+
+def _entry_name(row: Dict[str, Any], field: Optional[str], i: int, used: set) -> str:
+    value = row.get(field) if field else None
+    base = safe_name(None if value is None else str(value), f"document-{i + 1:05d}")
+    name, n = base, 1
+    while name in used:
+        n += 1
+        name = f"{base}-{n}"
+    used.add(name)
+    return f"{name}.pdf"
+
+
+def _run(job_id: str) -> None:
+    lease = _claim(job_id)
+    if lease is None:
+        return
+    job = find_by_id("jobs", job_id) or {}
+    payload = job.get("payload") or {}
+    rows = payload.get("rows") or []
+    field = payload.get("fileNameField")
+    parts = get_compiled(payload.get("content") or "")
+    page_css = payload.get("pageCss") or ""
+    JOBS_DIR.mkdir(parents=True, exist_ok=True)
+    # Files are private to this run, so a runner that lost its lease never
+    # shares one with its successor; the job row names the one that won.
+    target = JOBS_DIR / f"{job_id}.{uuid.uuid4().hex[:8]}.zip"
+    tmp = target.with_name(target.name + ".tmp")
+    heartbeat = max(0.05, min(PROGRESS_INTERVAL * 10, JOB_LEASE_SECONDS / 4))
+    try:
+        lease.write({"total": len(rows)})
+        used: set = set()
+        last = time.monotonic()
+        with zipfile.ZipFile(tmp, "w", compression=zipfile.ZIP_STORED) as zf, \
+                ThreadPoolExecutor(max_workers=JOB_PDF_CONCURRENCY) as pool:
+            # Sliding window: keep JOB_PDF_CONCURRENCY renders overlapping while
+            # writing entries in row order, without materialising every PDF.
+            pending: deque = deque()
+            todo = iter(enumerate(rows))
+
+            def submit_next() -> None:
+                nxt = next(todo, None)
+                if nxt is not None:
+                    pdf_job = page_job(render_compiled(parts, nxt[1]), LETTER_CSS, page_css)
+                    pending.append((nxt[0], pool.submit(render_pdf_retrying, pdf_job)))
+
+            for _ in range(JOB_PDF_CONCURRENCY):
+                submit_next()
+            try:
+                while pending:
+                    i, fut = pending.popleft()
+                    while True:
+                        try:
+                            pdf_bytes = fut.result(timeout=heartbeat)
+                            break
+                        except FutureTimeout:
+                            lease.write({"done": i})  # a slow render mustn't look like a dead runner
+                            last = time.monotonic()
+                    submit_next()
+                    zf.writestr(_entry_name(rows[i], field, i, used), pdf_bytes)
+                    now = time.monotonic()
+                    if now - last >= PROGRESS_INTERVAL:
+                        lease.write({"done": i + 1})
+                        last = now
+            except BaseException:
+                for _, fut in pending:
+                    fut.cancel()
+                raise
+        os.replace(tmp, target)
+        lease.write({"status": "done", "done": len(rows), "resultPath": str(target)})
+    except _LeaseLost:
+        tmp.unlink(missing_ok=True)
+        target.unlink(missing_ok=True)
+    except Exception as e:
+        tmp.unlink(missing_ok=True)
+        try:
+            lease.write({"status": "failed", "error": str(e) or type(e).__name__})
+        except _LeaseLost:
+            pass
+
+
+# What sweep() reads of each job: never the payload, which holds every row
+_SWEEP_FIELDS = ["id", "status", "createdAt", "updatedAt", "resultPath"]
+
+
+def sweep() -> None:
+    # Queues claimable jobs (new, or orphaned by a runner that died) and
+    # deletes results past JOB_RESULT_TTL, plus stray files nobody will read.
+    global _last_sweep
+    with _sweep_lock:
+        _last_sweep = time.monotonic()
+    now_ms = int(time.time() * 1000)
+    for job in find_fields("jobs", "status", ["queued", "running", "done"], _SWEEP_FIELDS):
+        if _claimable(job, now_ms):
+            _enqueue(job["id"])
+        elif job.get("status") == "done" and now_ms - _version(job) >= JOB_RESULT_TTL * 1000:
+            path = result_path(job)
+            if path is not None:
+                path.unlink(missing_ok=True)
+            update_item("jobs", job["id"], {"status": "expired", "resultPath": None})
+    if not JOBS_DIR.exists():
+        return
+    cutoffs = {".zip": time.time() - JOB_RESULT_TTL, ".tmp": time.time() - max(JOB_RESULT_TTL, 2 * JOB_LEASE_SECONDS)}
+    for p in JOBS_DIR.iterdir():
+        cutoff = cutoffs.get(p.suffix)
+        try:
+            if cutoff is not None and p.stat().st_mtime < cutoff:
+                p.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def _sweep_due() -> bool:
+    with _sweep_lock:
+        return time.monotonic() - _last_sweep >= JOB_SWEEP_SECONDS
+
+
+def _worker() -> None:
+    while True:
+        try:
+            job_id = _queue.get(timeout=JOB_SWEEP_SECONDS)
+        except queue.Empty:
+            if _sweep_due():
+                try:
+                    sweep()
+                except Exception:
+                    # storage hiccups: the next sweep tries again
+                    _errors.inc(stage="sweep")
+                    _log.exception("job sweep failed")
+            continue
+        if job_id is None:
+            return
+        with _queued_lock:
+            _queued.discard(job_id)
+        try:
+            _run(job_id)
+        except Exception:
+            # the job keeps its lease until it runs out, then sweep() requeues it
+            _errors.inc(stage="run")
+            _log.exception("job %s failed outside its own error handling", job_id)
+
+
+def start() -> None:
+    if _threads:
+        return
+    # Jobs interrupted by a restart are picked up again from the start, once
+    # their lease has run out; other processes may be picking them up too.
+    sweep()
+    for _ in range(max(1, JOB_WORKERS)):
+        t = threading.Thread(target=_worker, daemon=True)
+        t.start()
+        _threads.append(t)
+
+
+def stop() -> None:
+    for _ in _threads:
+        _queue.put(None)
+    _threads.clear()
@@ -0,0 +1,300 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, Optional, Tuple
+
+from . import metrics
+
+# WeasyPrint is CPU bound and holds the GIL, so renders run in worker
+# processes. PDF_WORKERS=0 renders inline in the calling thread instead.
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))
+# Jobs admitted at once (running + waiting for a worker); beyond that we shed load.
+PDF_QUEUE_SIZE = int(os.getenv("PDF_QUEUE_SIZE", str(max(1, PDF_WORKERS) * 4)))
+PDF_TIMEOUT = float(os.getenv("PDF_TIMEOUT", "30"))
+# Render a throwaway page on every worker at startup so the first real
+# request doesn't pay for importing WeasyPrint and loading fonts.
+PDF_WARMUP = os.getenv("PDF_WARMUP", "1").lower() in ("1", "true", "yes")
+
+
+BASE_CSS = (
+    "@page { size: A4; margin: 30mm 16mm 20mm 16mm; } "
+    "body { font-family: system-ui, Segoe UI, Roboto, Ubuntu, sans-serif; color: #111; line-height: 1.5; } "
+    "h1,h2,h3,strong { color: #000; }"
+)
+LETTER_CSS = BASE_CSS + (
+    " p, li, div, td, th { text-align: justify; text-justify: inter-word; }"
+    " .page-break { page-break-before: always; break-before: page; }"
+)
+
+
+# A render job is the page HTML plus the CSS sources to lay it out with. The
+# stylesheets travel as text but each worker parses a given source only once
+# (see _stylesheet), so the fixed A4 sheets cost nothing per render.
+PdfJob = Tuple[str, Tuple[str, ...]]
+
+
+def page_job(body: str, css: str = LETTER_CSS, page_css: str = "") -> PdfJob:
+    # page_css: a template's own page styles, applied on top of `css`
+    html = f"<!doctype html><html><head><meta charset='utf-8'></head><body>{body}</body></html>"
+    return html, (css, page_css) if page_css else (css,)
+
+
+class PdfBusy(Exception):
+    pass
+
+
+class PdfTimeout(Exception):
+    pass
+
+
+_render_seconds = metrics.Histogram("hrms_pdf_render_seconds", "WeasyPrint time per PDF, measured in the renderer")
+_wait_seconds = metrics.Histogram(
+    "hrms_pdf_wait_seconds", "Time a PDF spent queued or in transit on top of rendering"
+)
+_pdf_bytes = metrics.Histogram("hrms_pdf_bytes", "Size of rendered PDFs", buckets=metrics.SIZE_BUCKETS)
+
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(PDF_QUEUE_SIZE)
+_stats_lock = threading.Lock()
+_stats: Dict[str, Any] = {
+    "submitted": 0,
+    "completed": 0,
+    "failed": 0,
+    "rejected": 0,
+    "timeouts": 0,
+    "inFlight": 0,
+    "latencyTotal": 0.0,
+    "latencyMax": 0.0,
+}
+
+
+# Per-process WeasyPrint state: one FontConfiguration shared by every render,
+# and parsed stylesheets keyed by their source.
+_font_config = None
+_sheets: Dict[str, Any] = {}
+_SHEETS_MAX = int(os.getenv("PDF_STYLESHEET_CACHE", "64"))
+
+
+def _fonts():
+    global _font_config
+    if _font_config is None:
+        from weasyprint.text.fonts import FontConfiguration
+        _font_config = FontConfiguration()
+    return _font_config
+
+
+def _stylesheet(source: str):
+    sheet = _sheets.get(source)
+    if sheet is None:
+        from weasyprint import CSS
+        if len(_sheets) >= _SHEETS_MAX:
+            _sheets.clear()
+        sheet = _sheets[source] = CSS(string=source, font_config=_fonts())
+    return sheet
+
+
+def _render(job: PdfJob) -> bytes:
+    from weasyprint import HTML
+    html, styles = job
+    return HTML(string=html).write_pdf(stylesheets=[_stylesheet(s) for s in styles], font_config=_fonts())
+
+
+def _render_timed(job: PdfJob) -> Tuple[bytes, float]:
+    started = time.perf_counter()
+    pdf = _render(job)
+    return pdf, time.perf_counter() - started
+
+
+def _init_worker() -> None:
+    # Import WeasyPrint and parse the stock sheets as each worker starts;
+    # a broken install shows up on the first real render instead.
+    try:
+        for css in (BASE_CSS, LETTER_CSS):
+            _stylesheet(css)
+    except Exception:
+        pass
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=PDF_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+            )
+        return _executor
+
+
+def _reset_executor(broken: Optional[ProcessPoolExecutor] = None) -> None:
+    # With `broken`, only drop the pool if it's still the current one, so a
+    # late report about an old pool doesn't tear down its replacement.
+    global _executor
+    with _executor_lock:
+        if broken is not None and _executor is not broken:
+            return
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def _record(ok: bool, started: float, rendered: Optional[Tuple[bytes, float]] = None) -> None:
+    elapsed = time.monotonic() - started
+    if rendered is not None:
+        _render_seconds.observe(rendered[1])
+        _wait_seconds.observe(max(0.0, elapsed - rendered[1]))
+        _pdf_bytes.observe(len(rendered[0]))
+    with _stats_lock:
+        _stats["inFlight"] -= 1
+        _stats["completed" if ok else "failed"] += 1
+        _stats["latencyTotal"] += elapsed
+        _stats["latencyMax"] = max(_stats["latencyMax"], elapsed)
+
+
+def _admit() -> float:
+    if not _slots.acquire(blocking=False):
+        with _stats_lock:
+            _stats["rejected"] += 1
+        raise PdfBusy("PDF renderer is saturated")
+    with _stats_lock:
+        _stats["submitted"] += 1
+        _stats["inFlight"] += 1
+    return time.monotonic()
+
+
+def _render_inline(job: PdfJob, started: float) -> bytes:
+    rendered = None
+    try:
+        rendered = _render_timed(job)
+        return rendered[0]
+    finally:
+        _record(rendered is not None, started, rendered)
+        _slots.release()
+
+
+def _submit(job: PdfJob, started: float) -> Future:
+    try:
+        executor = _get_executor()
+        try:
+            fut = executor.submit(_render_timed, job)
+        except BrokenProcessPool:
+            # a worker died while nobody was waiting on it; start a fresh pool
+            _reset_executor(executor)
+            executor = _get_executor()
+            fut = executor.submit(_render_timed, job)
+    except BaseException:
+        _record(False, started)
+        _slots.release()
+        raise
+
+    # The slot is only returned once the worker is actually done, so a job
+    # that timed out for its caller still counts against the queue bound.
+    def _done(f: Future) -> None:
+        error = None if f.cancelled() else f.exception()
+        if isinstance(error, BrokenProcessPool):
+            _reset_executor(executor)
+        ok = not f.cancelled() and error is None
+        _record(ok, started, f.result() if ok else None)
+        _slots.release()
+
+    fut.add_done_callback(_done)
+    return fut
+
+
+def _timed_out() -> PdfTimeout:
+    with _stats_lock:
+        _stats["timeouts"] += 1
+    return PdfTimeout("PDF render timed out")
+
+
+def render_pdf(job: PdfJob, timeout: Optional[float] = None) -> bytes:
+    started = _admit()
+    try:
+        if PDF_WORKERS <= 0:
+            return _render_inline(job, started)
+        fut = _submit(job, started)
+        try:
+            return fut.result(timeout=timeout or PDF_TIMEOUT)[0]
+        except FutureTimeout:
+            raise _timed_out()
+    finally:
+        metrics.add_phase("pdf", time.monotonic() - started)
+
+
+async def render_pdf_async(job: PdfJob, timeout: Optional[float] = None) -> bytes:
+    started = _admit()
+    try:
+        if PDF_WORKERS <= 0:
+            return await asyncio.to_thread(_render_inline, job, started)
+        fut = _submit(job, started)
+        try:
+            # shield: the worker can't be interrupted anyway, and its done callback owns the slot
+            pdf, _ = await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(fut)), timeout or PDF_TIMEOUT)
+            return pdf
+        except asyncio.TimeoutError:
+            raise _timed_out()
+    finally:
+        metrics.add_phase("pdf", time.monotonic() - started)
+
+
+def render_pdf_retrying(job: PdfJob) -> bytes:
+    # For background work sharing the pool with interactive requests: back off
+    # while the renderer sheds load instead of failing.
+    delay = 0.05
+    while True:
+        try:
+            return render_pdf(job)
+        except PdfBusy:
+            time.sleep(delay)
+            delay = min(delay * 2, 2.0)
+
+
+def pdf_stats() -> Dict[str, Any]:
+    with _stats_lock:
+        out = dict(_stats)
+    finished = out["completed"] + out["failed"]
+    out["workers"] = PDF_WORKERS
+    out["queueSize"] = PDF_QUEUE_SIZE
+    out["queueDepth"] = max(0, out["inFlight"] - max(PDF_WORKERS, 1))
+    out["latencyAvg"] = out["latencyTotal"] / finished if finished else 0.0
+    return out
+
+
+metrics.register_collector(lambda: metrics.gauge_lines(
+    "hrms_pdf_pool", "PDF render pool counters (see /api/admin/stats)",
+    {k: v for k, v in pdf_stats().items() if isinstance(v, (int, float))}, label="stat",
+))
+
+
+_WARMUP_BODY = "<h1>Warm-up</h1><p>The quick brown fox jumps over the lazy dog.</p>"
+
+
+def warm_up() -> None:
+    # As many renders as workers, submitted together so they spread across
+    # the pool. Runs in a background thread; failure only means a cold start.
+    def run() -> None:
+        jobs = [page_job(_WARMUP_BODY, css) for css in (LETTER_CSS, BASE_CSS)]
+        try:
+            if PDF_WORKERS <= 0:
+                for job in jobs:
+                    _render(job)
+                return
+            pool = _get_executor()
+            futures = [pool.submit(_render, jobs[i % len(jobs)]) for i in range(PDF_WORKERS)]
+            for fut in futures:
+                fut.result(timeout=PDF_TIMEOUT * 2)
+        except Exception:
+            pass
+
+    if PDF_WARMUP:
+        threading.Thread(target=run, name="pdf-warmup", daemon=True).start()
+
+
+def shutdown() -> None:
+    _reset_executor()
@@ -0,0 +1,106 @@
+import hashlib
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Optional
+
+
+# Content-addressed store of rendered PDFs: the key is a hash of the HTML and
+# stylesheets handed to WeasyPrint, so any change to the document or the page
+# styles naturally misses. Recency is tracked through file mtimes and the
+# oldest entries are evicted once the directory grows past `max_bytes`; a
+# file is never removed for any other reason, since documents with the same
+# content share it and a superseded version simply stops being read.
+class PdfCache:
+    def __init__(self, root: Path, max_bytes: int):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._size: Optional[int] = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(*parts: str) -> str:
+        h = hashlib.sha256()
+        for part in parts:
+            h.update(part.encode("utf-8"))
+            h.update(b"\0")
+        return h.hexdigest()
+
+    def path(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}.pdf"
+
+    def get(self, key: str) -> Optional[Path]:
+        p = self.path(key)
+        try:
+            os.utime(p)
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return p
+
+    def put(self, key: str, data: bytes) -> Path:
+        p = self.path(key)
+        p.parent.mkdir(parents=True, exist_ok=True)
+        tmp = p.with_name(f"{p.name}.{threading.get_ident()}.tmp")
+        tmp.write_bytes(data)
+        existed = p.exists()  # same key, same bytes: nothing new to account for
+        os.replace(tmp, p)
+        with self._lock:
+            if self._size is None:
+                self._size = self._scan_size()
+            elif not existed:
+                self._size += len(data)
+            over = self._size > self.max_bytes
+        if over:
+            self._evict()
+        return p
+
+    def _entries(self):
+        if not self.root.exists():
+            return []
+        out = []
+        for p in self.root.glob("*/*.pdf"):
+            try:
+                st = p.stat()
+            except FileNotFoundError:
+                continue
+            out.append((st.st_mtime, st.st_size, p))
+        return out
+
+    def _scan_size(self) -> int:
+        return sum(size for _, size, _ in self._entries())
+
+    def _evict(self) -> None:
+        # Trim to 90% so a full cache doesn't rescan on every insert.
+        entries = sorted(self._entries(), key=lambda e: e[0])
+        total = sum(size for _, size, _ in entries)
+        target = int(self.max_bytes * 0.9)
+        removed = 0
+        for _, size, p in entries:
+            if total <= target:
+                break
+            try:
+                p.unlink()
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+        with self._lock:
+            self._size = total
+            self.evictions += removed
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "bytes": self._size or 0,
+                "maxBytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
@@ -0,0 +1,218 @@
+import heapq
+import html
+import math
+import re
+import threading
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+# Full-text search helpers shared by both backends, and the in-memory
+# inverted index used by the JSON file backend (Postgres uses tsvector
+# columns with GIN indexes instead, see db.py).
+#
+# Documents rendered from one template repeat its boilerplate, so the file
+# index doesn't post every word of every document. A document is split
+# into its own field text (data values) and a shared group (the template
+# body it was rendered from): body words are posted once per group, and a
+# document matches a word if its data contains it or its group does.
+
+_token_re = re.compile(r"\w+", re.U)
+_tag_re = re.compile(r"<[^>]+>")
+_ph_re = re.compile(r"{{\s*[a-zA-Z0-9_.]+\s*}}")
+
+FIELD_WEIGHT = 2.0  # template name / document data
+BODY_WEIGHT = 1.0   # template content / rendered body
+SNIPPET_CHARS = 160
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in _token_re.findall(text.lower()) if len(t) <= 64]
+
+
+def html_text(markup: str) -> str:
+    return html.unescape(_tag_re.sub(" ", markup or ""))
+
+
+def static_text(template: str) -> str:
+    # What every document rendered from this template contains, placeholders aside
+    return html_text(_ph_re.sub(" ", template or ""))
+
+
+def data_text(data: Any) -> str:
+    out: List[str] = []
+
+    def walk(v: Any) -> None:
+        if isinstance(v, dict):
+            for x in v.values():
+                walk(x)
+        elif isinstance(v, (list, tuple)):
+            for x in v:
+                walk(x)
+        elif v is not None:
+            out.append(str(v))
+
+    walk(data)
+    return " ".join(out)
+
+
+def snippet(text: str, query: str, width: int = SNIPPET_CHARS) -> str:
+    # A window of plain text around the first hit, escaped, with query words in <b>
+    terms = sorted(set(tokenize(query)), key=len, reverse=True)
+    text = " ".join(text.split())
+    if not terms:
+        return html.escape(text[:width])
+    pattern = re.compile(r"\b(" + "|".join(re.escape(t) for t in terms) + r")\b", re.I)
+    m = pattern.search(text)
+    start = max(0, m.start() - width // 3) if m else 0
+    window = text[start:start + width]
+    out = html.escape(window)
+    out = pattern.sub(lambda x: f"<b>{x.group(0)}</b>", out)
+    return ("…" if start > 0 else "") + out + ("…" if start + width < len(text) else "")
+
+
+class _TableIndex:
+    def __init__(self) -> None:
+        self.slots: Dict[str, int] = {}
+        self.ids: List[Optional[str]] = []
+        self.created: List[int] = []
+        self.versions: Dict[str, int] = {}
+        self.field_tokens: List[Tuple[str, ...]] = []
+        self.group_of: List[Optional[Hashable]] = []
+        self.free: List[int] = []
+        self.fields: Dict[str, Set[int]] = {}
+        self.groups: Dict[Hashable, Set[int]] = {}
+        self.group_postings: Dict[str, Set[Hashable]] = {}
+        self.group_tokens: Dict[Hashable, Tuple[str, ...]] = {}
+
+    def put(
+        self, id: str, created: int, version: int, fields: str, group: Hashable, group_text: Callable[[], str]
+    ) -> None:
+        # writers index after the store lock is released, so an older version can arrive late
+        if self.versions.get(id, -1) > version:
+            return
+        self.remove(id)
+        if self.free:
+            slot = self.free.pop()
+            self.ids[slot], self.created[slot] = id, created
+        else:
+            slot = len(self.ids)
+            self.ids.append(id)
+            self.created.append(created)
+            self.field_tokens.append(())
+            self.group_of.append(None)
+        self.slots[id] = slot
+        self.versions[id] = version
+        tokens = tuple(set(tokenize(fields)))
+        self.field_tokens[slot] = tokens
+        for t in tokens:
+            self.fields.setdefault(t, set()).add(slot)
+        if group not in self.group_tokens:
+            words = tuple(set(tokenize(group_text())))
+            self.group_tokens[group] = words
+            for t in words:
+                self.group_postings.setdefault(t, set()).add(group)
+        self.groups.setdefault(group, set()).add(slot)
+        self.group_of[slot] = group
+
+    def remove(self, id: str) -> None:
+        slot = self.slots.pop(id, None)
+        self.versions.pop(id, None)
+        if slot is None:
+            return
+        for t in self.field_tokens[slot]:
+            posting = self.fields.get(t)
+            if posting is not None:
+                posting.discard(slot)
+                if not posting:
+                    del self.fields[t]
+        group = self.group_of[slot]
+        members = self.groups.get(group)
+        if members is not None:
+            members.discard(slot)
+            if not members:
+                del self.groups[group]
+                for t in self.group_tokens.pop(group, ()):
+                    posting = self.group_postings.get(t)
+                    if posting is not None:
+                        posting.discard(group)
+                        if not posting:
+                            del self.group_postings[t]
+        self.ids[slot] = None
+        self.field_tokens[slot] = ()
+        self.group_of[slot] = None
+        self.free.append(slot)
+
+    def _matches(self, term: str) -> Set[int]:
+        out = set(self.fields.get(term, ()))
+        for group in self.group_postings.get(term, ()):
+            out |= self.groups[group]
+        return out
+
+    def search(self, query: str, limit: int, offset: int) -> Tuple[List[Tuple[str, float]], bool]:
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return [], False
+        matched = sorted(((t, self._matches(t)) for t in terms), key=lambda x: len(x[1]))
+        hits = set(matched[0][1])
+        for _, m in matched[1:]:
+            hits &= m
+            if not hits:
+                return [], False
+        # Every hit scores the body weight for each term; hits that carry a
+        # term in their own fields get a bonus on top. Those are usually far
+        # fewer, so they're scored one by one and the rest (equal scores,
+        # newest first) only need ordering by creation time.
+        total = len(self.slots) or 1
+        idfs = {t: math.log(1 + total / max(1, len(m))) for t, m in matched}
+        base = sum(idfs.values()) * BODY_WEIGHT
+        bonus: Dict[int, float] = {}
+        for t, idf in idfs.items():
+            for slot in self.fields.get(t, ()):
+                if slot in hits:
+                    bonus[slot] = bonus.get(slot, 0.0) + idf * (FIELD_WEIGHT - BODY_WEIGHT)
+        want = offset + limit + 1
+        top = heapq.nlargest(want, bonus, key=lambda s: (bonus[s], self.created[s]))
+        if len(top) < want:
+            top += heapq.nlargest(want - len(top), hits.difference(bonus), key=self.created.__getitem__)
+        page = [(self.ids[s], base + bonus.get(s, 0.0)) for s in top[offset:offset + limit]]
+        return page, len(top) > offset + limit
+
+
+class FileSearch:
+    # Built lazily from the store on first search, then kept current by the
+    # storage layer's writes; rebuilt when the store reloads from disk.
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._tables: Dict[str, _TableIndex] = {}
+        self._generation: Dict[str, int] = {}
+
+    def ensure(self, table: str, generation: int, entries: Callable[[], Iterable[Tuple]]) -> None:
+        with self._lock:
+            if self._generation.get(table) == generation:
+                return
+            index = _TableIndex()
+            for entry in entries():
+                index.put(*entry)
+            self._tables[table] = index
+            self._generation[table] = generation
+
+    def put(self, table: str, entry: Tuple) -> None:
+        with self._lock:
+            index = self._tables.get(table)
+            if index is not None:
+                index.put(*entry)
+
+    def remove(self, table: str, id: str) -> None:
+        with self._lock:
+            index = self._tables.get(table)
+            if index is not None:
+                index.remove(id)
+
+    def search(self, table: str, query: str, limit: int, offset: int) -> Tuple[List[Tuple[str, float]], bool]:
+        with self._lock:
+            index = self._tables.get(table)
+            return index.search(query, limit, offset) if index is not None else ([], False)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._tables.clear()
+            self._generation.clear()
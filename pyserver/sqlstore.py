@@ -0,0 +1,435 @@
+import base64
+import json
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from .filestore import ConflictError
+
+# SQLite backend with the same interface as FileStore (camelCase records in
+# and out), so db.py's file-mode code paths run on it unchanged. Tables and
+# indexes mirror the Postgres schema in db.init_db. WAL mode lets any number
+# of worker processes read while one writes; writers serialize on SQLite's
+# own lock (BEGIN IMMEDIATE), so nothing is lost when uvicorn runs several
+# workers against the same file.
+#
+# Per-process state built from rows (the search index, identity caches) is
+# kept in step through a change log: every write appends (table, id) in the
+# same transaction, and a process that sees another connection has committed
+# (PRAGMA data_version) replays the new entries to its listeners.
+
+_FIELDS: Dict[str, Dict[str, str]] = {
+    "users": {
+        "id": "id", "username": "username", "name": "name", "dept": "dept", "role": "role",
+        "passwordHash": "password_hash", "createdAt": "created_at", "updatedAt": "updated_at",
+    },
+    "templates": {
+        "id": "id", "name": "name", "content": "content", "description": "description", "pageCss": "page_css",
+        "createdAt": "created_at", "updatedAt": "updated_at",
+    },
+    "documents": {
+        "id": "id", "templateId": "template_id", "content": "content", "contentRef": "content_ref", "data": "data",
+        "rendered": "rendered", "renderedZ": "rendered_z", "fileName": "file_name",
+        "createdAt": "created_at", "updatedAt": "updated_at",
+    },
+    "blobs": {"id": "id", "body": "body", "createdAt": "created_at"},
+    "jobs": {
+        "id": "id", "kind": "kind", "status": "status", "templateId": "template_id", "payload": "payload",
+        "total": "total", "done": "done", "resultPath": "result_path", "error": "error", "createdBy": "created_by",
+        "createdAt": "created_at", "updatedAt": "updated_at",
+    },
+}
+_KEYS = {table: {col: key for key, col in fields.items()} for table, fields in _FIELDS.items()}
+_JSON_COLUMNS = ("data", "payload")
+
+_SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS users (
+      id TEXT PRIMARY KEY,
+      username TEXT UNIQUE NOT NULL,
+      name TEXT NOT NULL,
+      dept TEXT NOT NULL DEFAULT '',
+      role TEXT NOT NULL,
+      password_hash TEXT NOT NULL,
+      created_at INTEGER NOT NULL,
+      updated_at INTEGER NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS templates (
+      id TEXT PRIMARY KEY,
+      name TEXT NOT NULL,
+      content TEXT NOT NULL,
+      description TEXT NOT NULL DEFAULT '',
+      page_css TEXT NOT NULL DEFAULT '',
+      created_at INTEGER NOT NULL,
+      updated_at INTEGER NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS documents (
+      id TEXT PRIMARY KEY,
+      template_id TEXT,
+      content TEXT,
+      content_ref TEXT,
+      data TEXT,
+      rendered TEXT,
+      rendered_z BLOB,
+      file_name TEXT,
+      created_at INTEGER NOT NULL,
+      updated_at INTEGER NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS blobs (
+      id TEXT PRIMARY KEY,
+      body TEXT NOT NULL,
+      created_at INTEGER NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS jobs (
+      id TEXT PRIMARY KEY,
+      kind TEXT NOT NULL,
+      status TEXT NOT NULL,
+      template_id TEXT,
+      payload TEXT,
+      total INTEGER NOT NULL DEFAULT 0,
+      done INTEGER NOT NULL DEFAULT 0,
+      result_path TEXT,
+      error TEXT,
+      created_by TEXT,
+      created_at INTEGER NOT NULL,
+      updated_at INTEGER NOT NULL
+    )
+    """,
+    "CREATE TABLE IF NOT EXISTS changes (seq INTEGER PRIMARY KEY AUTOINCREMENT, tbl TEXT NOT NULL, id TEXT NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS users_role_idx ON users (role)",
+    "CREATE INDEX IF NOT EXISTS documents_template_created_idx ON documents (template_id, created_at)",
+    "CREATE INDEX IF NOT EXISTS documents_content_ref_idx ON documents (content_ref)",
+    "CREATE INDEX IF NOT EXISTS jobs_status_idx ON jobs (status)",
+    "CREATE INDEX IF NOT EXISTS templates_created_id_idx ON templates (created_at, id)",
+    "CREATE INDEX IF NOT EXISTS documents_created_id_idx ON documents (created_at, id)",
+)
+
+_SCAN_BATCH = 500
+
+
+class SqliteStore:
+    def __init__(self, path: Path, seed: Optional[Path] = None, busy_timeout: float = 30.0, change_log: int = 10000):
+        self.path = Path(path)
+        self._seed = Path(seed) if seed else None
+        self._busy_timeout = busy_timeout
+        self._change_log = change_log
+        self._lock = threading.RLock()
+        self._con: Optional[sqlite3.Connection] = None
+        self._data_version: Optional[int] = None
+        self._seq = 0
+        self._generation = 1
+        self._writes = 0
+        self._listeners: List[Callable[[str, str], None]] = []
+        self._reset_listeners: List[Callable[[], None]] = []
+
+    # --- connection and cross-process sync ---------------------------------
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._con is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            con = sqlite3.connect(
+                str(self.path), timeout=self._busy_timeout, isolation_level=None, check_same_thread=False,
+            )
+            con.row_factory = sqlite3.Row
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA synchronous=NORMAL")
+            self._con = con
+            self._data_version = con.execute("PRAGMA data_version").fetchone()[0]
+        return self._con
+
+    def on_foreign_change(self, fn: Callable[[str, str], None]) -> None:
+        # fn(table, id) for every row another process wrote since we last looked
+        self._listeners.append(fn)
+
+    def on_foreign_reset(self, fn: Callable[[], None]) -> None:
+        # fn() when other processes' changes can't be replayed: anything derived may be stale
+        self._reset_listeners.append(fn)
+
+    def _sync(self) -> sqlite3.Connection:
+        # Called with the lock held before every operation
+        con = self._connect()
+        version = con.execute("PRAGMA data_version").fetchone()[0]
+        if version == self._data_version:
+            return con
+        self._data_version = version
+        self._catch_up(con)
+        return con
+
+    def _catch_up(self, con: sqlite3.Connection) -> None:
+        rows = con.execute("SELECT seq, tbl, id FROM changes WHERE seq > ? ORDER BY seq", (self._seq,)).fetchall()
+        if not rows:
+            return
+        if rows[0]["seq"] != self._seq + 1:
+            # the log was trimmed past our position: derived state has to start over
+            self._seq = rows[-1]["seq"]
+            self._generation += 1
+            for fn in self._reset_listeners:
+                fn()
+            return
+        self._seq = rows[-1]["seq"]
+        for key in dict.fromkeys((r["tbl"], r["id"]) for r in rows):
+            for fn in self._listeners:
+                fn(*key)
+
+    def _write(self, fn: Callable[[sqlite3.Connection], Any]) -> Any:
+        # One IMMEDIATE transaction per write. Changes committed by others are
+        # replayed first, so the sequence we end on is all accounted for.
+        with self._lock:
+            con = self._sync()
+            con.execute("BEGIN IMMEDIATE")
+            try:
+                self._catch_up(con)
+                result = fn(con)
+                self._seq = con.execute("SELECT COALESCE(MAX(seq), 0) FROM changes").fetchone()[0]
+                self._writes += 1
+                if self._writes % 1000 == 0:
+                    con.execute("DELETE FROM changes WHERE seq <= ?", (self._seq - self._change_log,))
+                con.execute("COMMIT")
+            except BaseException:
+                con.execute("ROLLBACK")
+                raise
+            self._data_version = con.execute("PRAGMA data_version").fetchone()[0]
+            return result
+
+    # --- row mapping ---------------------------------------------------------
+
+    @staticmethod
+    def _columns(table: str) -> Dict[str, str]:
+        fields = _FIELDS.get(table)
+        if fields is None:
+            raise ValueError("Unknown table")
+        return fields
+
+    def _to_row(self, table: str, rec: Dict[str, Any]) -> Dict[str, Any]:
+        fields = self._columns(table)
+        out = {}
+        for key, value in rec.items():
+            col = fields.get(key)
+            if col is None:
+                continue
+            if col in _JSON_COLUMNS and value is not None:
+                value = json.dumps(value)
+            elif col == "rendered_z" and isinstance(value, str):
+                value = base64.b64decode(value)  # packed as text for JSON storage; kept binary here
+            out[col] = value
+        return out
+
+    @staticmethod
+    def _to_record(table: str, row: sqlite3.Row) -> Dict[str, Any]:
+        keys = _KEYS[table]
+        rec = {}
+        for col in row.keys():
+            value = row[col]
+            if col in _JSON_COLUMNS and value is not None:
+                value = json.loads(value)
+            rec[keys[col]] = value
+        return rec
+
+    def _insert(self, con: sqlite3.Connection, table: str, rec: Dict[str, Any]) -> None:
+        row = self._to_row(table, rec)
+        cols = ", ".join(row)
+        marks = ", ".join("?" for _ in row)
+        # blobs are content-addressed: a body another writer stored first is the same body
+        verb = "INSERT OR IGNORE" if table == "blobs" else "INSERT"
+        con.execute(f"{verb} INTO {table} ({cols}) VALUES ({marks})", list(row.values()))
+        con.execute("INSERT INTO changes (tbl, id) VALUES (?, ?)", (table, rec["id"]))
+
+    def _one(self, con: sqlite3.Connection, table: str, id: str) -> Optional[Dict[str, Any]]:
+        row = con.execute(f"SELECT * FROM {table} WHERE id = ?", (id,)).fetchone()
+        return self._to_record(table, row) if row is not None else None
+
+    # --- FileStore interface -------------------------------------------------
+
+    def ensure(self) -> None:
+        # Schema and first-run import in one write transaction, so workers
+        # starting together neither race the DDL nor import twice.
+        with self._lock:
+            con = self._connect()
+            con.execute("BEGIN IMMEDIATE")
+            try:
+                for stmt in _SCHEMA:
+                    con.execute(stmt)
+                self._import_seed(con)
+                con.execute("COMMIT")
+            except BaseException:
+                con.execute("ROLLBACK")
+                raise
+            self._seq = con.execute("SELECT COALESCE(MAX(seq), 0) FROM changes").fetchone()[0]
+            self._data_version = con.execute("PRAGMA data_version").fetchone()[0]
+
+    def _import_seed(self, con: sqlite3.Connection) -> None:
+        # A fresh database starts from the JSON store's contents, if there is one
+        if self._seed is None or not self._seed.exists():
+            return
+        if con.execute("SELECT 1 FROM users LIMIT 1").fetchone() is not None:
+            return
+        with self._seed.open("r", encoding="utf-8") as fh:
+            raw = json.load(fh)
+        for table, items in raw.items():
+            if table not in _FIELDS or not isinstance(items, list):
+                continue
+            for item in items:
+                if isinstance(item, dict) and item.get("id"):
+                    rec = dict(item)
+                    rec.setdefault("createdAt", 0)
+                    rec.setdefault("updatedAt", rec["createdAt"])
+                    self._insert(con, table, rec)
+
+    def sync(self) -> None:
+        # Replays other processes' writes now; costs one PRAGMA when there are none
+        with self._lock:
+            self._sync()
+
+    def generation(self) -> int:
+        # Bumped when changes from other processes can no longer be replayed
+        with self._lock:
+            self._sync()
+            return self._generation
+
+    def version(self, table: str) -> Tuple[int, int]:
+        with self._lock:
+            con = self._sync()
+            row = con.execute(f"SELECT COALESCE(MAX(updated_at), 0), COUNT(*) FROM {table}").fetchone()
+            return row[0], row[1]
+
+    def list(self, table: str) -> List[Dict[str, Any]]:
+        self._columns(table)
+        with self._lock:
+            con = self._sync()
+            return [self._to_record(table, r) for r in con.execute(f"SELECT * FROM {table}")]
+
+    def page(self, table: str, limit: int, after: Optional[Tuple[int, str]] = None) -> List[Dict[str, Any]]:
+        self._columns(table)
+        where, params = "", []
+        if after is not None:
+            where = "WHERE (created_at, id) < (?, ?)"
+            params.extend(after)
+        sql = f"SELECT * FROM {table} {where} ORDER BY created_at DESC, id DESC LIMIT ?"
+        with self._lock:
+            con = self._sync()
+            return [self._to_record(table, r) for r in con.execute(sql, params + [limit])]
+
+    def scan(
+        self,
+        table: str,
+        ids: Optional[List[str]] = None,
+        template_id: Optional[str] = None,
+        created_from: Optional[int] = None,
+        created_to: Optional[int] = None,
+    ) -> Iterator[Dict[str, Any]]:
+        # Oldest first, fetched in keyset batches so the lock is never held
+        # across a yield and memory stays flat.
+        self._columns(table)
+        where, params = [], []
+        if ids is not None:
+            ids = list(dict.fromkeys(ids))
+            where.append(f"id IN ({', '.join('?' for _ in ids)})" if ids else "0")
+            params.extend(ids)
+        if template_id is not None:
+            where.append("template_id = ?")
+            params.append(template_id)
+        if created_from is not None:
+            where.append("created_at >= ?")
+            params.append(created_from)
+        if created_to is not None:
+            where.append("created_at < ?")
+            params.append(created_to)
+        last: Optional[Tuple[int, str]] = None
+        while True:
+            clause = where + (["(created_at, id) > (?, ?)"] if last is not None else [])
+            sql = f"SELECT * FROM {table} {'WHERE ' + ' AND '.join(clause) if clause else ''} " \
+                  f"ORDER BY created_at, id LIMIT {_SCAN_BATCH}"
+            with self._lock:
+                con = self._sync()
+                rows = con.execute(sql, params + (list(last) if last is not None else [])).fetchall()
+            for r in rows:
+                yield self._to_record(table, r)
+            if len(rows) < _SCAN_BATCH:
+                return
+            last = (rows[-1]["created_at"], rows[-1]["id"])
+
+    def get(self, table: str, id: str) -> Optional[Dict[str, Any]]:
+        self._columns(table)
+        with self._lock:
+            return self._one(self._sync(), table, id)
+
+    def _where_field(self, table: str, field: str, value: Any) -> Tuple[str, list]:
+        col = self._columns(table).get(field)
+        if col is None:
+            raise ValueError(f"Unknown field: {field}")
+        return (f"{col} IS NULL", []) if value is None else (f"{col} = ?", [value])
+
+    def find(
+        self, table: str, field: str, value: Any, keys: Optional[List[str]] = None
+    ) -> List[Dict[str, Any]]:
+        clause, params = self._where_field(table, field, value)
+        cols = ", ".join(self._columns(table)[k] for k in keys) if keys is not None else "*"
+        with self._lock:
+            con = self._sync()
+            return [self._to_record(table, r) for r in con.execute(f"SELECT {cols} FROM {table} WHERE {clause}", params)]
+
+    def count(self, table: str, field: str, value: Any) -> int:
+        clause, params = self._where_field(table, field, value)
+        with self._lock:
+            con = self._sync()
+            return con.execute(f"SELECT COUNT(*) FROM {table} WHERE {clause}", params).fetchone()[0]
+
+    def insert(self, table: str, rec: Dict[str, Any]) -> Dict[str, Any]:
+        self._write(lambda con: self._insert(con, table, rec))
+        return dict(rec)
+
+    def insert_many(self, table: str, recs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        def run(con: sqlite3.Connection) -> None:
+            for rec in recs:
+                self._insert(con, table, rec)
+
+        self._write(run)
+        return [dict(rec) for rec in recs]
+
+    def update(
+        self, table: str, id: str, changes: Dict[str, Any], expected: Optional[int] = None
+    ) -> Optional[Dict[str, Any]]:
+        row = self._to_row(table, {k: v for k, v in changes.items() if k != "id"})
+
+        def run(con: sqlite3.Connection) -> Optional[Dict[str, Any]]:
+            if expected is None:
+                # blobs have no updated_at, so only a compare-and-set reads the version
+                if con.execute(f"SELECT 1 FROM {table} WHERE id = ?", (id,)).fetchone() is None:
+                    return None
+            else:
+                current = con.execute(f"SELECT updated_at, created_at FROM {table} WHERE id = ?", (id,)).fetchone()
+                if current is None:
+                    return None
+                if (current[0] or current[1]) != expected:
+                    raise ConflictError(f"{table}/{id} was modified concurrently")
+            if row:
+                sets = ", ".join(f"{col} = ?" for col in row)
+                con.execute(f"UPDATE {table} SET {sets} WHERE id = ?", list(row.values()) + [id])
+            con.execute("INSERT INTO changes (tbl, id) VALUES (?, ?)", (table, id))
+            return self._one(con, table, id)
+
+        return self._write(run)
+
+    def delete(self, table: str, id: str) -> bool:
+        self._columns(table)
+
+        def run(con: sqlite3.Connection) -> bool:
+            if con.execute(f"DELETE FROM {table} WHERE id = ?", (id,)).rowcount == 0:
+                return False
+            con.execute("INSERT INTO changes (tbl, id) VALUES (?, ?)", (table, id))
+            return True
+
+        return self._write(run)
+
+    def compact(self) -> None:
+        with self._lock:
+            self._connect().execute("PRAGMA wal_checkpoint(TRUNCATE)")
@@ -1,51 +1,187 @@
+import os
 import re
+from html.parser import HTMLParser
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+from .cache import TTLCache
 
 _ph_re = re.compile(r"{{\s*([a-zA-Z0-9_.]+)\s*}}")
 
-def render_template(tpl: str, data: dict) -> str:
+# Compiled templates keyed by (template id, updated_at), so edits never hit a stale entry
+_compiled = TTLCache(maxsize=int(os.getenv("TEMPLATE_CACHE_SIZE", "256")))
+
+def compile_template(tpl: str) -> List[str]:
+    # Alternating literal / placeholder-key segments: [lit, key, lit, ..., key, lit]
+    return _ph_re.split(tpl)
+
+def _lookup(data: dict, key: str) -> Any:
+    v = data.get(key)
+    if v is None and "." in key:
+        v = data
+        for part in key.split("."):
+            if not isinstance(v, dict):
+                return None
+            v = v.get(part)
+    return v
+
+def render_compiled(parts: List[str], data: dict) -> str:
+    out = list(parts)
+    for i in range(1, len(out), 2):
+        v = _lookup(data, out[i])
+        out[i] = "" if v is None else str(v)
+    return "".join(out)
+
+def get_compiled(tpl: str, cache_key: Optional[Hashable] = None) -> List[str]:
+    parts = _compiled.get(cache_key) if cache_key is not None else None
+    if parts is None:
+        parts = compile_template(tpl)
+        if cache_key is not None:
+            _compiled.set(cache_key, parts)
+    return parts
+
+def render_template(tpl: str, data: dict, cache_key: Optional[Hashable] = None) -> str:
     if not isinstance(tpl, str):
         return ""
     if not isinstance(data, dict):
         data = {}
-    def repl(m):
-        k = m.group(1)
-        v = data.get(k)
+    return render_compiled(get_compiled(tpl, cache_key), data)
+
+def template_cache_stats() -> dict:
+    return _compiled.stats()
+
+class LivePreview:
+    # One preview session: the compiled parts, the data so far, and which
+    # placeholder segments each top-level data key feeds, so a change to a
+    # few keys re-renders only those segments. "a.b" reads data["a.b"] or
+    # data["a"]["b"], so it's listed under both keys.
+    def __init__(self, parts: List[str], data: Optional[dict] = None):
+        self.parts = parts
+        self.data: Dict[str, Any] = dict(data) if isinstance(data, dict) else {}
+        self._slots: Dict[str, List[int]] = {}
+        for i in range(1, len(parts), 2):
+            key = parts[i]
+            self._slots.setdefault(key, []).append(i)
+            head = key.split(".", 1)[0]
+            if head != key:
+                self._slots.setdefault(head, []).append(i)
+        self.segments = list(parts)
+        for i in range(1, len(parts), 2):
+            self.segments[i] = self._value(i)
+
+    def _value(self, i: int) -> str:
+        v = _lookup(self.data, self.parts[i])
         return "" if v is None else str(v)
-    return _ph_re.sub(repl, tpl)
+
+    def html(self) -> str:
+        return "".join(self.segments)
+
+    def update(self, changes: dict) -> List[Tuple[int, str]]:
+        # Applies {key: value} (None removes the key); returns the segments
+        # whose text changed as (index, new text)
+        touched = set()
+        for key, value in changes.items():
+            if value is None:
+                self.data.pop(key, None)
+            else:
+                self.data[key] = value
+            touched.update(self._slots.get(key, ()))
+        patch = []
+        for i in sorted(touched):
+            text = self._value(i)
+            if text != self.segments[i]:
+                self.segments[i] = text
+                patch.append((i, text))
+        return patch
+
+# Applied in order: each pass sees what the previous one exposed (removing
+# an empty paragraph can leave whitespace or <br> runs for the next).
+_normalize_passes = (
+    (re.compile(r"<p>\s*</p>", re.I), ""),
+    (re.compile(r"<p>(?:&nbsp;|\s)+</p>", re.I), ""),
+    (re.compile(r"(<br\s*/?>\s*){2,}", re.I), "<br>"),
+    (re.compile(r">\s+<"), "><"),
+)
 
 def normalize_html(html: str) -> str:
     if not isinstance(html, str):
         return ""
     out = html
-    out = re.sub(r"<p>\s*</p>", "", out, flags=re.I)
-    out = re.sub(r"<p>(?:&nbsp;|\s)+</p>", "", out, flags=re.I)
-    out = re.sub(r"(<br\s*/?>\s*){2,}", "<br>", out, flags=re.I)
-    out = re.sub(r">\s+<", "><", out)
+    for pattern, repl in _normalize_passes:
+        out = pattern.sub(repl, out)
     return out
 
+_highlight_re = re.compile(r"\bbackground(?:-color)?\s*:\s*(?:yellow|#?ffff00)", re.I)
+_tag_re = re.compile(r"<[^>]+>")
+_void_tags = frozenset((
+    "area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "param", "source", "track", "wbr",
+))
+
+def _to_safe_var(text: str, i: int) -> str:
+    if not text:
+        return f"field_{i}"
+    s = re.sub(r"[^a-z0-9]+", "_", text.lower()).strip("_")
+    return s or f"field_{i}"
+
+class _HighlightScanner(HTMLParser):
+    # Single pass over the markup: records the source span of every outermost
+    # yellow-highlighted element, counting same-name tags so nested elements
+    # close at the right end tag. The output is then stitched from source
+    # slices, so everything outside a placeholder is kept byte for byte.
+    def __init__(self, html: str):
+        super().__init__(convert_charrefs=False)
+        self.src = html
+        self.spans: List[Tuple[int, int, int, int]] = []  # (start, inner start, inner end, end)
+        self._line_starts = [0]
+        self._line_starts.extend(m.end() for m in re.finditer("\n", html))
+        self._open: Optional[Tuple[str, int, int]] = None  # (tag, start, inner start)
+        self._depth = 0
+
+    def _offset(self) -> int:
+        line, col = self.getpos()
+        return self._line_starts[line - 1] + col
+
+    def handle_starttag(self, tag, attrs):
+        if self._open is not None:
+            if tag == self._open[0]:
+                self._depth += 1
+            return
+        if tag in _void_tags:
+            return
+        style = next((v for k, v in attrs if k == "style" and v), None)
+        if style and _highlight_re.search(style):
+            start = self._offset()
+            self._open = (tag, start, start + len(self.get_starttag_text()))
+            self._depth = 1
+
+    def handle_endtag(self, tag):
+        if self._open is None or tag != self._open[0]:
+            return
+        self._depth -= 1
+        if self._depth == 0:
+            at = self._offset()
+            end = self.src.find(">", at)
+            self.spans.append((self._open[1], self._open[2], at, len(self.src) if end < 0 else end + 1))
+            self._open = None
+
 def extract_highlighted_placeholders(html: str):
     if not isinstance(html, str):
         return {"html": "", "vars": [], "defaults": {}}
-    idx = 1
+    scanner = _HighlightScanner(html)
+    scanner.feed(html)
+    scanner.close()
     defaults = {}
     vars_ = []
-    def to_safe_var(text: str, i: int) -> str:
-        if not text:
-            return f"field_{i}"
-        s = re.sub(r"[^a-z0-9]+", "_", text.lower()).strip("_")
-        return s or f"field_{i}"
-    pattern = re.compile(r"<([a-zA-Z0-9]+)([^>]*style\s*=\s*\"(?:[^\"]*?\\bbackground(?:-color)?\s*:\s*(?:yellow|#?ffff00)[^\"]*)\")[^>]*>([\s\S]*?)</\\1>", re.I)
-    def _replace(m):
-        nonlocal idx
-        inner = m.group(3) or ""
-        text = re.sub(r"<[^>]+>", "", inner).strip()
-        key = to_safe_var(text, idx)
-        idx += 1
-        if key not in vars_:
+    out = []
+    last = 0
+    for idx, (start, inner_start, inner_end, end) in enumerate(scanner.spans, 1):
+        text = _tag_re.sub("", html[inner_start:inner_end]).strip()
+        key = _to_safe_var(text, idx)
+        # first occurrence wins; checked against the dict, not the list, to stay linear
+        if key not in defaults:
             vars_.append(key)
-        if defaults.get(key) is None:
-            defaults[key] = text or ""
-        return f"{{{{{key}}}}}"
-    out = pattern.sub(_replace, html)
-    return {"html": out, "vars": vars_, "defaults": defaults}
-
+            defaults[key] = text
+        out.append(html[last:start])
+        out.append(f"{{{{{key}}}}}")
+        last = end
+    out.append(html[last:])
+    return {"html": "".join(out), "vars": vars_, "defaults": defaults}
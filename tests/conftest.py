@@ -0,0 +1,59 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+# Settings are read at import time, so the environment is fixed before any
+# pyserver module loads: a throwaway data dir, cheap bcrypt, no PDF warm-up.
+ROOT = Path(__file__).resolve().parents[1]
+DATA = Path(tempfile.mkdtemp(prefix="hrms-tests-"))
+os.environ.pop("DATABASE_URL", None)
+os.environ.update({
+    "DATA_DIR": str(DATA),
+    "DB_BACKEND": "file",
+    "BCRYPT_ROUNDS": "4",
+    "PDF_WARMUP": "0",
+    "METRICS_TOKEN": "test-metrics-token",
+})
+sys.path.insert(0, str(ROOT))
+
+
+@pytest.fixture(scope="session")
+def client():
+    from fastapi.testclient import TestClient
+    from pyserver.app import app
+
+    with TestClient(app) as c:
+        yield c
+
+
+def login(client, username, password):
+    # Bearer headers; the cookie login also sets is dropped so headers decide who's asking
+    r = client.post("/api/auth/login", json={"username": username, "password": password})
+    client.cookies.clear()
+    assert r.status_code == 200, r.text
+    return {"Authorization": "Bearer " + r.json()["token"]}
+
+
+def make_user(username, role="editor", password="pw"):
+    from pyserver import db
+    from pyserver.hashing import hash_password
+
+    return db.add_item("users", {
+        "username": username, "name": username, "dept": "", "role": role,
+        "passwordHash": hash_password(password),
+    })
+
+
+@pytest.fixture(scope="session")
+def admin(client):
+    make_user("test-admin", role="admin")
+    return login(client, "test-admin", "pw")
+
+
+@pytest.fixture(scope="session")
+def editor(client):
+    make_user("test-editor")
+    return login(client, "test-editor", "pw")
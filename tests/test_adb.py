@@ -0,0 +1,42 @@
+import asyncio
+
+from pyserver import adb, db
+
+
+def test_async_api_round_trip():
+    async def run():
+        t = await adb.add_item("templates", {"name": "adb", "content": "x"})
+        assert (await adb.find_by_id("templates", t["id"]))["name"] == "adb"
+        updated = await adb.update_item("templates", t["id"], {"name": "adb2"})
+        assert updated["name"] == "adb2"
+        assert any(r["id"] == t["id"] for r in await adb.list_items("templates"))
+        assert await adb.remove_item("templates", t["id"])
+        assert await adb.find_by_id("templates", t["id"]) is None
+        assert await adb.update_item("templates", t["id"], {"name": "gone"}) is None
+
+    asyncio.run(run())
+
+
+def test_concurrent_compare_and_set_has_one_winner():
+    t = db.add_item("templates", {"name": "cas", "content": "x"})
+    version = t["updatedAt"]
+
+    async def attempt(i):
+        try:
+            return await adb.update_item("templates", t["id"], {"name": f"cas-{i}"}, version)
+        except adb.ConflictError:
+            return None
+
+    async def run():
+        return await asyncio.gather(*(attempt(i) for i in range(10)))
+
+    winners = [r for r in asyncio.run(run()) if r is not None]
+    assert len(winners) == 1
+    assert winners[0]["updatedAt"] > version
+    assert db.find_by_id("templates", t["id"])["name"] == winners[0]["name"]
+
+
+def test_pool_options_are_bounded():
+    opts = db.pool_options()
+    assert opts["max_size"] >= opts["min_size"]
+    assert opts["kwargs"]["autocommit"] is True
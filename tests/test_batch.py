@@ -0,0 +1,29 @@
+from conftest import login, make_user
+
+
+def test_batch_renders_and_stores_every_row(client, editor):
+    r = client.post("/api/documents/batch", headers=editor, json={
+        "content": "Dear {{name}}", "rows": [{"name": "A"}, {"name": "B"}, {"name": "C"}],
+    })
+    body = r.json()
+    assert body["count"] == 3
+    rendered = [client.get(f"/api/documents/{id}", headers=editor).json()["item"]["rendered"] for id in body["ids"]]
+    assert rendered == ["Dear A", "Dear B", "Dear C"]
+
+
+def test_batch_from_csv(client, editor):
+    tpl = client.post("/api/templates", headers=editor, json={"name": "csv", "content": "{{ name }}/{{dept}}"}).json()
+    csv = "﻿name, dept\nAnn,HR\nBob,Ops\n"
+    r = client.post("/api/documents/batch/csv", headers=editor, data={"templateId": tpl["item"]["id"]},
+                    files={"file": ("rows.csv", csv, "text/csv")})
+    ids = r.json()["ids"]
+    assert [client.get(f"/api/documents/{id}", headers=editor).json()["item"]["rendered"] for id in ids] == \
+        ["Ann/HR", "Bob/Ops"]
+
+
+def test_batch_rejects_empty_and_viewers(client, editor):
+    assert client.post("/api/documents/batch", headers=editor, json={"content": "x", "rows": []}).status_code == 400
+    make_user("batch-viewer", role="viewer")
+    viewer = login(client, "batch-viewer", "pw")
+    r = client.post("/api/documents/batch", headers=viewer, json={"content": "x", "rows": [{}]})
+    assert r.status_code == 403
@@ -0,0 +1,29 @@
+import json
+
+from pyserver import bench
+
+
+def test_letter_html_is_deterministic_and_sized():
+    a = bench.letter_html(20_000, seed=5)
+    assert a == bench.letter_html(20_000, seed=5)
+    assert len(a) >= 20_000 and "background-color: yellow" in a
+    assert "yellow" not in bench.letter_html(20_000, seed=5, highlights=False)
+
+
+def test_storage_group_runs_in_a_child():
+    report = bench.run([200], True, False, ["storage"])
+    results = report["results"]
+    assert not [r for r in results if r["name"] == "error"], results
+    names = {r["name"] for r in results}
+    assert {"add_items[seed]", "list_items", "list_page", "find_by_id", "search_items", "add_item"} <= names
+    assert all(r["params"]["docs"] == 200 for r in results)
+
+
+def test_compare_reports_ratios(tmp_path):
+    row = {"group": "g", "name": "n", "params": {"x": 1}}
+    base, head = tmp_path / "base.json", tmp_path / "head.json"
+    base.write_text(json.dumps({"results": [{**row, "mean_s": 2.0}, {**row, "name": "gone", "mean_s": 1.0}]}))
+    head.write_text(json.dumps({"results": [{**row, "mean_s": 1.0}, {**row, "name": "new", "mean_s": 1.0}]}))
+    assert bench.compare(str(base), str(head)) == [
+        {**row, "base_mean_s": 2.0, "head_mean_s": 1.0, "ratio": 0.5},
+    ]
@@ -0,0 +1,92 @@
+import os
+from concurrent.futures.process import BrokenProcessPool
+
+import bcrypt
+import pytest
+
+from pyserver import hashing
+
+
+# Worker processes unpickle this by module name, so it lives at top level.
+def fake_hash_chunk(passwords, rounds):
+    marker = passwords[0]
+    if not os.path.exists(marker):
+        open(marker, "w").close()
+        os._exit(1)
+    return ["hashed:" + p for p in passwords]
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setattr(hashing, "BCRYPT_BULK_WORKERS", 1)
+    hashing.shutdown()
+    yield
+    hashing.shutdown()
+
+
+def test_hash_many_keeps_order_and_flags_rejects(pool):
+    out = hashing.hash_many(["a", "b" * 80, "c"])
+    assert bcrypt.checkpw(b"a", out[0].encode()) and bcrypt.checkpw(b"c", out[2].encode())
+    assert out[1] is None
+
+
+def test_hash_many_survives_a_pool_broken_earlier(pool):
+    executor = hashing._get_bulk_executor()
+    with pytest.raises(BrokenProcessPool):
+        executor.submit(os._exit, 1).result(timeout=60)
+    assert hashing.hash_many(["pw"])[0].startswith("$2")
+    assert hashing._bulk_executor is not executor
+
+
+def test_hash_many_retries_once_when_a_worker_dies(pool, tmp_path, monkeypatch):
+    monkeypatch.setattr(hashing, "_hash_chunk", fake_hash_chunk)
+    marker = str(tmp_path / "died")
+    assert hashing.hash_many([marker]) == ["hashed:" + marker]
+
+
+@pytest.fixture
+def login_threads(monkeypatch):
+    monkeypatch.setattr(hashing, "BCRYPT_BULK_WORKERS", 0)
+
+
+def test_without_a_pool_chunks_go_through_the_login_queue(login_threads, monkeypatch):
+    passwords = [str(i) for i in range(hashing._BULK_CHUNK * 5 + 3)]
+    in_flight, peak = [0], [0]
+    submit = hashing._submit
+
+    def counting_submit(fn, *args):
+        in_flight[0] += 1
+        peak[0] = max(peak[0], in_flight[0])
+        fut = submit(fn, *args)
+        fut.add_done_callback(lambda _f: in_flight.__setitem__(0, in_flight[0] - 1))
+        return fut
+
+    monkeypatch.setattr(hashing, "_submit", counting_submit)
+    monkeypatch.setattr(hashing, "_hash_chunk", lambda chunk, rounds: ["h" + p for p in chunk])
+    assert hashing.hash_many(passwords) == ["h" + p for p in passwords]
+    assert peak[0] <= max(1, hashing.BCRYPT_WORKERS)
+
+
+def test_without_a_pool_a_full_queue_is_busy(login_threads, monkeypatch):
+    monkeypatch.setattr(hashing, "_slots", hashing.threading.BoundedSemaphore(1))
+    hashing._slots.acquire()  # a login holds the only slot
+    with pytest.raises(hashing.HashingBusy):
+        hashing.hash_many(["a"])
+
+
+def test_bulk_endpoint_reports_per_row(client, admin):
+    r = client.post("/api/auth/users/bulk", headers=admin, json={"users": [
+        {"username": "bulk-a", "password": "pw"},
+        {"username": "bulk-a", "password": "pw"},
+        {"username": "bulk-b", "password": "pw", "role": "owner"},
+        {"username": "test-admin", "password": "pw"},
+        {"username": "bulk-c", "password": "pw", "role": "viewer", "dept": "HR"},
+    ]})
+    body = r.json()
+    assert body["created"] == 2
+    assert [row.get("error") for row in body["results"]] == [
+        None, "duplicate username in this import", "role must be one of admin, editor, viewer", "Username taken", None,
+    ]
+    assert body["results"][4]["user"]["dept"] == "HR"
+    assert client.post("/api/auth/login", json={"username": "bulk-c", "password": "pw"}).status_code == 200
+    client.cookies.clear()
@@ -0,0 +1,72 @@
+import gzip
+
+import pytest
+
+from pyserver import compression
+
+
+@pytest.fixture
+def big_template(client, editor):
+    content = "<p>" + "Lorem ipsum dolor sit amet. " * 200 + "</p>"
+    return client.post("/api/templates", headers=editor, json={"name": "big", "content": content}).json()["item"]
+
+
+def _get(client, headers, path, encoding, **extra):
+    return client.get(path, headers={**headers, "Accept-Encoding": encoding, **extra})
+
+
+def test_large_json_is_gzipped(client, editor, big_template, monkeypatch):
+    monkeypatch.setattr(compression, "brotli", None)
+    r = _get(client, editor, f"/api/templates/{big_template['id']}", "gzip")
+    assert r.headers["Content-Encoding"] == "gzip"
+    assert r.headers["Vary"] == "Accept-Encoding"
+    assert r.headers["ETag"].endswith('-gzip"')
+    assert r.json()["item"]["content"] == big_template["content"]
+
+
+def test_uncompressed_responses_still_vary(client, editor, big_template):
+    identity = _get(client, editor, f"/api/templates/{big_template['id']}", "identity")
+    assert "Content-Encoding" not in identity.headers
+    assert identity.headers["Vary"] == "Accept-Encoding"
+    small = _get(client, editor, "/api/me", "gzip")
+    assert "Content-Encoding" not in small.headers
+    assert small.headers["Vary"] == "Accept-Encoding"
+
+
+def test_coded_etag_revalidates_with_vary(client, editor, big_template, monkeypatch):
+    monkeypatch.setattr(compression, "brotli", None)
+    path = f"/api/templates/{big_template['id']}"
+    tag = _get(client, editor, path, "gzip").headers["ETag"]
+    r = _get(client, editor, path, "gzip", **{"If-None-Match": tag})
+    assert r.status_code == 304 and r.headers["Vary"] == "Accept-Encoding"
+    # the coded tag still names the same version for an identity client
+    assert _get(client, editor, path, "identity", **{"If-None-Match": tag}).status_code == 304
+
+
+def test_choose_encoding():
+    assert compression.choose_encoding("gzip;q=0, identity") is None
+    assert compression.choose_encoding("*") in ("br", "gzip")
+    assert compression.choose_encoding("gzip, deflate") == "gzip"
+
+
+def test_stream_is_gzipped_in_chunks(monkeypatch):
+    import asyncio
+
+    monkeypatch.setattr(compression, "brotli", None)
+
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"text/plain")]})
+        for part in (b"a" * 10, b"b" * 10):
+            await send({"type": "http.response.body", "body": part, "more_body": True})
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "headers": [(b"accept-encoding", b"gzip")]}
+    asyncio.run(compression.CompressionMiddleware(app)(scope, None, send))
+    headers = dict(sent[0]["headers"])
+    assert headers[b"content-encoding"] == b"gzip" and b"content-length" not in headers
+    assert gzip.decompress(b"".join(m["body"] for m in sent[1:])) == b"a" * 10 + b"b" * 10
@@ -0,0 +1,81 @@
+import time
+
+import pytest
+
+from pyserver import blobs, db
+
+
+def _doc(content="Dear {{name}}", rendered="Dear Ann"):
+    return db.add_item("documents", {"templateId": None, "content": content, "data": {}, "rendered": rendered})
+
+
+def test_documents_are_stored_inline_by_default():
+    doc = _doc()
+    raw = db._store.get("documents", doc["id"])
+    assert raw["content"] == "Dear {{name}}" and raw["rendered"] == "Dear Ann"
+    assert "contentRef" not in raw and "renderedZ" not in raw
+
+
+@pytest.fixture
+def packed(monkeypatch):
+    monkeypatch.setattr(blobs, "DOC_BLOBS", True)
+
+
+def test_packed_documents_share_one_blob_and_read_back_whole(client, editor, packed):
+    content = "Shared body " + str(time.time())
+    a, b = _doc(content), _doc(content)
+    raw = db._store.get("documents", a["id"])
+    assert raw["contentRef"] == db._store.get("documents", b["id"])["contentRef"]
+    assert "rendered" not in raw and "content" not in raw
+    listed = {d["id"]: d for d in db.list_items("documents")}
+    assert listed[a["id"]]["content"] == content and listed[a["id"]]["rendered"] == "Dear Ann"
+    # listings keep `rendered`, paged or not
+    items = client.get("/api/documents", headers=editor).json()["items"]
+    assert next(d for d in items if d["id"] == a["id"])["rendered"] == "Dear Ann"
+    page = client.get("/api/documents", headers=editor, params={"limit": 500}).json()["items"]
+    assert next(d for d in page if d["id"] == a["id"])["rendered"] == "Dear Ann"
+
+
+def test_unreferenced_blobs_are_collected(packed, monkeypatch):
+    monkeypatch.setattr(blobs, "BLOB_GC_GRACE", 0)
+    content = "Collected body " + str(time.time())
+    a, b = _doc(content), _doc(content)
+    ref = db._store.get("documents", a["id"])["contentRef"]
+    time.sleep(0.01)
+    db.collect_blobs()
+    assert db._store.get("blobs", ref) is not None  # still referenced
+    db.remove_item("documents", a["id"])
+    db.remove_item("documents", b["id"])
+    db.collect_blobs()
+    assert db._store.get("blobs", ref) is None
+    # writing the same body again stores it again
+    c = _doc(content)
+    assert db._store.get("blobs", ref) is not None
+    assert db.find_by_id("documents", c["id"])["content"] == content
+
+
+def test_recently_written_blobs_survive_the_sweep(packed):
+    content = "Fresh body " + str(time.time())
+    doc = _doc(content)
+    ref = db._store.get("documents", doc["id"])["contentRef"]
+    db.remove_item("documents", doc["id"])
+    db.collect_blobs()
+    assert db._store.get("blobs", ref) is not None
+
+
+def test_gc_thread_only_runs_with_blobs_enabled(monkeypatch):
+    started = []
+
+    class Thread:
+        def __init__(self, target, name, daemon):
+            started.append(name)
+
+        def start(self):
+            pass
+
+    monkeypatch.setattr(db.threading, "Thread", Thread)
+    db.start_blob_gc()
+    assert started == []
+    monkeypatch.setattr(blobs, "DOC_BLOBS", True)
+    db.start_blob_gc()
+    assert started == ["blob-gc"]
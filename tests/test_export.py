@@ -0,0 +1,25 @@
+import io
+import zipfile
+
+from pyserver import app as app_module, db
+from pyserver.export import safe_name
+
+
+def test_safe_name_keeps_a_plain_basename():
+    assert safe_name("../../etc/passwd", "x.pdf") == "passwd"
+    assert safe_name("C:\\Users\\me\\offer.pdf", "x.pdf") == "offer.pdf"
+    assert safe_name('Offer "final"\r\n.pdf', "x.pdf") == "Offer _final_.pdf"
+    assert safe_name("..", "x.pdf") == "x.pdf"
+    assert safe_name(None, "x.pdf") == "x.pdf"
+    assert len(safe_name("a" * 500, "x.pdf")) <= 120
+
+
+def test_export_entries_cannot_escape_the_archive(client, editor, monkeypatch):
+    monkeypatch.setattr(app_module, "document_pdf_bytes", lambda doc: b"%PDF-")
+    doc = db.add_item("documents", {
+        "templateId": None, "content": "x", "data": {}, "rendered": "x", "fileName": "../../evil.pdf",
+    })
+    r = client.get("/api/documents/export", headers=editor, params={"ids": doc["id"], "format": "html,pdf"})
+    assert r.status_code == 200
+    names = zipfile.ZipFile(io.BytesIO(r.content)).namelist()
+    assert names == [f"document-{doc['id']}.html", f"{doc['id']}-evil.pdf"]
@@ -0,0 +1,43 @@
+import pytest
+
+from pyserver import db
+from conftest import make_user
+
+
+def test_find_and_count_by_field_follow_writes():
+    a = db.add_item("documents", {"templateId": "lookup-t1", "content": "", "data": {}, "rendered": ""})
+    db.add_item("documents", {"templateId": "lookup-t1", "content": "", "data": {}, "rendered": ""})
+    # the column name is accepted as well as the field name
+    assert db.count_by_field("documents", "template_id", "lookup-t1") == 2
+    db.update_item("documents", a["id"], {"templateId": "lookup-t2"})
+    assert [d["id"] for d in db.find_by_field("documents", "templateId", "lookup-t2")] == [a["id"]]
+    assert db.count_by_field("documents", "templateId", "lookup-t1") == 1
+    db.remove_item("documents", a["id"])
+    assert db.find_by_field("documents", "templateId", "lookup-t2") == []
+
+
+def test_unknown_fields_are_rejected():
+    with pytest.raises(ValueError):
+        db.find_by_field("users", "passwordHash; DROP TABLE users", "x")
+    with pytest.raises(ValueError):
+        db.count_by_field("nope", "id", "x")
+
+
+def test_existing_values():
+    make_user("lookup-ann")
+    assert db.existing_values("users", "username", ["lookup-ann", "lookup-bob", "lookup-ann"]) == ["lookup-ann"]
+
+
+def test_last_admin_cannot_be_demoted(client, admin):
+    me = db.find_by_field("users", "username", "test-admin")[0]
+    others = [u for u in db.find_by_field("users", "role", "admin") if u["id"] != me["id"]]
+    for u in others:
+        db.update_item("users", u["id"], {"role": "editor"})
+    try:
+        assert db.count_by_field("users", "role", "admin") == 1
+        r = client.put(f"/api/auth/users/{me['id']}", headers=admin, json={"role": "editor"})
+        assert r.status_code == 400
+        assert db.count_by_field("users", "role", "admin") == 1
+    finally:
+        for u in others:
+            db.update_item("users", u["id"], {"role": "admin"})
@@ -0,0 +1,49 @@
+import json
+import os
+
+from pyserver.filestore import FileStore
+
+
+def _rec(id, created, **extra):
+    return {"id": id, "createdAt": created, "updatedAt": created, **extra}
+
+
+def test_reads_are_served_from_memory(tmp_path):
+    store = FileStore(tmp_path / "db.json")
+    store.insert("users", _rec("u1", 1, username="ann"))
+    # reads hand out copies, so callers can't corrupt the resident tables
+    got = store.get("users", "u1")
+    got["username"] = "changed"
+    assert store.get("users", "u1")["username"] == "ann"
+    assert json.loads((tmp_path / "db.json").read_text())["users"][0]["id"] == "u1"
+
+
+def test_external_write_is_picked_up(tmp_path):
+    path = tmp_path / "db.json"
+    store = FileStore(path)
+    store.insert("templates", _rec("t1", 1, name="a"))
+    generation = store.generation()
+    raw = json.loads(path.read_text())
+    raw["templates"].append(_rec("t2", 2, name="b"))
+    path.write_text(json.dumps(raw))
+    st = path.stat()
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+    assert {r["id"] for r in store.list("templates")} == {"t1", "t2"}
+    assert store.generation() > generation
+
+
+def test_field_index_follows_writes(tmp_path):
+    store = FileStore(tmp_path / "db.json")
+    store.insert("users", _rec("u1", 1, username="ann", role="admin"))
+    assert store.count("users", "role", "admin") == 1
+    store.update("users", "u1", {"role": "viewer"})
+    assert store.count("users", "role", "admin") == 0
+    assert [r["id"] for r in store.find("users", "role", "viewer")] == ["u1"]
+    assert store.delete("users", "u1")
+    assert store.find("users", "role", "viewer") == []
+
+
+def test_snapshot_write_is_atomic(tmp_path):
+    store = FileStore(tmp_path / "db.json")
+    store.insert("users", _rec("u1", 1))
+    assert not (tmp_path / "db.json.tmp").exists()
@@ -0,0 +1,117 @@
+import asyncio
+import io
+import os
+import random
+import re
+import zipfile
+
+import pytest
+
+from pyserver import importer
+from pyserver.templating import normalize_html
+
+
+def old_normalize_html(html):
+    # the sequential passes normalize_html is held to
+    out = html
+    out = re.sub(r"<p>\s*</p>", "", out, flags=re.I)
+    out = re.sub(r"<p>(?:&nbsp;|\s)+</p>", "", out, flags=re.I)
+    out = re.sub(r"(<br\s*/?>\s*){2,}", "<br>", out, flags=re.I)
+    out = re.sub(r">\s+<", "><", out)
+    return out
+
+
+@pytest.mark.parametrize("html, expected", [
+    ("Dear<p></p> <b>John</b>", "Dear <b>John</b>"),
+    ("<p> <p></p> </p>x", "x"),
+    ("<p><p></p></p>", "<p></p>"),
+    ("a<br><p>&nbsp;</p> <br/>b", "a<br>b"),
+    ("<P>&nbsp; </P><b> x </b>\n<i>", "<b> x </b><i>"),
+    ("<br>\n<BR />\n<br>end", "<br>end"),
+])
+def test_normalize_html_golden(html, expected):
+    assert normalize_html(html) == expected
+
+
+def test_normalize_html_matches_sequential_passes():
+    pieces = ["<p>", "</p>", "<P>", "</P>", "&nbsp;", " ", "\n", "<br>", "<br/>", "<BR />", "<b>", "</b>", "x", "Dear"]
+    rng = random.Random(16)
+    for _ in range(5000):
+        html = "".join(rng.choice(pieces) for _ in range(rng.randint(0, 14)))
+        assert normalize_html(html) == old_normalize_html(html), html
+
+
+# Worker processes unpickle this by module name, so it lives at top level.
+def fake_convert_file(path, filename):
+    marker = path + ".died"
+    if "die" in filename and not os.path.exists(marker):
+        open(marker, "w").close()
+        os._exit(1)
+    return {"name": filename, "content": "", "vars": [], "defaults": {}}
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setattr(importer, "IMPORT_WORKERS", 1)
+    importer._reset_executor()
+    yield
+    importer._reset_executor()
+
+
+def test_conversion_survives_a_pool_broken_earlier(pool, tmp_path):
+    from concurrent.futures.process import BrokenProcessPool
+
+    executor = importer._get_executor()
+    with pytest.raises(BrokenProcessPool):
+        executor.submit(os._exit, 1).result(timeout=60)
+    src = tmp_path / "a.txt"
+    src.write_text("<p>hi</p>")
+    out = asyncio.run(importer.convert(str(src), "a.txt"))
+    assert out["content"] == "<p>hi</p>"
+
+
+def test_conversion_is_retried_once_when_its_worker_dies(pool, tmp_path, monkeypatch):
+    monkeypatch.setattr(importer, "convert_file", fake_convert_file)
+    src = tmp_path / "die.txt"
+    src.write_text("x")
+    out = asyncio.run(importer.convert(str(src), "die.txt"))
+    assert out["name"] == "die.txt"
+    assert (tmp_path / "die.txt.died").exists()
+
+
+def _zip(tmp_path, names):
+    path = tmp_path / "batch.zip"
+    with zipfile.ZipFile(path, "w") as zf:
+        for n in names:
+            zf.writestr(n, "<p>x</p>")
+    return path
+
+
+def test_unpack_stops_before_extracting_past_the_limit(tmp_path):
+    out = tmp_path / "out"
+    out.mkdir()
+    with pytest.raises(importer.TooManyFiles):
+        importer.unpack_zip(_zip(tmp_path, ["a.txt", "b.txt", "c.txt"]), out, max_files=2)
+    assert not list(out.iterdir())
+    assert len(importer.unpack_zip(_zip(tmp_path, ["a.txt", "b.txt"]), out, max_files=2)) == 2
+
+
+def test_batch_import_refuses_once_the_file_limit_is_passed(client, editor, tmp_path, monkeypatch):
+    monkeypatch.setattr(importer, "IMPORT_MAX_FILES", 2)
+    spooled = []
+    spool = importer.spool
+
+    async def counting_spool(upload, dest):
+        spooled.append(upload.filename)
+        return await spool(upload, dest)
+
+    monkeypatch.setattr(importer, "spool", counting_spool)
+    archive = _zip(tmp_path, ["b.txt", "c.txt"]).read_bytes()
+    files = [
+        ("files", ("a.txt", io.BytesIO(b"<p>a</p>"), "text/plain")),
+        ("files", ("more.zip", io.BytesIO(archive), "application/zip")),
+        ("files", ("d.txt", io.BytesIO(b"<p>d</p>"), "text/plain")),
+    ]
+    r = client.post("/api/templates/import/batch?save=false", headers=editor, files=files)
+    assert r.status_code == 413
+    assert spooled == ["a.txt", "more.zip"]  # d.txt was never copied
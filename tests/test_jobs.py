@@ -0,0 +1,147 @@
+import os
+import threading
+import time
+import zipfile
+
+import pytest
+
+from pyserver import db, jobs
+
+
+@pytest.fixture(autouse=True)
+def no_background_sweep(monkeypatch):
+    # keep the app's own workers from picking up the jobs these tests drive by hand
+    monkeypatch.setattr(jobs, "_sweep_due", lambda: False)
+
+
+def _job(status="queued", **extra):
+    return db.add_item("jobs", {
+        "kind": "pdf", "status": status, "templateId": None,
+        "payload": {"content": "Hi {{name}}", "rows": [{"name": "A"}, {"name": "B"}], "fileNameField": "name"},
+        "total": 2, "done": 0, "resultPath": None, "error": None, "createdBy": None, **extra,
+    })
+
+
+def test_only_one_worker_claims_a_job():
+    job = _job()
+    leases = []
+    start = threading.Barrier(8)
+
+    def claim():
+        start.wait()
+        leases.append(jobs._claim(job["id"]))
+
+    threads = [threading.Thread(target=claim) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len([l for l in leases if l is not None]) == 1
+    assert db.find_by_id("jobs", job["id"])["status"] == "running"
+
+
+def test_stale_running_job_is_reclaimed(monkeypatch):
+    job = _job()
+    first = jobs._claim(job["id"])
+    assert jobs._claim(job["id"]) is None  # lease still fresh
+    monkeypatch.setattr(jobs, "JOB_LEASE_SECONDS", 0)
+    second = jobs._claim(job["id"])
+    assert second is not None
+    with pytest.raises(jobs._LeaseLost):
+        first.write({"done": 1})
+
+
+def test_run_writes_zip_and_finishes(monkeypatch):
+    monkeypatch.setattr(jobs, "render_pdf_retrying", lambda job: b"%PDF-" + job[0].encode())
+    job = _job()
+    jobs._run(job["id"])
+    done = db.find_by_id("jobs", job["id"])
+    assert done["status"] == "done" and done["done"] == 2
+    with zipfile.ZipFile(jobs.result_path(done)) as zf:
+        assert sorted(zf.namelist()) == ["A.pdf", "B.pdf"]
+    assert not list(jobs.JOBS_DIR.glob(f"{job['id']}.*.tmp"))
+
+
+def test_runner_that_lost_its_lease_does_not_finish(monkeypatch):
+    job = _job()
+
+    def render(pdf_job):
+        # another process reclaims the job mid-run
+        db.update_item("jobs", job["id"], {"status": "running", "done": 0})
+        return b"%PDF-"
+
+    monkeypatch.setattr(jobs, "render_pdf_retrying", render)
+    jobs._run(job["id"])
+    after = db.find_by_id("jobs", job["id"])
+    assert after["status"] == "running" and after.get("resultPath") is None
+    assert not list(jobs.JOBS_DIR.glob(f"{job['id']}.*"))
+
+
+def test_sweep_expires_old_results(monkeypatch):
+    jobs.JOBS_DIR.mkdir(parents=True, exist_ok=True)
+    result = jobs.JOBS_DIR / "old-result.zip"
+    result.write_bytes(b"zip")
+    job = _job(status="done", resultPath=str(result))
+    stray = jobs.JOBS_DIR / "gone.1234abcd.zip.tmp"
+    stray.write_bytes(b"")
+    old = time.time() - 10 * 24 * 3600
+    os.utime(stray, (old, old))
+
+    monkeypatch.setattr(jobs, "JOB_RESULT_TTL", 0)
+    jobs.sweep()
+    expired = db.find_by_id("jobs", job["id"])
+    assert expired["status"] == "expired" and expired.get("resultPath") is None
+    assert not result.exists() and not stray.exists()
+
+    fresh = jobs.JOBS_DIR / "fresh.zip"
+    fresh.write_bytes(b"zip")
+    monkeypatch.setattr(jobs, "JOB_RESULT_TTL", 3600)
+    jobs.sweep()
+    assert fresh.exists()
+
+
+def test_expired_job_download_is_gone(client, admin):
+    job = _job(status="expired")
+    assert client.get(f"/api/jobs/{job['id']}/download", headers=admin).status_code == 410
+
+
+def test_entry_names_follow_the_export_rule():
+    used: set = set()
+    rows = [{"n": "../../etc/passwd"}, {"n": "a" * 300}, {"n": "a" * 300}, {"n": None}, {"n": "<>"}]
+    names = [jobs._entry_name(r, "n", i, used) for i, r in enumerate(rows)]
+    assert names[0] == "passwd.pdf"
+    assert names[1] == "a" * 120 + ".pdf" and names[2] == "a" * 120 + "-2.pdf"
+    assert names[3] == "document-00004.pdf" and names[4] == "document-00005.pdf"
+
+
+def test_sweep_reads_no_payloads(monkeypatch):
+    job = _job()
+    seen = []
+    real = jobs.find_fields
+
+    def find_fields(*args):
+        rows = real(*args)
+        seen.extend(rows)
+        return rows
+
+    monkeypatch.setattr(jobs, "find_fields", find_fields)
+    monkeypatch.setattr(jobs, "_enqueue", lambda job_id: None)
+    jobs.sweep()
+    assert job["id"] in {r["id"] for r in seen}
+    assert all("payload" not in r for r in seen)
+
+
+def test_worker_logs_unexpected_failures(monkeypatch, caplog):
+    work = jobs.queue.Queue()
+    work.put("boom-job")
+    work.put(None)
+
+    def run(job_id):
+        raise RuntimeError("disk full")
+
+    monkeypatch.setattr(jobs, "_queue", work)
+    monkeypatch.setattr(jobs, "_run", run)
+    before = jobs._errors._values.get(("run",), 0)
+    jobs._worker()
+    assert jobs._errors._values[("run",)] == before + 1
+    assert "boom-job" in caplog.text and "disk full" in caplog.text
@@ -0,0 +1,51 @@
+import threading
+import time
+
+import bcrypt
+import pytest
+
+from pyserver import app as app_module, db, hashing
+from conftest import make_user
+
+
+def test_failed_login_runs_one_verify(client):
+    make_user("login-ann", password="right")
+    before = hashing.hashing_stats()["verifies"]
+    r = client.post("/api/auth/login", json={"username": "login-ann", "password": "wrong"})
+    assert r.status_code == 400
+    assert hashing.hashing_stats()["verifies"] - before == 1
+
+
+def test_saturated_hashing_pool_sheds_logins(client, monkeypatch):
+    make_user("login-bob")
+
+    def busy(*args):
+        raise hashing.HashingBusy("full")
+
+    monkeypatch.setattr(app_module, "submit_verify", busy)
+    r = client.post("/api/auth/login", json={"username": "login-bob", "password": "pw"})
+    assert r.status_code == 429 and r.headers["Retry-After"] == "1"
+
+
+def test_pool_bound_is_enforced(monkeypatch):
+    slots = threading.BoundedSemaphore(1)
+    slots.acquire()
+    monkeypatch.setattr(hashing, "_slots", slots)
+    with pytest.raises(hashing.HashingBusy):
+        hashing.submit_verify("pw", "")
+
+
+def test_login_upgrades_hash_to_current_cost(client):
+    user = db.add_item("users", {
+        "username": "login-old", "name": "old", "dept": "", "role": "editor",
+        "passwordHash": bcrypt.hashpw(b"pw", bcrypt.gensalt(hashing.BCRYPT_ROUNDS + 1)).decode(),
+    })
+    client.post("/api/auth/login", json={"username": "login-old", "password": "pw"})
+    client.cookies.clear()
+    deadline = time.monotonic() + 5
+    while hashing.needs_rehash(hashing.stored_hash(db.find_by_id("users", user["id"]))):
+        assert time.monotonic() < deadline, "hash was not upgraded"
+        time.sleep(0.02)
+    r = client.post("/api/auth/login", json={"username": "login-old", "password": "pw"})
+    client.cookies.clear()
+    assert r.status_code == 200
@@ -0,0 +1,21 @@
+import asyncio
+
+from pyserver import app as app_module, db
+
+
+def test_page_css_follows_edits_made_elsewhere():
+    t = db.add_item("templates", {"name": "css", "content": "x", "pageCss": "@page { margin: 1cm }"})
+    assert asyncio.run(app_module.template_page_css(t["id"])) == "@page { margin: 1cm }"
+    assert app_module.template_page_css_sync(t["id"]) == "@page { margin: 1cm }"
+    # another process's write: straight to storage, no change listeners run here
+    db._store.update("templates", t["id"], {"pageCss": "@page { margin: 2cm }", "updatedAt": t["updatedAt"] + 1})
+    assert asyncio.run(app_module.template_page_css(t["id"])) == "@page { margin: 2cm }"
+    assert app_module.template_page_css_sync(t["id"]) == "@page { margin: 2cm }"
+
+
+def test_page_css_of_missing_template_is_empty():
+    t = db.add_item("templates", {"name": "gone", "content": "x", "pageCss": "p {}"})
+    assert app_module.template_page_css_sync(t["id"]) == "p {}"
+    db.remove_item("templates", t["id"])
+    assert app_module.template_page_css_sync(t["id"]) == ""
+    assert asyncio.run(app_module.template_page_css(None)) == ""
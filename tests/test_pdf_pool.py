@@ -0,0 +1,65 @@
+import os
+import threading
+import time
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+from pyserver import pdf
+
+# Worker processes unpickle these by module name, so they live at top level.
+
+
+def fake_render_timed(job):
+    html, styles = job
+    if "die" in html:
+        os._exit(1)
+    if "slow" in html:
+        time.sleep(2)
+    return b"%PDF-" + html.encode(), 0.0
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setattr(pdf, "PDF_WORKERS", 1)
+    monkeypatch.setattr(pdf, "_render_timed", fake_render_timed)
+    pdf._reset_executor()
+    yield
+    pdf._reset_executor()
+
+
+def test_renders_on_the_pool(pool):
+    assert pdf.render_pdf(("<p>hi</p>", ()), timeout=60) == b"%PDF-<p>hi</p>"
+
+
+def test_recovers_when_a_worker_died_unobserved(pool):
+    executor = pdf._get_executor()
+    with pytest.raises(BrokenProcessPool):
+        executor.submit(os._exit, 1).result(timeout=60)
+    # nobody was waiting through render_pdf, so only submit() finds out
+    assert pdf.render_pdf(("<p>after</p>", ()), timeout=60) == b"%PDF-<p>after</p>"
+    assert pdf._executor is not executor
+
+
+def _drain():
+    deadline = time.monotonic() + 60
+    while pdf.pdf_stats()["inFlight"] and time.monotonic() < deadline:
+        time.sleep(0.05)
+
+
+def test_worker_crash_after_caller_gave_up_resets_pool(pool):
+    with pytest.raises(pdf.PdfTimeout):
+        pdf.render_pdf(("<p>die</p>", ()), timeout=0.001)
+    _drain()
+    # the done callback saw the broken pool and dropped it
+    assert pdf._executor is None
+    assert pdf.render_pdf(("<p>ok</p>", ()), timeout=60) == b"%PDF-<p>ok</p>"
+
+
+def test_timeout_keeps_slot_until_worker_finishes(pool, monkeypatch):
+    monkeypatch.setattr(pdf, "_slots", threading.BoundedSemaphore(1))
+    with pytest.raises(pdf.PdfTimeout):
+        pdf.render_pdf(("<p>slow</p>", ()), timeout=0.05)
+    with pytest.raises(pdf.PdfBusy):
+        pdf.render_pdf(("<p>next</p>", ()), timeout=60)
+    _drain()
@@ -0,0 +1,68 @@
+import asyncio
+import os
+import time
+
+from pyserver import app as app_module
+from pyserver.pdfcache import PdfCache
+
+
+def test_key_covers_html_and_every_stylesheet():
+    assert PdfCache.key("<p>a</p>", "css") == PdfCache.key("<p>a</p>", "css")
+    assert PdfCache.key("<p>a</p>", "css") != PdfCache.key("<p>a</p>", "css", "page")
+    # separators keep part boundaries from colliding
+    assert PdfCache.key("ab", "c") != PdfCache.key("a", "bc")
+
+
+def test_hit_and_miss(tmp_path):
+    cache = PdfCache(tmp_path, 1 << 20)
+    key = PdfCache.key("doc")
+    assert cache.get(key) is None
+    cache.put(key, b"%PDF-1")
+    assert cache.get(key).read_bytes() == b"%PDF-1"
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = PdfCache(tmp_path, 250)
+    keys = [PdfCache.key(str(i)) for i in range(3)]
+    for i, key in enumerate(keys[:2]):
+        cache.put(key, b"x" * 100)
+        past = time.time() - 100 + i
+        os.utime(cache.path(key), (past, past))
+    cache.get(keys[0])  # touch: now the most recent of the two
+    cache.put(keys[2], b"x" * 100)
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[0]) is not None and cache.get(keys[2]) is not None
+    assert cache.stats()["bytes"] <= 250
+
+
+def test_documents_with_identical_content_share_one_file(tmp_path):
+    cache = PdfCache(tmp_path, 1 << 20)
+    key = PdfCache.key("<p>same</p>", "css")
+    cache.put(key, b"%PDF-same")
+    cache.put(key, b"%PDF-same")
+    assert len(list(tmp_path.glob("*/*.pdf"))) == 1
+    assert cache.stats()["bytes"] == len(b"%PDF-same")
+
+
+def test_entry_evicted_before_sending_is_rendered_again(tmp_path, monkeypatch):
+    cache = PdfCache(tmp_path, 1 << 20)
+    job = ("<p>doc</p>", ("css",))
+    key = PdfCache.key(job[0], *job[1])
+    cache.put(key, b"%PDF-old")
+    real_get = cache.get
+
+    def get_then_evict(k):
+        path = real_get(k)
+        path.unlink()  # eviction by another request, between lookup and read
+        return path
+
+    async def render(j):
+        return b"%PDF-new"
+
+    monkeypatch.setattr(cache, "get", get_then_evict)
+    monkeypatch.setattr(app_module, "pdf_cache", cache)
+    monkeypatch.setattr(app_module, "render_pdf_or_http", render)
+    response = asyncio.run(app_module.pdf_response(job, "doc.pdf", "d1"))
+    assert response.body == b"%PDF-new"
+    assert cache.path(key).read_bytes() == b"%PDF-new"
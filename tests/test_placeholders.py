@@ -0,0 +1,63 @@
+import time
+
+import pytest
+
+from pyserver.bench import legacy_extract, letter_html
+from pyserver.templating import extract_highlighted_placeholders
+
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_matches_the_regex_on_flat_highlights(seed):
+    html = letter_html(64 * 1024, seed=seed)
+    new = extract_highlighted_placeholders(html)
+    assert new["vars"]
+    assert new == legacy_extract(html)
+
+
+@pytest.mark.parametrize("html", [
+    '<p>Dear <span style="background-color: yellow">Name</span>,</p>',
+    '<p><b><span style="color:red; background: #FFFF00">Start date</span></b> and '
+    '<span style="background-color:yellow">Start date</span></p>',
+    '<table><tr><td style="background-color: yellow">Salary</td></tr></table>',
+    '<p style="background-color: yellow"></p><span style="background-color: yellow">  </span>',
+    '<p>No highlights <span style="color: yellow">here</span></p>',
+])
+def test_matches_the_regex_on_unnested_markup(html):
+    assert extract_highlighted_placeholders(html) == legacy_extract(html)
+
+
+def test_nested_highlight_closes_at_its_own_end_tag():
+    html = '<p><span style="background-color: yellow">Full <span class="x">legal</span> name</span> ok</p>'
+    out = extract_highlighted_placeholders(html)
+    assert out == {"html": "<p>{{full_legal_name}} ok</p>", "vars": ["full_legal_name"],
+                   "defaults": {"full_legal_name": "Full legal name"}}
+    # the regex stopped at the inner </span> and left a stray end tag behind
+    assert legacy_extract(html)["html"] == "<p>{{full_legal}} name</span> ok</p>"
+
+
+def test_nested_highlights_inside_a_highlight_become_one_placeholder():
+    html = ('<span style="background-color: yellow">A <span style="background-color: yellow">B</span></span>'
+            '<span style="background-color: yellow">C</span>')
+    out = extract_highlighted_placeholders(html)
+    assert out["html"] == "{{a_b}}{{c}}" and out["vars"] == ["a_b", "c"]
+
+
+def test_unclosed_and_void_elements_are_left_alone():
+    html = '<img style="background: yellow"><span style="background: yellow">open'
+    assert extract_highlighted_placeholders(html)["html"] == html
+
+
+def _timed(html):
+    started = time.perf_counter()
+    out = extract_highlighted_placeholders(html)
+    return out, time.perf_counter() - started
+
+
+def test_large_inputs_scale_linearly():
+    small, big = letter_html(1024 * 1024), letter_html(8 * 1024 * 1024)
+    out_small, t_small = _timed(small)
+    out_big, t_big = _timed(big)
+    assert out_small == legacy_extract(small)
+    assert len(out_big["vars"]) > 4 * len(out_small["vars"])
+    # 8x the input: linear is ~8x the time, the old quadratic paths were far worse
+    assert t_big < 20 * t_small + 0.5
@@ -0,0 +1,68 @@
+import json
+
+import pytest
+from starlette.websockets import WebSocketDisconnect
+
+from pyserver import app as app_module
+
+
+def _open(ws, content="Hi {{name}}, {{role}}", data=None):
+    ws.send_json({"type": "open", "content": content, "data": data or {"name": "Ann", "role": "QA"}})
+    return ws.receive_json()
+
+
+def test_open_renders_and_data_sends_only_changed_segments(client, editor):
+    with client.websocket_connect("/api/preview", headers=editor) as ws:
+        page = _open(ws)
+        assert page["type"] == "render"
+        assert "".join(page["segments"]) == "Hi Ann, QA"
+        ws.send_json({"type": "data", "seq": 1, "changes": {"role": "Lead"}})
+        patch = ws.receive_json()
+        assert patch["type"] == "patch" and patch["seq"] == 1
+        assert [text for _, text in patch["changes"]] == ["Lead"]
+        segments = list(page["segments"])
+        for i, text in patch["changes"]:
+            segments[i] = text
+        assert "".join(segments) == "Hi Ann, Lead"
+
+
+def test_bad_message_gets_an_error_reply(client, editor):
+    with client.websocket_connect("/api/preview", headers=editor) as ws:
+        ws.send_json({"type": "data", "changes": {}})
+        assert ws.receive_json()["type"] == "error"
+        ws.send_text("not json")
+        assert ws.receive_json()["type"] == "error"
+        for bad in ({"templateId": []}, {"templateId": {"a": 1}}, {"content": 5}):
+            ws.send_json({"type": "open", **bad})
+            reply = ws.receive_json()
+            assert reply["type"] == "error" and "must be a string" in reply["error"]
+        # the session is still usable
+        assert _open(ws)["type"] == "render"
+
+
+def test_oversized_message_closes_with_1009(client, editor, monkeypatch):
+    monkeypatch.setattr(app_module, "PREVIEW_MAX_MESSAGE_BYTES", 64)
+    with client.websocket_connect("/api/preview", headers=editor) as ws:
+        # 61 characters but 91 bytes: the limit is on the encoded size
+        ws.send_text(json.dumps({"type": "open", "content": "é" * 30}, ensure_ascii=False))
+        with pytest.raises(WebSocketDisconnect) as e:
+            ws.receive_json()
+    assert e.value.code == 1009
+
+
+def test_unauthenticated_connection_is_refused(client):
+    client.cookies.clear()
+    with pytest.raises(WebSocketDisconnect) as e:
+        with client.websocket_connect("/api/preview"):
+            pass
+    assert e.value.code == 1008
+
+
+def test_cross_site_origin_is_refused(client, editor, monkeypatch):
+    monkeypatch.setattr(app_module, "allow_origins", ["https://hrms.example"])
+    with pytest.raises(WebSocketDisconnect) as e:
+        with client.websocket_connect("/api/preview", headers={**editor, "Origin": "https://evil.example"}):
+            pass
+    assert e.value.code == 1008
+    with client.websocket_connect("/api/preview", headers={**editor, "Origin": "https://hrms.example"}) as ws:
+        assert _open(ws)["type"] == "render"
@@ -0,0 +1,53 @@
+from pyserver import db, search
+
+
+def _doc(client, headers, content, data):
+    r = client.post("/api/documents", headers=headers, json={"content": content, "data": data})
+    assert r.status_code == 200, r.text
+    return r.json()["item"]
+
+
+def _ids(client, headers, q, **params):
+    r = client.get("/api/search", headers=headers, params={"q": q, **params})
+    assert r.status_code == 200, r.text
+    return [h["id"] for h in r.json()["items"]]
+
+
+def test_documents_match_on_data_and_template_body(client, editor):
+    a = _doc(client, editor, "<p>Offer for {{name}} at quuxcorp</p>", {"name": "Zorblax Ann"})
+    b = _doc(client, editor, "<p>Offer for {{name}} at quuxcorp</p>", {"name": "Bob"})
+    assert _ids(client, editor, "zorblax") == [a["id"]]
+    assert set(_ids(client, editor, "quuxcorp")) == {a["id"], b["id"]}
+    # every word must match
+    assert _ids(client, editor, "quuxcorp zorblax") == [a["id"]]
+    assert _ids(client, editor, "quuxcorp nowhere") == []
+
+
+def test_index_follows_updates_and_deletes(client, editor):
+    doc = _doc(client, editor, "<p>{{who}}</p>", {"who": "Flimwick"})
+    assert _ids(client, editor, "flimwick") == [doc["id"]]
+    client.put(f"/api/documents/{doc['id']}", headers=editor, json={"data": {"who": "Gandrel"}})
+    assert _ids(client, editor, "flimwick") == []
+    assert _ids(client, editor, "gandrel") == [doc["id"]]
+    db.remove_item("documents", doc["id"])
+    assert _ids(client, editor, "gandrel") == []
+
+
+def test_template_name_outranks_body(client, editor):
+    named = client.post("/api/templates", headers=editor, json={"name": "Plonkery letter", "content": "x"}).json()
+    body = client.post("/api/templates", headers=editor, json={"name": "Other", "content": "plonkery"}).json()
+    assert _ids(client, editor, "plonkery", type="templates") == [named["item"]["id"], body["item"]["id"]]
+
+
+def test_pages_and_bad_type(client, editor):
+    ids = {_doc(client, editor, "<p>sproingle {{n}}</p>", {"n": i})["id"] for i in range(5)}
+    r = client.get("/api/search", headers=editor, params={"q": "sproingle", "limit": 3}).json()
+    assert len(r["items"]) == 3 and r["nextOffset"] == 3
+    rest = client.get("/api/search", headers=editor, params={"q": "sproingle", "limit": 3, "offset": 3}).json()
+    assert {h["id"] for h in r["items"] + rest["items"]} == ids and rest["nextOffset"] is None
+    assert client.get("/api/search", headers=editor, params={"q": "x", "type": "users"}).status_code == 400
+
+
+def test_snippet_is_escaped_and_highlighted():
+    out = search.snippet("Dear <Ann> & co, welcome aboard", "welcome")
+    assert out == "Dear &lt;Ann&gt; &amp; co, <b>welcome</b> aboard"
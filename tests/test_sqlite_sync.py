@@ -0,0 +1,91 @@
+import os
+import sqlite3
+import subprocess
+import sys
+import textwrap
+
+from conftest import ROOT
+from pyserver.sqlstore import SqliteStore
+
+
+def _rec(id, ts, **extra):
+    return {"id": id, "createdAt": ts, "updatedAt": ts, **extra}
+
+
+def _stores(tmp_path):
+    # two stores on one file behave like two worker processes
+    a, b = SqliteStore(tmp_path / "db.sqlite3"), SqliteStore(tmp_path / "db.sqlite3")
+    a.ensure()
+    b.ensure()
+    return a, b
+
+
+def test_writes_from_another_process_are_replayed(tmp_path):
+    a, b = _stores(tmp_path)
+    seen = []
+    a.on_foreign_change(lambda table, id: seen.append((table, id)))
+    b.insert("templates", _rec("t1", 1, name="x", content="y"))
+    b.update("templates", "t1", {"name": "z", "updatedAt": 2})
+    a.sync()
+    assert seen == [("templates", "t1")]
+    assert a.get("templates", "t1")["name"] == "z"
+
+
+def test_trimmed_change_log_resets_derived_state(tmp_path):
+    a, b = _stores(tmp_path)
+    resets = []
+    a.on_foreign_reset(lambda: resets.append(a.generation()))
+    generation = a.generation()
+    b.insert("templates", _rec("t1", 1, name="x", content="y"))
+    # the log moves past a's position before a looks
+    with sqlite3.connect(tmp_path / "db.sqlite3") as con:
+        con.execute("DELETE FROM changes")
+    b.insert("templates", _rec("t2", 2, name="x", content="y"))
+    a.sync()
+    assert len(resets) == 1
+    assert a.generation() > generation
+
+
+_WORKER = textwrap.dedent("""
+    import sqlite3
+    from pyserver import db, adb
+    from pyserver.sqlstore import SqliteStore
+    import asyncio
+
+    db.init_db()
+    user = db.add_item("users", {"username": "u", "name": "u", "dept": "", "role": "admin", "passwordHash": "x"})
+    other = SqliteStore(db.SQLITE_PATH)
+    other.ensure()
+    assert db.get_user(user["id"])["role"] == "admin"  # cached from here on
+
+    other.update("users", user["id"], {"role": "viewer", "updatedAt": user["updatedAt"] + 1})
+    assert db.get_user(user["id"])["role"] == "viewer"
+    assert asyncio.run(adb.get_user(user["id"]))["role"] == "viewer"
+
+    # log trimmed past this process's position: the cache starts over
+    other.update("users", user["id"], {"role": "editor", "updatedAt": user["updatedAt"] + 2})
+    with sqlite3.connect(db.SQLITE_PATH) as con:
+        con.execute("DELETE FROM changes")
+    other.delete("users", user["id"])
+    assert db.get_user(user["id"]) is None
+    print("ok")
+""")
+
+
+def test_user_cache_sees_other_processes_immediately(tmp_path):
+    env = {**os.environ, "DATA_DIR": str(tmp_path), "DB_BACKEND": "sqlite", "USER_CACHE_TTL": "3600"}
+    proc = subprocess.run([sys.executable, "-c", _WORKER], cwd=ROOT, env=env, capture_output=True, text=True)
+    assert proc.returncode == 0, proc.stderr
+    assert proc.stdout.strip() == "ok"
+
+
+def test_null_columns_read_back_as_none(tmp_path):
+    a, _ = _stores(tmp_path)
+    a.insert("documents", _rec("d1", 1, templateId=None, content="x", data={}, rendered="x"))
+    doc = a.get("documents", "d1")
+    # same shape as the file backend, which keeps the keys it was given
+    assert "fileName" in doc and doc["fileName"] is None
+    assert next(iter(a.scan("documents")))["fileName"] is None
+    with sqlite3.connect(tmp_path / "db.sqlite3") as con:
+        indexes = {r[0] for r in con.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert "documents_content_ref_idx" in indexes
@@ -0,0 +1,32 @@
+def _template(client, headers, name="cas"):
+    return client.post("/api/templates", headers=headers, json={"name": name, "content": "Hi"}).json()["item"]
+
+
+def test_null_field_is_rejected(client, editor):
+    t = _template(client, editor)
+    for field in ("name", "content", "description", "pageCss"):
+        r = client.put(f"/api/templates/{t['id']}", headers=editor, json={field: None})
+        assert r.status_code == 400
+    assert client.get(f"/api/templates/{t['id']}", headers=editor).json()["item"]["name"] == "cas"
+    # omitted fields are left alone
+    r = client.put(f"/api/templates/{t['id']}", headers=editor, json={"description": "d"})
+    assert r.json()["item"]["name"] == "cas" and r.json()["item"]["content"] == "Hi"
+
+
+def test_if_match_guards_against_lost_updates(client, editor):
+    t = _template(client, editor)
+    tag = client.get(f"/api/templates/{t['id']}", headers=editor).headers["ETag"]
+    first = client.put(f"/api/templates/{t['id']}", headers={**editor, "If-Match": tag}, json={"name": "a"})
+    assert first.status_code == 200
+    second = client.put(f"/api/templates/{t['id']}", headers={**editor, "If-Match": tag}, json={"name": "b"})
+    assert second.status_code == 409
+    assert client.get(f"/api/templates/{t['id']}", headers=editor).json()["item"]["name"] == "a"
+
+
+def test_unchanged_template_is_a_304(client, editor):
+    t = _template(client, editor)
+    tag = client.get(f"/api/templates/{t['id']}", headers=editor).headers["ETag"]
+    r = client.get(f"/api/templates/{t['id']}", headers={**editor, "If-None-Match": tag})
+    assert r.status_code == 304 and r.headers["ETag"] == tag
+    client.put(f"/api/templates/{t['id']}", headers=editor, json={"name": "changed"})
+    assert client.get(f"/api/templates/{t['id']}", headers={**editor, "If-None-Match": tag}).status_code == 200
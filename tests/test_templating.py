@@ -0,0 +1,25 @@
+from pyserver import templating
+from pyserver.templating import compile_template, get_compiled, render_compiled, render_template
+
+
+def test_compiled_render_matches_placeholders():
+    parts = compile_template("Hi {{ name }}, {{a.b}}{{missing}}!")
+    assert render_compiled(parts, {"name": "Ann", "a": {"b": 1}}) == "Hi Ann, 1!"
+    assert render_template("{{a.b}}", {"a.b": "flat"}) == "flat"
+
+
+def test_compiled_parts_are_cached_by_key():
+    key = ("tpl-cache", 1)
+    first = get_compiled("{{x}}", key)
+    hits = templating.template_cache_stats()["hits"]
+    assert get_compiled("ignored once cached", key) is first
+    assert templating.template_cache_stats()["hits"] == hits + 1
+
+
+def test_template_edit_is_not_served_stale(client, editor):
+    tpl = client.post("/api/templates", headers=editor, json={"name": "c", "content": "v1 {{x}}"}).json()["item"]
+    doc = client.post("/api/documents", headers=editor, json={"templateId": tpl["id"], "data": {"x": 1}}).json()
+    assert doc["item"]["rendered"] == "v1 1"
+    client.put(f"/api/templates/{tpl['id']}", headers=editor, json={"content": "v2 {{x}}"})
+    doc = client.post("/api/documents", headers=editor, json={"templateId": tpl["id"], "data": {"x": 1}}).json()
+    assert doc["item"]["rendered"] == "v2 1"
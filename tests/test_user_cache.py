@@ -0,0 +1,27 @@
+from conftest import login, make_user
+from pyserver import db
+
+
+def test_get_user_served_from_cache():
+    user = make_user("cache-hit")
+    db.get_user(user["id"])
+    hits = db.user_cache_stats()["hits"]
+    assert db.get_user(user["id"])["username"] == "cache-hit"
+    assert db.user_cache_stats()["hits"] == hits + 1
+
+
+def test_update_and_delete_invalidate_cached_user():
+    user = make_user("cache-inval", role="admin")
+    assert db.get_user(user["id"])["role"] == "admin"
+    db.update_item("users", user["id"], {"role": "viewer"})
+    assert db.get_user(user["id"])["role"] == "viewer"
+    db.remove_item("users", user["id"])
+    assert db.get_user(user["id"]) is None
+
+
+def test_deleted_user_token_is_rejected(client, admin):
+    user = make_user("cache-token")
+    headers = login(client, "cache-token", "pw")
+    assert client.get("/api/me", headers=headers).json()["user"]["id"] == user["id"]
+    assert client.delete(f"/api/auth/users/{user['id']}", headers=admin).status_code == 200
+    assert client.get("/api/me", headers=headers).json()["user"] is None